@@ -24,6 +24,29 @@ class Adapter(object):
     def run(cls, target, bindings, *args, **kwargs):
         pass
 
+    def run_fleet(self, devices, *args, **kwargs):
+        """
+        Serves several devices at once, each specified as a tuple of name (for example a PV prefix),
+        device and bindings. Adapters that do not support this can only serve a single device.
+
+        :param devices: List of (name, target, bindings) tuples.
+        """
+        if len(devices) != 1:
+            raise NotImplementedError('{} can only serve one device per process.'.format(type(self).__name__))
+
+        name, target, bindings = devices[0]
+        self.run(target, bindings, *args, **kwargs)
+
+
+# Adapters by protocol, mapping the name of the module in this package to the name of the adapter class
+# that is used if none is specified. Declaring them here allows listing and choosing a protocol without
+# importing the adapter modules, and with them dependencies such as pcaspy.
+registry = {
+    'epics': 'EpicsAdapter',
+}
+
+_imported = {}  # Dict mapping [(module_name, class_name)] = Adapter class, for adapters that were imported
+
 
 def import_adapter(module_name, class_name=None):
     """
@@ -38,23 +61,34 @@ def import_adapter(module_name, class_name=None):
         CommunicationAdapter = import_adapter('epics', 'EpicsAdapter')
         adapter = CommunicationAdapter()
 
-    If class_name is omitted, the module will return the first subclass of Adapter
-    it can find in the module. If no suitable class is found, an exception is raised.
-
+    If class_name is omitted, the adapter declared for the module in registry is returned.
+    For modules that are not in the registry, the first subclass of Adapter found in the
+    module is returned. If no suitable class is found, an exception is raised. Only the
+    module of the requested adapter is imported, and each adapter is only resolved once.
 
     :param module_name: Submodule of 'adapters' from which to import the Adapter.
     :param class_name: Class name of the Adapter.
     :return: Adapter class.
     """
+    key = (module_name, class_name)
+
+    if key not in _imported:
+        _imported[key] = _find_adapter(module_name, class_name or registry.get(module_name))
+
+    return _imported[key]
+
+
+def _find_adapter(module_name, class_name):
     module = importlib.import_module('.{}'.format(module_name), 'adapters')
 
-    for module_member in dir(module):
-        module_object = getattr(module, module_member)
+    members = dir(module) if class_name is None else [class_name]
+
+    for module_member in members:
+        module_object = getattr(module, module_member, None)
 
         try:
             if issubclass(module_object, Adapter) and module_object != Adapter:
-                if class_name is None or module_member == class_name:
-                    return module_object
+                return module_object
         except TypeError:
             pass
 
@@ -0,0 +1,256 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Compiles the bindings of a device, as returned by scenarios.import_bindings, into Binding
+objects, which resolve everything that reading and writing a PV needs once, at startup.
+"""
+
+from functools import partial
+from types import MemberDescriptorType
+
+from simulation.core import ContextProperty
+from simulation.core.history import History
+
+# Functions that convert written values to the type of a PV, by the PV's 'type'
+_coercions = {'float': float, 'int': int, 'enum': int, 'char': str, 'string': str}
+
+
+def _identity(value):
+    return value
+
+
+def _has_attribute(target, name):
+    return hasattr(type(target), name) or hasattr(target, name)
+
+
+def _accessors(target, name):
+    """
+    Resolves reading and writing the attribute name of target once, so that the returned
+    functions do not need to look it up by name on each call:
+
+     - For properties, the getter and setter functions of the property, bound to target.
+     - For ContextProperties, the slot of the context field (attribute access for Contexts
+       that are not compact) and the context's __setattr__, which tracks the write.
+     - For plain attributes, getattr and setattr.
+
+    :return: Tuple of getter and setter, the setter is None if the attribute is read-only.
+    """
+    descriptor = getattr(type(target), name, None)
+
+    if isinstance(descriptor, property):
+        getter = partial(descriptor.fget, target) if descriptor.fget is not None else partial(getattr, target, name)
+        return getter, partial(descriptor.fset, target) if descriptor.fset is not None else None
+
+    if isinstance(descriptor, ContextProperty):
+        context = descriptor.context(target)
+        field = getattr(type(context), descriptor.field, None)
+
+        if isinstance(field, MemberDescriptorType):
+            getter = partial(field.__get__, context)
+        else:
+            getter = partial(getattr, context, descriptor.field)
+
+        return getter, partial(type(context).__setattr__, context, descriptor.field) if descriptor.writable else None
+
+    return partial(getattr, target, name), partial(setattr, target, name)
+
+
+def _publish_filter(pv, parameters):
+    """
+    Returns a function filter(last, value) that decides whether a new value of the PV is
+    published, based on the optional keys of the binding:
+
+     - on_change: Only publish values that differ from the last published value.
+     - deadband: Only publish values that differ by more than this from the last published value.
+     - relative_deadband: Same as deadband, but relative to the last published value.
+
+    A deadband implies on_change and is only supported by the numeric types float and int.
+    Returns None if every polled value should be published.
+    """
+    absolute = parameters.get('deadband')
+    relative = parameters.get('relative_deadband')
+
+    if absolute is not None and relative is not None:
+        raise ValueError("Binding of PV '{}' may specify only one of deadband and relative_deadband.".format(pv))
+
+    pv_type = parameters.get('type', 'float')
+    if pv_type not in ('float', 'int') and (absolute is not None or relative is not None):
+        raise ValueError("PV '{}' of type '{}' does not support deadbands, use on_change.".format(pv, pv_type))
+
+    if 'snapshot' in parameters and (absolute is not None or relative is not None):
+        raise ValueError("Snapshot PV '{}' does not support deadbands, use on_change.".format(pv))
+
+    if 'history' in parameters:
+        if absolute is not None or relative is not None or parameters.get('on_change', False):
+            raise ValueError("History PV '{}' does not support on_change or deadbands.".format(pv))
+
+        return None
+
+    if absolute is not None:
+        return lambda last, value: abs(value - last) > absolute
+
+    if relative is not None:
+        return lambda last, value: abs(value - last) > relative * abs(last)
+
+    if parameters.get('on_change', False):
+        return lambda last, value: value != last
+
+    return None
+
+
+class Binding(object):
+    """
+    A PV binding, compiled from its parameters by compile_bindings. The attributes are:
+
+     - pv: Name of the PV.
+     - target: Object the PV is bound to.
+     - property: Name of the bound property, None for PVs that are not bound to a single property.
+     - getter: Function that returns the value of the PV, None if the PV is not bound to the target.
+     - setter: Function that sets the bound property to a written value, None if that is not allowed.
+     - coerce: Function that converts written values to the type of the PV.
+     - commands: Dict mapping written values to tuples of command name and bound method.
+     - buffer: Binding of the PV that receives the name of the last command, or None.
+     - publish_filter: Function filter(last, value), see _publish_filter, or None.
+     - poll_interval: Interval in which the PV is polled, if it is polled.
+     - lazy, ttl: Whether the PV is read on demand and how long such a value is cached.
+     - history, sample, sample_interval: For history PVs, the History, the function that
+       reads the sampled property and the interval between samples.
+
+    The remaining attributes, published and cached, hold the last published value (or
+    Binding.nothing) and the last (time, value) of a lazy PV that was read (or None).
+    """
+
+    nothing = object()
+
+    __slots__ = ('pv', 'target', 'property', 'getter', 'setter', 'coerce', 'commands', 'buffer',
+                 'publish_filter', 'poll_interval', 'lazy', 'ttl', 'history', 'sample', 'sample_interval',
+                 'published', 'cached')
+
+    def __init__(self, pv, parameters, target, default_poll_interval=1.0, default_ttl=0.1):
+        self.pv = pv
+        self.target = target
+        self.property = parameters.get('property')
+
+        for name in self._property_names(parameters):
+            if not _has_attribute(target, name):
+                raise ValueError("PV '{}' is bound to unknown property '{}' of {}.".format(
+                    pv, name, type(target).__name__))
+
+        self.history = None
+        self.sample = None
+        self.sample_interval = parameters.get('sample_interval', 0.1)
+
+        self.setter = None
+
+        if 'snapshot' in parameters:
+            getters = tuple(_accessors(target, name)[0] for name in parameters['snapshot'])
+            self.getter = lambda: [float(getter()) for getter in getters]
+        elif 'history' in parameters:
+            if 'count' not in parameters:
+                raise ValueError("History PV '{}' needs a count.".format(pv))
+
+            self.history = History(parameters['count'], parameters.get('decimation', 1),
+                                   parameters.get('reduction', 'last'))
+            self.sample = _accessors(target, parameters['history'])[0]
+            self.getter = self.history.values
+        elif self.property is not None:
+            self.getter, self.setter = _accessors(target, self.property)
+        else:
+            self.getter = None
+
+        pv_type = parameters.get('type', 'float')
+        if pv_type not in _coercions:
+            raise ValueError("PV '{}' has unknown type '{}'.".format(pv, pv_type))
+
+        self.coerce = _coercions[pv_type] if parameters.get('count', 1) == 1 else _identity
+
+        self.commands = {}
+        for value, name in parameters.get('commands', {}).iteritems():
+            method = getattr(target, name, None)
+
+            if not callable(method):
+                raise ValueError("Command '{}' of PV '{}' is bound to unknown method '{}' of {}.".format(
+                    value, pv, name, type(target).__name__))
+
+            self.commands[value] = (name, method)
+
+        self.buffer = None  # Resolved by compile_bindings
+        self.publish_filter = _publish_filter(pv, parameters)
+        self.poll_interval = parameters.get('poll_interval', default_poll_interval)
+        self.lazy = parameters.get('lazy', False)
+        self.ttl = parameters.get('ttl', default_ttl)
+
+        self.published = Binding.nothing
+        self.cached = None
+
+    @staticmethod
+    def _property_names(parameters):
+        names = list(parameters.get('snapshot', ()))
+
+        for key in ('property', 'history'):
+            if key in parameters:
+                names.append(parameters[key])
+
+        return names
+
+
+def compile_bindings(pv_dict, target=None, default_poll_interval=1.0, default_ttl=0.1):
+    """
+    Compiles bindings into Binding objects. Bindings may specify their own 'target', all others
+    are bound to target. Bindings with 'history_of' are bound to the History of the named PV,
+    so that their commands can reset it. Unknown properties, commands, types and PVs raise
+    a ValueError, so that mistakes in bindings are found at startup.
+
+    :param pv_dict: Dict of PV names and binding parameters.
+    :param target: Default target of the bindings.
+    :param default_poll_interval: Poll interval of bindings that do not specify one.
+    :param default_ttl: Cache duration of lazy bindings that do not specify one.
+    :return: Dict of PV names and Binding objects.
+    """
+    histories = {}
+    for pv, parameters in pv_dict.iteritems():
+        if 'history' in parameters:
+            histories[pv] = Binding(pv, parameters, parameters.get('target', target),
+                                    default_poll_interval, default_ttl)
+
+    bindings = {}
+    for pv, parameters in pv_dict.iteritems():
+        if pv in histories:
+            bindings[pv] = histories[pv]
+            continue
+
+        bound_target = parameters.get('target', target)
+        if 'history_of' in parameters:
+            if parameters['history_of'] not in histories:
+                raise ValueError("PV '{}' refers to '{}', which is not a history PV.".format(
+                    pv, parameters['history_of']))
+
+            bound_target = histories[parameters['history_of']].history
+
+        bindings[pv] = Binding(pv, parameters, bound_target, default_poll_interval, default_ttl)
+
+    for pv, parameters in pv_dict.iteritems():
+        if 'buffer' in parameters:
+            if parameters['buffer'] not in bindings:
+                raise ValueError("Buffer '{}' of PV '{}' is not defined.".format(parameters['buffer'], pv))
+
+            bindings[pv].buffer = bindings[parameters['buffer']]
+
+    return bindings
@@ -17,79 +17,409 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # *********************************************************************
 
-from datetime import datetime
+import heapq
+import logging
+from collections import deque
+from functools import partial
+import threading
+import time
 from pcaspy import Driver, SimpleServer
-from simulation.core import CanProcess
+from simulation.core import CanProcess, CanProcessComposite, CycleScheduler, CycleTelemetry, RealTimeClock, \
+    ClockedProcessor, subscribe_properties
+from simulation.core.scheduler import monotonic
 from adapters import Adapter
+from adapters.bindings import Binding, compile_bindings
+
+log = logging.getLogger(__name__)
 
 
 class PropertyExposingDriver(CanProcess, Driver):
-    def __init__(self, target, pv_dict, default_poll_interval=1.0):
+    """
+    Exposes properties of target as PVs. Bindings may specify a different 'target' than the
+    default, for example to expose properties of the simulation's clock. The bindings are
+    compiled once, see compile_bindings, so that unknown properties and commands are found
+    at startup and reading and writing PVs does not need to interpret the bindings.
+
+    Writes from clients are not applied immediately, but queued until apply_writes is called,
+    which should happen at a fixed point of the simulation cycle. Writes are applied in the
+    order they were written. Repeated writes to a setpoint are coalesced, as long as no command
+    was written in between: only the last value is applied, at the position of the first write.
+    At most max_commands commands are queued, further commands are rejected until the queue is
+    drained again. Writes that fail when they are applied are logged and counted as rejected,
+    they do not interrupt the simulation.
+
+    Bindings with 'snapshot' instead of 'property' specify a list of numeric properties, which
+    are published together as one waveform PV (its 'count' must match the number of properties).
+    All values of a snapshot are read at the same time, so that clients get a consistent view
+    of the target with one read.
+
+    Bindings with 'lazy': True are neither polled nor observed. Instead, their value is read from
+    the target when a client reads the PV, and cached for 'ttl' seconds (default_ttl if omitted).
+    PVs that nobody reads cost nothing, but lazy PVs do not post monitor updates. If the simulation
+    runs on another thread than the server, lock must be the lock that is held during its cycles,
+    so that lazy PVs are not read from the target in the middle of a cycle.
+
+    Bindings with 'history' instead of 'property' record the recent values of that property
+    in a History with 'count' entries, which is published as a waveform PV every poll_interval,
+    oldest value first. The property is sampled every 'sample_interval' seconds (0.1 by default),
+    the optional 'decimation' and 'reduction' are passed on to the History. A history is reset
+    by a command 'reset' of a binding that names the history PV in 'history_of':
+
+        'SPEED:HISTORY': {'type': 'float', 'count': 600, 'history': 'speed', 'reduction': 'mean'},
+        'SPEED:HISTORY:RESET': {'type': 'string', 'commands': {'RESET': 'reset'},
+                                'history_of': 'SPEED:HISTORY'},
+    """
+
+    def __init__(self, target, pv_dict, default_poll_interval=1.0, max_commands=64, default_ttl=0.1, lock=None):
         super(PropertyExposingDriver, self).__init__()
 
-        self._target = target
-        self._pv_dict = pv_dict
-        self._timers = {k: 0.0 for k in pv_dict.keys()}
+        self._bindings = compile_bindings(pv_dict, target, default_poll_interval, default_ttl)
+        self._lock = lock  # Held while reading lazy PVs, if the simulation runs on another thread
+
+        self._write_lock = threading.Lock()  # Writes may arrive on another thread than the simulation
+        self._writes = deque()  # Lists of [binding, value, command] in the order they were written
+        self._coalescing = {}  # Dict mapping [binding] = queued setpoint that later writes replace
+        self._queued_commands = 0
+        self._max_commands = max_commands
+        self._rejected_writes = 0
+
+        self._changed = False  # Whether any parameter was set since the last updatePVs
+
+        # PVs bound to properties whose changes can be observed are updated when they change,
+        # all others are polled.
+        properties = {}
+        for binding in self._bindings.itervalues():
+            if binding.property is not None and not binding.lazy:
+                properties.setdefault(id(binding.target), (binding.target, set()))[1].add(binding.property)
+
+        self._observed = {}  # Dict mapping [id of target][property] = list of bindings
+        for key, (bound_target, names) in properties.iteritems():
+            self._observed[key] = dict((name, []) for name in subscribe_properties(
+                bound_target, partial(self._publish_changes, key), names))
+
+        # Each poll group is a list of (sink, getter) pairs, the value of the getter is passed to the sink
+        poll_groups = {}
+        for binding in self._bindings.itervalues():
+            if binding.history is not None:
+                poll_groups.setdefault(binding.sample_interval, []).append((binding.history.record, binding.sample))
+
+            if binding.getter is None or binding.lazy:
+                continue
+
+            observed = self._observed.get(id(binding.target), {})
+
+            if binding.property in observed:
+                observed[binding.property].append(binding)
+                self._set(binding, binding.getter())
+            else:
+                poll_groups.setdefault(binding.poll_interval, []).append((partial(self._publish, binding),
+                                                                          binding.getter))
+
+        # Polled PVs are grouped by poll interval, the groups are kept in a heap ordered by
+        # their next deadline, so that a cycle only touches the groups that are due.
+        self._time = 0.0
+        self._poll_heap = [(interval, interval, tuple(group))
+                           for interval, group in sorted(poll_groups.iteritems())]
+        heapq.heapify(self._poll_heap)
+
+    def _publish_changes(self, key, changes):
+        observed = self._observed[key]
+
+        for name, (old, new) in changes.iteritems():
+            for binding in observed[name]:
+                self._publish(binding, new)
+
+    def _publish(self, binding, value):
+        publish_filter = binding.publish_filter
+
+        last = binding.published
+
+        if publish_filter is None or last is Binding.nothing or publish_filter(last, value):
+            self._set(binding, value)
 
-        self._default_poll_interval = default_poll_interval
+    def _set(self, binding, value):
+        self.setParam(binding.pv, value)
+        binding.published = value
+        self._changed = True
+
+    def read(self, pv):
+        binding = self._bindings[pv]
+
+        if not binding.lazy:
+            return super(PropertyExposingDriver, self).read(pv)
+
+        now = monotonic()
+        cached = binding.cached
+
+        if cached is not None and now - cached[0] < binding.ttl:
+            return cached[1]
+
+        if self._lock is None:
+            value = binding.getter()
+        else:
+            with self._lock:
+                value = binding.getter()
+
+        binding.cached = (now, value)
+
+        return value
+
+    @property
+    def rejectedWrites(self):
+        """
+        :return: Number of writes that were rejected because they were invalid or the queue was full.
+        """
+        return self._rejected_writes
 
     def write(self, pv, value):
-        commands = self._pv_dict[pv].get('commands', {})
-        command = commands.get(value, None)
-
-        if command is not None:
-            getattr(self._target, command)()
-            self.setParam(pv, '')
-            self.setParam(self._pv_dict[pv]['buffer'], command)
-            return True
-
-        try:
-            setattr(self._target, self._pv_dict[pv]['property'], value)
-        except (AttributeError, KeyError):
-            return False
+        binding = self._bindings[pv]
+        command = binding.commands.get(value) if binding.commands else None
 
-        self.setParam(pv, value)
-        return True
+        with self._write_lock:
+            if command is not None:
+                if self._queued_commands < self._max_commands:
+                    self._writes.append([binding, None, command])
+                    self._queued_commands += 1
 
-    def doProcess(self, dt):
-        # Updates bound parameters as needed
-        for pv, parameters in self._pv_dict.iteritems():
-            self._timers[pv] += dt
-            if self._timers[pv] >= parameters.get('poll_interval', self._default_poll_interval):
+                    # Setpoints written after the command must not be applied before it
+                    self._coalescing.clear()
+                    return True
+            elif binding.setter is not None:
                 try:
-                    self.setParam(pv, getattr(self._target, parameters['property']))
-                    self._timers[pv] = 0.0
-                except KeyError:
+                    value = binding.coerce(value)
+                except (TypeError, ValueError):
                     pass
+                else:
+                    queued = self._coalescing.get(binding)
+
+                    if queued is not None:
+                        queued[1] = value
+                    else:
+                        queued = [binding, value, None]
+                        self._writes.append(queued)
+                        self._coalescing[binding] = queued
+
+                    return True
+
+            self._rejected_writes += 1
+            return False
+
+    def apply_writes(self):
+        """
+        Applies the writes that were queued since the last call, in the order they were written.
+        """
+        with self._write_lock:
+            if not self._writes:
+                return
+
+            writes, self._writes = self._writes, deque()
+            self._coalescing.clear()
+            self._queued_commands = 0
+
+        for binding, value, command in writes:
+            if command is None:
+                try:
+                    binding.setter(value)
+                except Exception:
+                    self._reject(binding, value)
+                    value = binding.getter()
+
+                self._set(binding, value)
+            else:
+                name, method = command
+
+                try:
+                    method()
+                except Exception:
+                    self._reject(binding, name)
+                    name = None
 
-        self.updatePVs()
+                self._set(binding, '')
+
+                if binding.buffer is not None and name is not None:
+                    self._set(binding.buffer, name)
+
+    def _reject(self, binding, value):
+        self._rejected_writes += 1
+        log.exception("Applying '%s' to PV '%s' failed.", value, binding.pv)
+
+    def doProcess(self, dt):
+        # Updates bound parameters of the poll groups that are due
+        self._time += dt
+
+        heap = self._poll_heap
+        while heap and heap[0][0] <= self._time:
+            deadline, interval, group = heap[0]
+
+            for sink, getter in group:
+                sink(getter())
+
+            # Deadlines that were missed entirely are skipped instead of polling repeatedly
+            deadline += interval
+            if deadline <= self._time:
+                deadline = self._time + interval
+
+            heapq.heapreplace(heap, (deadline, interval, group))
+
+        if self._changed:
+            self.updatePVs()
+            self._changed = False
+
+
+def clock_bindings(clock):
+    """
+    :param clock: Clock of the simulation.
+    :return: Bindings of PVs that expose and control the clock.
+    """
+    return {
+        'CLOCK:TIME': {'property': 'time', 'target': clock, 'poll_interval': 0.1},
+        'CLOCK:PAUSED': {'type': 'int', 'property': 'paused', 'target': clock, 'on_change': True},
+        'CLOCK:ADVANCE': {'property': 'pending', 'target': clock, 'poll_interval': 0.1, 'on_change': True},
+    }
+
+
+def telemetry_bindings(telemetry, parts=('server', 'simulation', 'driver')):
+    """
+    :param telemetry: CycleTelemetry of the simulation loop.
+    :param parts: Names of the timed parts of the cycle.
+    :return: Bindings of read-only PVs that expose the telemetry.
+    """
+    bindings = {
+        'CYCLE:RATE': {'property': 'cycleRate', 'unit': 'Hz', 'prec': 1},
+        'CYCLE:MEAN': {'property': 'meanCycleTime', 'unit': 'ms', 'prec': 3},
+        'CYCLE:P50': {'property': 'p50CycleTime', 'unit': 'ms', 'prec': 3},
+        'CYCLE:P99': {'property': 'p99CycleTime', 'unit': 'ms', 'prec': 3},
+        'CYCLE:MAX': {'property': 'maxCycleTime', 'unit': 'ms', 'prec': 3},
+        'CYCLE:OVERRUNS': {'type': 'int', 'property': 'overruns'},
+    }
+
+    for part in parts:
+        bindings['CYCLE:{}:TIME'.format(part.upper())] = {
+            'property': 'perCycle', 'target': telemetry.share(part), 'unit': 'ms', 'prec': 3}
+        bindings['CYCLE:{}:LOAD'.format(part.upper())] = {
+            'property': 'fraction', 'target': telemetry.share(part), 'prec': 3}
+
+    for parameters in bindings.values():
+        parameters.setdefault('target', telemetry)
+        parameters['on_change'] = True
+
+    return bindings
+
+
+def qualify_bindings(prefix, target, bindings):
+    """
+    Prepends prefix to the names of all PVs in bindings, including the names of buffer PVs of
+    commands and of the history PVs that commands reset, and binds them to target unless they
+    specify their own. This allows PVs of several devices to be served by one server and driver.
+
+    :param prefix: PV prefix of the device.
+    :param target: Device the bindings belong to.
+    :param bindings: Bindings of the device.
+    :return: Bindings with fully qualified PV names.
+    """
+    qualified = {}
+    for pv, parameters in bindings.iteritems():
+        parameters = dict(parameters)
+        parameters.setdefault('target', target)
+
+        if 'buffer' in parameters:
+            parameters['buffer'] = prefix + parameters['buffer']
+
+        if 'history_of' in parameters:
+            parameters['history_of'] = prefix + parameters['history_of']
+
+        qualified[prefix + pv] = parameters
+
+    return qualified
 
 
 class EpicsAdapter(Adapter):
+    """
+    Exposes the target via Channel Access. The following parameters are supported:
+
+     - pv_prefix: Prefix of all PVs. When several devices are served, see run_fleet,
+                  only the PVs of the clock and the telemetry use this prefix.
+     - cycle_rate: [optional] Simulation cycles per second, 100 by default.
+     - overrun: [optional] What to do when a cycle takes too long, one of catch_up,
+                skip (default) and reset, see CycleScheduler.
+     - sim_thread: [optional] If true, the simulation runs on its own thread, while the
+                   main thread services Channel Access. Otherwise, Channel Access is
+                   serviced while waiting for the next cycle. In both cases, writes
+                   are applied at the beginning of a cycle.
+     - clock: [optional] Clock that determines the time that passes in the simulation,
+              real time by default. It is exposed via PVs, see clock_bindings.
+     - telemetry: [optional] CycleTelemetry that collects the statistics of the loop.
+
+    Statistics about the cycles of the simulation are exposed via PVs, see telemetry_bindings.
+    """
+
     def run(self, target, bindings, *args, **kwargs):
+        self.run_fleet([(kwargs['pv_prefix'], target, bindings)], *args, **kwargs)
+
+    def run_fleet(self, devices, *args, **kwargs):
+        """
+        Serves several devices from one server, driver and simulation loop. Each device
+        is specified as a tuple of PV prefix, device and bindings.
+
+        :param devices: List of (prefix, target, bindings) tuples.
+        """
+        prefix = kwargs['pv_prefix']
+        clock = kwargs.get('clock') or RealTimeClock()
+        telemetry = kwargs.get('telemetry') or CycleTelemetry()
+
+        bindings = qualify_bindings(prefix, clock, clock_bindings(clock))
+        bindings.update(qualify_bindings(prefix, telemetry, telemetry_bindings(telemetry)))
+
+        for device_prefix, target, device_bindings in devices:
+            qualified = qualify_bindings(device_prefix, target, device_bindings)
+
+            duplicates = set(qualified).intersection(bindings)
+            if duplicates:
+                raise RuntimeError('PVs are defined more than once: {}'.format(', '.join(sorted(duplicates))))
+
+            bindings.update(qualified)
+
         server = SimpleServer()
-        server.createPV(prefix=kwargs['pv_prefix'], pvdb=bindings)
-        driver = PropertyExposingDriver(target=target, pv_dict=bindings)
-
-        delta = 0.0  # Delta between cycles
-        count = 0  # Cycles per second counter
-        timer = 0.0  # Second counter
-        while True:
-            start = datetime.now()
-
-            # pcaspy's process() is weird. Docs claim argument is "processing time" in seconds.
-            # But this is not at all consistent with the calculated delta.
-            # Having "watch caget" running has a huge effect too (runs faster when watching!)
-            # Additionally, if you don't call it every ~0.05s or less, PVs stop working. Annoying.
-            # Set it to 0.0 for maximum cycle speed.
-            server.process(0.1)
-            target.process(delta)
-            driver.process(delta)
-
-            delta = (datetime.now() - start).total_seconds()
-            count += 1
-            timer += delta
-            if timer >= 1.0:
-                print "Running at %d cycles per second (%.3f ms per cycle)" % (count, 1000.0 / count)
-                count = 0
-                timer = 0.0
+        server.createPV(prefix='', pvdb=bindings)
+
+        threaded = str(kwargs.get('sim_thread', False)).lower() in ('1', 'true', 'yes')
+
+        # Lazy PVs are read on the thread of the server, which must not happen during a cycle
+        lock = threading.Lock() if threaded else None
+
+        driver = PropertyExposingDriver(target=None, pv_dict=bindings, lock=lock)
+        targets = CanProcessComposite(target for _, target, _ in devices)
+
+        # Only the targets run on the clock, the driver keeps serving clients in real time
+        simulate = telemetry.timed('simulation', ClockedProcessor(targets, clock).process)
+        drive = telemetry.timed('driver', driver.process)
+        apply_writes = telemetry.timed('driver', driver.apply_writes)
+        serve = telemetry.timed('server', server.process)
+
+        def cycle(dt):
+            apply_writes()
+            simulate(dt)
+            drive(dt)
+            telemetry.process(dt)
+
+        # pcaspy's process() is weird. Docs claim argument is "processing time" in seconds.
+        # But this is not at all consistent with the actual time it takes, so it is only used
+        # to wait for the next deadline, which the scheduler repeats as needed.
+        # Additionally, if you don't call it every ~0.05s or less, PVs stop working. Annoying.
+        scheduler = CycleScheduler(cycle,
+                                   rate=float(kwargs.get('cycle_rate', 100.0)),
+                                   overrun=kwargs.get('overrun', CycleScheduler.SKIP),
+                                   lock=lock,
+                                   sleep=time.sleep if threaded else serve,
+                                   telemetry=telemetry)
+
+        if not threaded:
+            scheduler.run()
+            return
+
+        scheduler.start()
+        while scheduler.running:
+            serve(0.1)
+
+        # The simulation thread only ends on an error, which stop() re-raises
+        scheduler.stop()
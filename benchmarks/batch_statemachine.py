@@ -0,0 +1,97 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Benchmark comparing N individual StateMachines with one BatchStateMachine of size N,
+for machines that accelerate towards individual target speeds:
+
+    $ python -m benchmarks.batch_statemachine --machines 10000 --cycles 20
+"""
+
+import argparse
+from timeit import default_timer
+
+import numpy as np
+
+from simulation.core import StateMachine, State, Context
+from simulation.core.batch import BatchStateMachine, BatchState, BatchContext
+
+
+class RampContext(Context):
+    def initialize(self):
+        self.speed = 0.0
+        self.target_speed = 0.0
+
+
+class Accelerating(State):
+    def in_state(self, dt):
+        self._context.speed = min(self._context.speed + 0.1 * dt, self._context.target_speed)
+
+
+class BatchAccelerating(BatchState):
+    def in_state(self, context, mask, dt):
+        context.speed[mask] = np.minimum(context.speed[mask] + 0.1 * dt, context.target_speed[mask])
+
+
+def individual_machines(size):
+    machines = []
+    for index in range(size):
+        context = RampContext()
+        context.target_speed = 1.0 + index
+        machines.append(StateMachine({
+            'initial': 'accelerating',
+            'states': {'accelerating': Accelerating()},
+            'transitions': {('accelerating', 'at_speed'): lambda c=context: c.speed == c.target_speed},
+        }, context=context))
+
+    return machines
+
+
+def batch_machine(size):
+    context = BatchContext.from_context(RampContext, size)
+    context.target_speed[:] = 1.0 + np.arange(size)
+
+    return [BatchStateMachine({
+        'initial': 'accelerating',
+        'states': {'accelerating': BatchAccelerating()},
+        'transitions': {('accelerating', 'at_speed'): lambda c: c.speed == c.target_speed},
+    }, size, context=context)]
+
+
+def cycles_per_second(machines, cycles):
+    start = default_timer()
+    for _ in range(cycles):
+        for machine in machines:
+            machine.process(0.01)
+
+    return cycles / (default_timer() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark individual vs. batched state machines.')
+    parser.add_argument('--machines', type=int, default=10000, help='Number of machines.')
+    parser.add_argument('--cycles', type=int, default=20, help='Number of cycles to time.')
+    arguments = parser.parse_args()
+
+    individual = cycles_per_second(individual_machines(arguments.machines), arguments.cycles)
+    batch = cycles_per_second(batch_machine(arguments.machines), arguments.cycles)
+
+    print('{} machines'.format(arguments.machines))
+    print('  individual: {:10.1f} cycles per second'.format(individual))
+    print('  batch:      {:10.1f} cycles per second ({:.1f}x)'.format(batch, batch / individual))
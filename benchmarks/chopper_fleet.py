@@ -0,0 +1,69 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Benchmark for a fleet of simulated choppers that sit idle in the phase_locked state,
+which is the common case in long running simulations:
+
+    $ python -m benchmarks.chopper_fleet --choppers 1000 --cycles 200
+"""
+
+import argparse
+from timeit import default_timer
+
+from simulation import SimulatedChopper
+
+
+def phase_locked_fleet(size):
+    fleet = [SimulatedChopper() for _ in range(size)]
+
+    for chopper in fleet:
+        chopper.process(0.0)
+        chopper.interlock()
+        for _ in range(3):
+            chopper.process(0.1)
+
+        chopper.targetSpeed = 10.0
+        chopper.targetPhase = 5.0
+        chopper.start()
+        while not chopper.phaseLocked:
+            chopper.process(0.1)
+
+    return fleet
+
+
+def fleet_cycles_per_second(fleet, cycles):
+    start = default_timer()
+    for _ in range(cycles):
+        for chopper in fleet:
+            chopper.process(0.001)
+
+    return cycles / (default_timer() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark a fleet of phase locked choppers.')
+    parser.add_argument('--choppers', type=int, default=1000, help='Number of choppers in the fleet.')
+    parser.add_argument('--cycles', type=int, default=200, help='Number of fleet cycles to time.')
+    arguments = parser.parse_args()
+
+    fleet = phase_locked_fleet(arguments.choppers)
+
+    print('{} phase locked choppers: {:.1f} fleet cycles per second'.format(
+        arguments.choppers, fleet_cycles_per_second(fleet, arguments.cycles)))
@@ -0,0 +1,66 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Benchmark comparing memory footprint and attribute write throughput of Context and
+CompactContext, using the fields of ChopperContext:
+
+    $ python -m benchmarks.context_memory --contexts 10000 --writes 200000
+"""
+
+import argparse
+import sys
+from timeit import default_timer
+
+from simulation.core import Context
+from simulation.chopper.device import ChopperContext
+
+
+class DictChopperContext(Context):
+    initialize = ChopperContext.__dict__['initialize']
+
+
+def bytes_per_context(context):
+    size = sys.getsizeof(context)
+    if hasattr(context, '__dict__'):
+        size += sys.getsizeof(context.__dict__)
+
+    return size
+
+
+def writes_per_second(context, writes):
+    start = default_timer()
+    for _ in range(writes):
+        context.speed = 1.0
+
+    return writes / (default_timer() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Context vs. CompactContext.')
+    parser.add_argument('--contexts', type=int, default=10000, help='Number of contexts to create.')
+    parser.add_argument('--writes', type=int, default=200000, help='Number of attribute writes to time.')
+    arguments = parser.parse_args()
+
+    print('{} contexts'.format(arguments.contexts))
+    for name, context_type in (('Context', DictChopperContext), ('CompactContext', ChopperContext)):
+        contexts = [context_type() for _ in range(arguments.contexts)]
+
+        print('  {:15} {:6d} bytes per context, {:10.0f} writes per second'.format(
+            name + ':', bytes_per_context(contexts[0]), writes_per_second(contexts[0], arguments.writes)))
@@ -0,0 +1,80 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Microbenchmark for the compiled process plan of CanProcessComposite.
+
+A deep tree of nested composites is built, with leaves that implement doBeforeProcess,
+doProcess and doAfterProcess, and processed repeatedly in interpreted and compiled mode:
+
+    $ python -m benchmarks.process_plan --depth 6 --width 3 --cycles 2000
+"""
+
+import argparse
+from timeit import default_timer
+
+from simulation.core import CanProcess, CanProcessComposite
+
+
+class Leaf(CanProcess):
+    def __init__(self):
+        super(Leaf, self).__init__()
+        self.elapsed = 0.0
+
+    def doBeforeProcess(self, dt):
+        pass
+
+    def doProcess(self, dt):
+        self.elapsed += dt
+
+    def doAfterProcess(self, dt):
+        pass
+
+
+def build_tree(depth, width, compiled=False):
+    if depth == 0:
+        return Leaf()
+
+    return CanProcessComposite([build_tree(depth - 1, width) for _ in range(width)], compiled=compiled)
+
+
+def cycles_per_second(tree, cycles):
+    tree.process(0.0)  # Compiles the plan if the tree is compiled
+
+    start = default_timer()
+    for _ in range(cycles):
+        tree.process(0.001)
+
+    return cycles / (default_timer() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark interpreted vs. compiled CanProcessComposite trees.')
+    parser.add_argument('--depth', type=int, default=6, help='Nesting depth of the composite tree.')
+    parser.add_argument('--width', type=int, default=3, help='Number of children per composite.')
+    parser.add_argument('--cycles', type=int, default=2000, help='Number of cycles to time.')
+    arguments = parser.parse_args()
+
+    interpreted = cycles_per_second(build_tree(arguments.depth, arguments.width), arguments.cycles)
+    compiled = cycles_per_second(build_tree(arguments.depth, arguments.width, compiled=True), arguments.cycles)
+
+    print('Tree with depth {} and width {} ({} leaves)'.format(
+        arguments.depth, arguments.width, arguments.width ** arguments.depth))
+    print('  interpreted: {:10.1f} cycles per second'.format(interpreted))
+    print('  compiled:    {:10.1f} cycles per second ({:.2f}x)'.format(compiled, compiled / interpreted))
@@ -0,0 +1,104 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Microbenchmark for StateMachine dispatch, comparing the interpreted doProcess with
+the generated one (compiled=True):
+
+    $ python -m benchmarks.statemachine_dispatch --cycles 100000
+
+Two machines are measured. In the "steady" machine, the current state has several
+transitions whose conditions are all False, so each cycle evaluates them and raises
+in_state. In the "cycling" machine, every cycle performs a transition and raises
+on_exit, on_entry and in_state events, with handlers that do and do not take dt.
+"""
+
+import argparse
+from timeit import default_timer
+
+from simulation.core import StateMachine
+
+
+class Handlers(object):
+    def __init__(self):
+        self.elapsed = 0.0
+        self.events = 0
+
+    def _in_state_steady(self, dt):
+        self.elapsed += dt
+
+    def _on_entry_a(self, dt):
+        self.events += 1
+
+    def _in_state_a(self, dt):
+        self.elapsed += dt
+
+    def _on_exit_a(self):
+        self.events += 1
+
+    def _on_entry_b(self):
+        self.events += 1
+
+    def _in_state_b(self, dt):
+        self.elapsed += dt
+
+
+def steady_machine(handlers, **kwargs):
+    machine = StateMachine({
+        'initial': 'steady',
+        'transitions': dict(((('steady', 'other_{}'.format(i)), lambda: handlers.events < 0) for i in range(4)))
+    }, **kwargs)
+    machine.bind_handlers_by_name(handlers)
+    return machine
+
+
+def cycling_machine(handlers, **kwargs):
+    machine = StateMachine({
+        'initial': 'a',
+        'transitions': {
+            ('a', 'b'): lambda: True,
+            ('b', 'a'): lambda: True,
+        }
+    }, **kwargs)
+    machine.bind_handlers_by_name(handlers)
+    return machine
+
+
+def cycles_per_second(machine, cycles):
+    machine.process(0.0)
+
+    start = default_timer()
+    for _ in range(cycles):
+        machine.process(0.001)
+
+    return cycles / (default_timer() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark interpreted vs. compiled StateMachine dispatch.')
+    parser.add_argument('--cycles', type=int, default=100000, help='Number of cycles to time.')
+    arguments = parser.parse_args()
+
+    for name, factory in (('steady', steady_machine), ('cycling', cycling_machine)):
+        interpreted = cycles_per_second(factory(Handlers()), arguments.cycles)
+        compiled = cycles_per_second(factory(Handlers(), compiled=True), arguments.cycles)
+
+        print('{} machine'.format(name))
+        print('  interpreted: {:10.1f} cycles per second'.format(interpreted))
+        print('  compiled:    {:10.1f} cycles per second ({:.2f}x)'.format(compiled, compiled / interpreted))
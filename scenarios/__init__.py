@@ -18,8 +18,41 @@
 # *********************************************************************
 
 import importlib
+import json
 from simulation.core import CanProcess
 
+# Devices that can be simulated, each with its scenarios (the first is the default). Declaring them
+# here allows listing and validating devices and scenarios without importing them.
+registry = {
+    'chopper': ('default',),
+}
+
+_device_members = {}  # Dict mapping [(device_type, scenario)] = name of the device object in the scenario module
+
+
+def check_scenario(device_type, scenario):
+    """
+    Raises a RuntimeError if the device or the scenario is not declared in registry, so that
+    typing mistakes are found before anything is imported.
+
+    :param device_type: Name of the device.
+    :param scenario: Name of the scenario.
+    """
+    if device_type not in registry:
+        raise RuntimeError('Unknown device \'{}\', must be one of: {}.'.format(
+            device_type, ', '.join(sorted(registry))))
+
+    if scenario not in registry[device_type]:
+        raise RuntimeError('Unknown scenario \'{}\' of device \'{}\', must be one of: {}.'.format(
+            scenario, device_type, ', '.join(registry[device_type])))
+
+
+def scenario_names():
+    """
+    :return: Sorted list of the names of all scenarios in registry, of any device.
+    """
+    return sorted(set(scenario for device_scenarios in registry.values() for scenario in device_scenarios))
+
 
 def import_device(device_type, scenario):
     """
@@ -36,21 +69,55 @@ def import_device(device_type, scenario):
     :param scenario: Scenario module from which to import the device object.
     :return: Device object as specified by device_type and scenario
     """
+    check_scenario(device_type, scenario)
+
     module_name = '.{}'.format(scenario)
     scenario_package = 'scenarios.{}'.format(device_type)
 
     module = importlib.import_module(module_name, scenario_package)
 
+    # The name of the device object is remembered, so that the module is only scanned once
+    key = (device_type, scenario)
+    if key in _device_members:
+        return getattr(module, _device_members[key])
+
     for module_member in dir(module):
         module_object = getattr(module, module_member)
 
         if isinstance(module_object, CanProcess):
+            _device_members[key] = module_member
             return module_object
 
     raise RuntimeError(
         'Did not find anything that implements CanProcess in module \'{}\'.'.format(scenario_package + module_name))
 
 
+def create_device(device_type, scenario):
+    """
+    This function works like import_device, but returns a new device object on each call, so that
+    several devices of the same type and scenario can be simulated in one process:
+
+        choppers = [create_device('chopper', 'default') for _ in range(10)]
+
+    To achieve this, the scenario module must provide a function named create that takes no
+    arguments and returns a new device object, the module itself is only imported once.
+
+    :param device_type: Sub-package from which to import the scenario.
+    :param scenario: Scenario module from which to create the device object.
+    :return: New device object as specified by device_type and scenario
+    """
+    check_scenario(device_type, scenario)
+
+    module_name = 'scenarios.{}.{}'.format(device_type, scenario)
+    module = importlib.import_module(module_name)
+
+    factory = getattr(module, 'create', None)
+    if not callable(factory):
+        raise RuntimeError('Module \'{}\' has no function create to create new devices.'.format(module_name))
+
+    return factory()
+
+
 def import_bindings(device_type, bindings_type):
     """
     This function imports a variable named bindings_type from scenarios.device_type.bindings.
@@ -70,3 +137,49 @@ def import_bindings(device_type, bindings_type):
     module = importlib.import_module('.bindings', 'scenarios.{}'.format(device_type))
 
     return getattr(module, bindings_type)
+
+
+def load_fleet(fleet, protocol):
+    """
+    Reads the specification of a fleet of devices from a JSON file. The file contains a list of
+    groups of devices, each with a PV prefix (or other name, depending on the protocol):
+
+        [
+            {"device": "chopper", "scenario": "default", "prefix": "SIM:CH{index}:", "count": 100},
+            {"device": "chopper", "prefix": "SIM:REFERENCE:", "bindings": "epics"}
+        ]
+
+    scenario defaults to "default", bindings to the protocol and count to 1. For groups with
+    a count, {index} in the prefix is replaced by the number of the device, starting at 1.
+    Devices and scenarios that are not declared in registry raise a RuntimeError.
+
+    :param fleet: Path of the file, or an already loaded list of groups.
+    :param protocol: Protocol the fleet is exposed with, the default for bindings.
+    :return: List of (prefix, device_type, scenario, bindings_type) tuples, one per device.
+    """
+    if not isinstance(fleet, list):
+        with open(fleet) as fleet_file:
+            fleet = json.load(fleet_file)
+
+    specifications = []
+    for group in fleet:
+        check_scenario(group['device'], group.get('scenario', 'default'))
+
+        for index in range(1, group.get('count', 1) + 1):
+            specifications.append((str(group['prefix']).format(index=index),
+                                   str(group['device']),
+                                   str(group.get('scenario', 'default')),
+                                   str(group.get('bindings', protocol))))
+
+    return specifications
+
+
+def create_fleet(specifications):
+    """
+    Creates the devices of a fleet, see load_fleet.
+
+    :param specifications: List of (prefix, device_type, scenario, bindings_type) tuples.
+    :return: List of (prefix, device, bindings) tuples that can be passed to Adapter.run_fleet.
+    """
+    return [(prefix, create_device(device_type, scenario), import_bindings(device_type, bindings_type))
+            for prefix, device_type, scenario, bindings_type in specifications]
@@ -17,6 +17,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # *********************************************************************
 
+# Numeric properties that are published together in the SNAPSHOT waveform, in this order
+snapshot = ['speed', 'targetSpeed', 'phase', 'targetPhase', 'parkingPosition', 'targetParkingPosition', 'interlocked']
 
 epics = {
     'SPEED': {'property': 'speed'},
@@ -28,7 +30,7 @@ epics = {
     'PARKPOSITION': {'property': 'parkingPosition'},
     'PARKPOSITION:SP': {'property': 'targetParkingPosition'},
 
-    'STATE': {'type': 'string', 'property': 'state'},
+    'STATE': {'type': 'string', 'property': 'state', 'on_change': True},
 
     'COMMAND': {'type': 'string',
                 'commands': {
@@ -42,5 +44,17 @@ epics = {
                 },
                 'buffer': 'LAST_COMMAND'},
 
-    'LAST_COMMAND': {'type': 'string'}
+    'LAST_COMMAND': {'type': 'string'},
+
+    'SNAPSHOT': {'type': 'float', 'count': len(snapshot), 'snapshot': snapshot,
+                 'poll_interval': 0.1, 'on_change': True},
+
+    # The last minute of speed and phase, one mean value per second of 10 samples
+    'SPEED:HISTORY': {'type': 'float', 'count': 60, 'history': 'speed',
+                      'sample_interval': 0.1, 'decimation': 10, 'reduction': 'mean'},
+    'PHASE:HISTORY': {'type': 'float', 'count': 60, 'history': 'phase',
+                      'sample_interval': 0.1, 'decimation': 10, 'reduction': 'mean'},
+
+    'SPEED:HISTORY:RESET': {'type': 'string', 'commands': {'RESET': 'reset'}, 'history_of': 'SPEED:HISTORY'},
+    'PHASE:HISTORY:RESET': {'type': 'string', 'commands': {'RESET': 'reset'}, 'history_of': 'PHASE:HISTORY'},
 }
@@ -19,4 +19,9 @@
 
 from simulation import SimulatedChopper
 
-chopper = SimulatedChopper()
+
+def create():
+    return SimulatedChopper()
+
+
+chopper = create()
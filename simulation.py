@@ -18,8 +18,13 @@
 # *********************************************************************
 
 import argparse
+import signal
+import sys
+import adapters
 from adapters import import_adapter
-from scenarios import import_device, import_bindings
+import scenarios
+from scenarios import import_device, import_bindings, load_fleet, create_fleet
+from simulation.core import instrumentation, RealTimeClock, ScaledClock, SteppedClock, ManualClock
 
 
 class StoreNameValuePairs(argparse.Action):
@@ -44,23 +49,60 @@ class StoreNameValuePairs(argparse.Action):
 
 parser = argparse.ArgumentParser(
     description='Run a simulated device and expose it via a specified communication protocol.')
-parser.add_argument('-d', '--device', help='Name of the device to simulate.', default='chopper', choices=['chopper'])
-parser.add_argument('-s', '--scenario', help='Name of the scenario to run.', default='default')
+parser.add_argument('-d', '--device', help='Name of the device to simulate.', default='chopper',
+                    choices=sorted(scenarios.registry))
+parser.add_argument('-s', '--scenario', help='Name of the scenario to run.', default='default',
+                    choices=scenarios.scenario_names())
 parser.add_argument('-b', '--bindings', help='Bindings to import from scenarios.device.bindings. '
                                              'If not specified, this defaults to the value of --protocol.')
 parser.add_argument('-p', '--protocol', help='Communication protocol to expose simulation.', default='epics',
-                    choices=['epics'])
+                    choices=sorted(adapters.registry))
 parser.add_argument('-a', '--adapter',
-                    help='Name of adapter class. If not specified, the loader will choose '
-                         'the first adapter it discovers.')
-parser.add_argument('--parameters', help='Additional parameters for the protocol.', action=StoreNameValuePairs)
+                    help='Name of adapter class. If not specified, the adapter declared '
+                         'for the protocol is used.')
+parser.add_argument('--parameters', help='Additional parameters for the protocol.', action=StoreNameValuePairs,
+                    default={})
+parser.add_argument('-f', '--fleet', help='JSON file that lists several devices to simulate in this process, '
+                                          'each with its own PV prefix. Replaces --device, --scenario '
+                                          'and --bindings.')
+parser.add_argument('--instrument', help='Record timing statistics of all processors. '
+                                         'They are written to stderr when the process receives SIGUSR1.',
+                    action='store_true')
+
+parser.add_argument('--clock', help='Clock of the simulation: real time, real time scaled by --time-scale, '
+                                    'steps of --time-step per cycle, or manual, which only advances when requested. '
+                                    'The clock can be controlled via the protocol.',
+                    default='real', choices=['real', 'scaled', 'stepped', 'manual'])
+parser.add_argument('--time-scale', help='Factor by which the scaled clock runs faster than real time.',
+                    type=float, default=1.0)
+parser.add_argument('--time-step', help='Simulated time per cycle of the stepped clock.', type=float, default=0.01)
+parser.add_argument('--paused', help='Start with the clock paused.', action='store_true')
 
 arguments = parser.parse_args()
 
 CommunicationAdapter = import_adapter(arguments.protocol, arguments.adapter)
 
-bindings = import_bindings(arguments.device, arguments.protocol if arguments.bindings is None else arguments.bindings)
-device = import_device(arguments.device, arguments.scenario)
+if arguments.fleet is None:
+    bindings = import_bindings(arguments.device,
+                               arguments.protocol if arguments.bindings is None else arguments.bindings)
+    device = import_device(arguments.device, arguments.scenario)
+else:
+    fleet = create_fleet(load_fleet(arguments.fleet, arguments.protocol))
+
+if arguments.instrument:
+    instrumentation.enable()
+    signal.signal(signal.SIGUSR1, lambda signum, frame: instrumentation.dump(sys.stderr))
+
+clock = {
+    'real': lambda: RealTimeClock(arguments.paused),
+    'scaled': lambda: ScaledClock(arguments.time_scale, arguments.paused),
+    'stepped': lambda: SteppedClock(arguments.time_step, arguments.paused),
+    'manual': lambda: ManualClock(arguments.paused),
+}[arguments.clock]()
 
 adapter = CommunicationAdapter()
-adapter.run(device, bindings, **arguments.parameters)
+
+if arguments.fleet is None:
+    adapter.run(device, bindings, clock=clock, **arguments.parameters)
+else:
+    adapter.run_fleet(fleet, clock=clock, **arguments.parameters)
@@ -45,6 +45,9 @@ class DefaultParkingState(State):
     def on_entry(self, dt):
         self._context.park_commanded = False
 
+    def time_to_event(self):
+        return abs(self._context.target_parking_position - self._context.parking_position) / self._parking_speed
+
 
 class DefaultParkedState(State):
     pass
@@ -64,6 +67,9 @@ class DefaultStoppingState(State):
     def on_entry(self, dt):
         self._context.stop_commanded = False
 
+    def time_to_event(self):
+        return max(self._context.speed, 0.0) / self._acceleration
+
 
 class DefaultStoppedState(State):
     pass
@@ -104,6 +110,9 @@ class DefaultAcceleratingState(State):
     def on_entry(self, dt):
         self._context.start_commanded = False
 
+    def time_to_event(self):
+        return abs(self._context.target_speed - self._context.speed) / self._acceleration
+
 
 class DefaultPhaseLockingState(State):
     def __init__(self, phase_locking_speed=5.0):
@@ -126,6 +135,9 @@ class DefaultPhaseLockingState(State):
     def on_entry(self, dt):
         self._context.phase_commanded = False
 
+    def time_to_event(self):
+        return abs(self._context.target_phase - self._context.phase) / self._phase_locking_speed
+
 
 class DefaultPhaseLockedState(State):
     pass
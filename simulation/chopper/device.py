@@ -18,7 +18,8 @@
 # *********************************************************************
 
 from collections import OrderedDict
-from simulation.core import StateMachine, CanProcessComposite, CanProcess, Context
+from simulation.core import StateMachine, CanProcessComposite, CanProcess, CompactContext, ContextProperty, \
+    depends_on, fast_forward
 from bearings import MagneticBearings
 from defaults import *
 
@@ -61,6 +62,10 @@ class SimulatedBearings(CanProcess, MagneticBearings):
     def doProcess(self, dt):
         self._csm.process(dt)
 
+    def time_to_event(self):
+        # Levitation and delevitation complete immediately, so an event is due while they are in progress
+        return None if self.ready or self.idle else 0.0
+
     @property
     def ready(self):
         return self._csm.state == 'levitated' and self._levitate
@@ -70,7 +75,7 @@ class SimulatedBearings(CanProcess, MagneticBearings):
         return self._csm.state == 'resting' and not self._levitate
 
 
-class ChopperContext(Context):
+class ChopperContext(CompactContext):
     def initialize(self):
         self.speed = 0.0
         self.target_speed = 0.0
@@ -103,7 +108,7 @@ class SimulatedChopper(CanProcessComposite, object):
 
         state_handlers = {
             'init': DefaultInitState(),
-            'bearings': {'in_state': self._bearings},
+            'bearings': {'in_state': self._bearings, 'time_to_event': self._bearings.time_to_event},
             'stopped': DefaultStoppedState(),
             'stopping': DefaultStoppingState(),
             'accelerating': DefaultAcceleratingState(),
@@ -118,39 +123,42 @@ class SimulatedChopper(CanProcessComposite, object):
             state_handlers.update(override_states)
 
         transition_handlers = OrderedDict([
-            (('init', 'bearings'), lambda: self._context.interlocked),
+            (('init', 'bearings'), depends_on('interlocked')(lambda: self._context.interlocked)),
             (('bearings', 'stopped'), lambda: self._bearings.ready),
             (('bearings', 'init'), lambda: self._bearings.idle),
 
-            (('parking', 'parked'), lambda: self._context.parking_position == self._context.target_parking_position),
-            (('parking', 'stopping'), lambda: self._context.stop_commanded),
+            (('parking', 'parked'), depends_on('parking_position', 'target_parking_position')(
+                lambda: self._context.parking_position == self._context.target_parking_position)),
+            (('parking', 'stopping'), depends_on('stop_commanded')(lambda: self._context.stop_commanded)),
 
-            (('parked', 'stopping'), lambda: self._context.stop_commanded),
-            (('parked', 'accelerating'), lambda: self._context.start_commanded),
+            (('parked', 'stopping'), depends_on('stop_commanded')(lambda: self._context.stop_commanded)),
+            (('parked', 'accelerating'), depends_on('start_commanded')(lambda: self._context.start_commanded)),
 
-            (('stopped', 'accelerating'), lambda: self._context.start_commanded),
-            (('stopped', 'parking'), lambda: self._context.park_commanded),
-            (('stopped', 'bearings'), lambda: self._context.shutdown_commanded),
+            (('stopped', 'accelerating'), depends_on('start_commanded')(lambda: self._context.start_commanded)),
+            (('stopped', 'parking'), depends_on('park_commanded')(lambda: self._context.park_commanded)),
+            (('stopped', 'bearings'), depends_on('shutdown_commanded')(lambda: self._context.shutdown_commanded)),
 
-            (('accelerating', 'stopping'), lambda: self._context.stop_commanded),
-            (('accelerating', 'idle'), lambda: self._context.idle_commanded),
-            (('accelerating', 'phase_locking'), lambda: self._context.speed == self._context.target_speed),
+            (('accelerating', 'stopping'), depends_on('stop_commanded')(lambda: self._context.stop_commanded)),
+            (('accelerating', 'idle'), depends_on('idle_commanded')(lambda: self._context.idle_commanded)),
+            (('accelerating', 'phase_locking'), depends_on('speed', 'target_speed')(
+                lambda: self._context.speed == self._context.target_speed)),
 
-            (('idle', 'accelerating'), lambda: self._context.start_commanded),
-            (('idle', 'stopping'), lambda: self._context.stop_commanded),
+            (('idle', 'accelerating'), depends_on('start_commanded')(lambda: self._context.start_commanded)),
+            (('idle', 'stopping'), depends_on('stop_commanded')(lambda: self._context.stop_commanded)),
 
-            (('phase_locking', 'stopping'), lambda: self._context.stop_commanded),
-            (('phase_locking', 'phase_locked'), lambda: self._context.phase == self._context.target_phase),
-            (('phase_locking', 'idle'), lambda: self._context.idle_commanded),
+            (('phase_locking', 'stopping'), depends_on('stop_commanded')(lambda: self._context.stop_commanded)),
+            (('phase_locking', 'phase_locked'), depends_on('phase', 'target_phase')(
+                lambda: self._context.phase == self._context.target_phase)),
+            (('phase_locking', 'idle'), depends_on('idle_commanded')(lambda: self._context.idle_commanded)),
 
-            (('phase_locked', 'accelerating'), lambda: self._context.start_commanded),
-            (('phase_locked', 'phase_locking'), lambda: self._context.phase_commanded),
-            (('phase_locked', 'stopping'), lambda: self._context.stop_commanded),
-            (('phase_locked', 'idle'), lambda: self._context.idle_commanded),
+            (('phase_locked', 'accelerating'), depends_on('start_commanded')(lambda: self._context.start_commanded)),
+            (('phase_locked', 'phase_locking'), depends_on('phase_commanded')(lambda: self._context.phase_commanded)),
+            (('phase_locked', 'stopping'), depends_on('stop_commanded')(lambda: self._context.stop_commanded)),
+            (('phase_locked', 'idle'), depends_on('idle_commanded')(lambda: self._context.idle_commanded)),
 
-            (('stopping', 'accelerating'), lambda: self._context.start_commanded),
-            (('stopping', 'stopped'), lambda: self._context.speed == 0.0),
-            (('stopping', 'idle'), lambda: self._context.idle_commanded),
+            (('stopping', 'accelerating'), depends_on('start_commanded')(lambda: self._context.start_commanded)),
+            (('stopping', 'stopped'), depends_on('speed')(lambda: self._context.speed == 0.0)),
+            (('stopping', 'idle'), depends_on('idle_commanded')(lambda: self._context.idle_commanded)),
         ])
 
         if override_transitions is not None:
@@ -169,9 +177,21 @@ class SimulatedChopper(CanProcessComposite, object):
     def state(self):
         return self._csm.state
 
-    @property
-    def interlocked(self):
-        return self._context.interlocked
+    def advance(self, duration, max_step=None):
+        """
+        Processes the chopper for the given duration, jumping from event to event.
+
+        Instead of fixed cycles, the chopper is processed with steps that end exactly when
+        a ramp (speed, phase or parking position) reaches its target, so that long durations
+        take only a few cycles. See StateMachine.advance for details.
+
+        :param duration: Total time to process.
+        :param max_step: [optional] Step size used in states that do not estimate their events.
+        :return: Number of cycles that were processed.
+        """
+        return fast_forward(self.process, lambda: self._csm.time_to_event(max_step), duration, max_step)
+
+    interlocked = ContextProperty('interlocked')
 
     def interlock(self):
         self._context.interlocked = True
@@ -221,38 +241,11 @@ class SimulatedChopper(CanProcessComposite, object):
         return self._csm.state == 'phase_locked'
 
     # Setpoints etc.
-    @property
-    def speed(self):
-        return self._context.speed
-
-    @property
-    def targetSpeed(self):
-        return self._context.target_speed
-
-    @targetSpeed.setter
-    def targetSpeed(self, new_target_speed):
-        self._context.target_speed = new_target_speed
+    speed = ContextProperty('speed')
+    targetSpeed = ContextProperty('target_speed', writable=True)
 
-    @property
-    def phase(self):
-        return self._context.phase
-
-    @property
-    def targetPhase(self):
-        return self._context.target_phase
-
-    @targetPhase.setter
-    def targetPhase(self, new_target_phase):
-        self._context.target_phase = new_target_phase
-
-    @property
-    def parkingPosition(self):
-        return self._context.parking_position
-
-    @property
-    def targetParkingPosition(self):
-        return self._context.target_parking_position
+    phase = ContextProperty('phase')
+    targetPhase = ContextProperty('target_phase', writable=True)
 
-    @targetParkingPosition.setter
-    def targetParkingPosition(self, new_target_parking_position):
-        self._context.target_parking_position = new_target_parking_position
+    parkingPosition = ContextProperty('parking_position')
+    targetParkingPosition = ContextProperty('target_parking_position', writable=True)
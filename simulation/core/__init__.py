@@ -17,5 +17,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # *********************************************************************
 
-from statemachine import StateMachine, State, Transition, Context
-from processor import CanProcess, CanProcessComposite
+from statemachine import StateMachine, State, Transition, Context, CompactContext, ContextProperty, \
+    subscribe_properties, depends_on, fast_forward
+from processor import CanProcess, CanProcessComposite, PeriodicProcessor, SubSteppingProcessor
+from executor import Executor, ThreadPoolExecutor, ProcessPoolExecutor, RemoteProcessorException
+from scheduler import CycleScheduler
+from clock import Clock, RealTimeClock, ScaledClock, SteppedClock, ManualClock, ClockedProcessor
+from telemetry import RollingStatistics, TimeShare, CycleTelemetry
+from supervisor import Supervisor, shard
@@ -0,0 +1,258 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Vectorized state machines for simulating many identical devices at once.
+
+This module depends on numpy, so it is not imported by simulation.core itself:
+
+    from simulation.core.batch import BatchStateMachine, BatchContext, BatchState
+"""
+
+import numpy as np
+
+from simulation.core.processor import CanProcess
+from simulation.core.statemachine import StateMachineException
+
+_EVENTS = ('on_entry', 'in_state', 'on_exit')
+
+
+class BatchContext(object):
+    """
+    Holds the context of N machines as columns, one numpy array of length N per field:
+
+        context = BatchContext(1000, speed=0.0, target_speed=0.0, start_commanded=False)
+        context.target_speed[:10] = 100.0
+
+    The initial values determine the dtype of the columns. Columns can be modified in
+    place or replaced by arrays of the same length, but no new fields can be added.
+    """
+
+    def __init__(self, size, **fields):
+        object.__setattr__(self, 'size', size)
+        object.__setattr__(self, 'fields', tuple(sorted(fields)))
+
+        for name, value in fields.items():
+            object.__setattr__(self, name, np.full(size, value, dtype=np.asarray(value).dtype))
+
+    @classmethod
+    def from_context(cls, context_type, size):
+        """
+        Creates a BatchContext with the fields and initial values of a Context subclass,
+        as set in its initialize-method.
+
+        :param context_type: Subclass of simulation.core.Context.
+        :param size: Number of machines.
+        :return: BatchContext with one column per public attribute of context_type.
+        """
+        context = context_type()
+
+        names = set(getattr(context, '__dict__', {}))
+        for klass in type(context).__mro__:
+            names.update(getattr(klass, '_fields', ()))
+
+        return cls(size, **dict((name, getattr(context, name)) for name in names if not name.startswith('_')))
+
+    def __setattr__(self, key, value):
+        if key not in self.fields:
+            raise StateMachineException("BatchContext does not have field: '{}'".format(key))
+
+        value = np.asarray(value)
+        if value.shape != (self.size,):
+            raise StateMachineException("Field '{}' must have shape ({},)".format(key, self.size))
+
+        object.__setattr__(self, key, value)
+
+
+class BatchState(object):
+    """
+    Vectorized counterpart of simulation.core.State. Handlers receive the BatchContext,
+    a boolean mask that selects the machines the event applies to, and delta T:
+
+        class AcceleratingState(BatchState):
+            def in_state(self, context, mask, dt):
+                context.speed[mask] += 5.0 * dt
+    """
+
+    def on_entry(self, context, mask, dt):
+        pass
+
+    def in_state(self, context, mask, dt):
+        pass
+
+    def on_exit(self, context, mask, dt):
+        pass
+
+
+class BatchStateMachine(CanProcess):
+    def __init__(self, cfg, size, context=None):
+        """
+        Cycle based state machine that advances N identical machines with one call to process.
+
+        :param cfg: dict which contains state machine configuration, as for simulation.core.StateMachine.
+        :param size: Number of machines.
+        :param context: [optional] BatchContext that is passed to all handlers and conditions.
+
+        The configuration may contain the following keys:
+        - initial: Name of the initial state of all machines
+        - states: [optional] Dict of state handlers, BatchState objects, dicts or iterables of handlers
+        - transitions: [optional] Dict of transitions, use an OrderedDict to control their priority.
+
+        Handlers are called as handler(context, mask, dt), where mask is a boolean array that selects
+        the machines the event applies to. They must only modify the masked elements of the context.
+
+        Transition conditions are called as condition(context) and must return a boolean array
+        of length N (or a single bool), which is True for the machines that should transition.
+
+        As with StateMachine, the first cycle enters the initial state with dt=0 and each machine
+        performs at most one transition per cycle, followed by an in_state event.
+        """
+        super(BatchStateMachine, self).__init__()
+
+        if 'initial' not in cfg:
+            raise StateMachineException("StateMachine configuration must include 'initial' to specify starting state.")
+
+        self._size = size
+        self._context = context
+
+        self._names = []  # State names by index
+        self._indices = {}  # Dict mapping [state name] = index
+        self._handler = []  # List mapping [state index] = {event: handler}
+        self._transition = {}  # Dict mapping [from_state index] = [(to_state index, condition), ...]
+
+        self._initial = self._index(cfg['initial'])
+
+        for state_name, handlers in cfg.get('states', {}).items():
+            index = self._index(state_name)
+
+            if isinstance(handlers, BatchState):
+                handlers = dict((event, getattr(handlers, event)) for event in _EVENTS)
+            elif isinstance(handlers, dict):
+                handlers = dict(handlers)
+            elif hasattr(handlers, '__iter__'):
+                handlers = dict(zip(('on_entry', 'in_state', 'on_exit'), handlers))
+            else:
+                raise StateMachineException(
+                    "Failed to parse state handlers for state '%s'. Must be dict or iterable." % state_name)
+
+            self._handler[index] = dict((event, handlers.get(event)) for event in _EVENTS)
+
+        for (from_state, to_state), condition in cfg.get('transitions', {}).items():
+            if not callable(condition):
+                raise StateMachineException("Transition condition must be callable.")
+
+            self._transition.setdefault(self._index(from_state), []).append((self._index(to_state), condition))
+
+        self._state = np.full(size, -1, dtype=np.int32)  # -1: Outside of any state, enters initial state
+
+    def _index(self, state_name):
+        if state_name not in self._indices:
+            self._indices[state_name] = len(self._names)
+            self._names.append(state_name)
+            self._handler.append(dict.fromkeys(_EVENTS))
+
+        return self._indices[state_name]
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def context(self):
+        return self._context
+
+    @property
+    def states(self):
+        """
+        :return: Array with the index of the current state of each machine, -1 before the first cycle.
+        """
+        return self._state
+
+    def state(self, machine):
+        """
+        :param machine: Index of a machine.
+        :return: Name of the current state of that machine, or None before the first cycle.
+        """
+        index = self._state[machine]
+        return self._names[index] if index >= 0 else None
+
+    def state_names(self):
+        """
+        :return: List with the name of the current state of each machine.
+        """
+        names = self._names + [None]
+        return [names[index] for index in self._state]
+
+    def count(self, state_name):
+        """
+        :return: Number of machines that are currently in the state with the given name.
+        """
+        if state_name not in self._indices:
+            return 0
+
+        return int(np.count_nonzero(self._state == self._indices[state_name]))
+
+    def reset(self, mask=None):
+        """
+        Reset all machines or the ones selected by mask. The next process() will enter the initial state.
+        """
+        if mask is None:
+            self._state[:] = -1
+        else:
+            self._state[mask] = -1
+
+    def _raise_event(self, state, event, mask, dt):
+        handler = self._handler[state][event]
+
+        if handler is not None:
+            handler(self._context, mask, dt)
+
+    def doProcess(self, dt):
+        """
+        Process one cycle of all machines, see StateMachine.doProcess.
+        """
+        state = self._state
+
+        entering = state == -1
+        if entering.any():
+            state[entering] = self._initial
+            self._raise_event(self._initial, 'on_entry', entering, 0)
+            self._raise_event(self._initial, 'in_state', entering, 0)
+
+        current = state.copy()
+
+        for from_state, transitions in self._transition.items():
+            candidates = (current == from_state) & ~entering
+
+            for to_state, condition in transitions:
+                if not candidates.any():
+                    break
+
+                fire = candidates & np.asarray(condition(self._context), dtype=bool)
+                if fire.any():
+                    self._raise_event(from_state, 'on_exit', fire, dt)
+                    state[fire] = to_state
+                    self._raise_event(to_state, 'on_entry', fire, dt)
+                    candidates &= ~fire
+
+        for index, handlers in enumerate(self._handler):
+            if handlers['in_state'] is not None:
+                mask = (state == index) & ~entering
+                if mask.any():
+                    handlers['in_state'](self._context, mask, dt)
@@ -0,0 +1,195 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import threading
+from simulation.core.processor import CanProcess
+
+
+class Clock(object):
+    """
+    A Clock translates the real time that passes between two cycles into the time that passes
+    in the simulation. This base class runs in real time. Subclasses implement other
+    relationships by overriding _advance.
+
+    Every clock can be paused, then no time passes in the simulation, regardless of how much
+    real time passes. Independently of that, the simulation can be advanced by a given amount
+    of time on request, see advance(), which also works while the clock is paused.
+
+    The clock is usually used through ClockedProcessor.
+    """
+
+    def __init__(self, paused=False):
+        self._paused = paused
+        self._pending = 0.0
+        self._time = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def time(self):
+        """
+        :return: Total time that has passed in the simulation.
+        """
+        return self._time
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @paused.setter
+    def paused(self, paused):
+        self._paused = bool(paused)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    @property
+    def pending(self):
+        """
+        :return: Time the simulation will be advanced by in addition on the next tick.
+        """
+        return self._pending
+
+    @pending.setter
+    def pending(self, duration):
+        if duration < 0.0:
+            raise ValueError('Simulation time can not run backwards.')
+
+        with self._lock:
+            self._pending = float(duration)
+
+    def advance(self, duration):
+        """
+        Requests that the simulation is advanced by duration on the next tick, in addition to
+        the time that passes according to the clock itself.
+
+        :param duration: Time to advance the simulation by.
+        """
+        if duration < 0.0:
+            raise ValueError('Simulation time can not run backwards.')
+
+        with self._lock:
+            self._pending += duration
+
+    def tick(self, real_dt):
+        """
+        :param real_dt: Real time that passed since the last tick.
+        :return: Time that passed in the simulation since the last tick.
+        """
+        with self._lock:
+            dt, self._pending = self._pending, 0.0
+
+        if not self._paused:
+            dt += self._advance(real_dt)
+
+        self._time += dt
+
+        return dt
+
+    def _advance(self, real_dt):
+        return real_dt
+
+
+class RealTimeClock(Clock):
+    pass
+
+
+class ScaledClock(Clock):
+    """
+    A Clock that runs factor times faster than real time (or slower, if factor is below 1).
+    """
+
+    def __init__(self, factor, paused=False):
+        super(ScaledClock, self).__init__(paused)
+
+        if factor <= 0.0:
+            raise ValueError('Time scaling factor must be positive.')
+
+        self._factor = factor
+
+    @property
+    def factor(self):
+        return self._factor
+
+    def _advance(self, real_dt):
+        return real_dt * self._factor
+
+
+class SteppedClock(Clock):
+    """
+    A Clock that advances the simulation by the same step on every tick, independently of the
+    real time that passed. Together with a fixed cycle rate this makes runs deterministic, and
+    the simulation runs faster than real time if the step is larger than the cycle period.
+    """
+
+    def __init__(self, step, paused=False):
+        super(SteppedClock, self).__init__(paused)
+
+        if step <= 0.0:
+            raise ValueError('Time step must be positive.')
+
+        self._step = step
+
+    @property
+    def step(self):
+        return self._step
+
+    def _advance(self, real_dt):
+        return self._step
+
+
+class ManualClock(Clock):
+    """
+    A Clock that only advances when requested, see advance().
+    """
+
+    def _advance(self, real_dt):
+        return 0.0
+
+
+class ClockedProcessor(CanProcess):
+    """
+    This subclass of CanProcess wraps another CanProcess item and processes
+    it with the time according to a Clock instead of the dt it receives:
+
+        chopper = ClockedProcessor(SimulatedChopper(), ScaledClock(50.0))
+        chopper.process(0.01)  # Processes the wrapped chopper with dt=0.5
+
+    Other items, for example drivers that serve clients, can keep running in real time.
+    """
+
+    def __init__(self, processor, clock):
+        super(ClockedProcessor, self).__init__()
+
+        self._processor = processor
+        self._clock = clock
+
+    @property
+    def processor(self):
+        return self._processor
+
+    @property
+    def clock(self):
+        return self._clock
+
+    def doProcess(self, dt):
+        self._processor.process(self._clock.tick(dt))
+
@@ -0,0 +1,248 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+from simulation.core.supervisor import shard
+
+# multiprocessing is only imported when an executor needs it, so that importing simulation.core stays fast
+
+
+class Executor(object):
+    """
+    An Executor is used by CanProcessComposite to process the items that were
+    added as independent. At the beginning of a cycle, dispatch is called with
+    the independent items, then the composite processes its other items, and
+    at the end of the cycle join is called, which acts as a barrier.
+
+    The base implementation processes the items one after another in dispatch.
+    """
+
+    def dispatch(self, processors, dt):
+        for processor in processors:
+            processor.process(dt)
+
+    def join(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+def _process_item(item):
+    processor, dt = item
+    processor.process(dt)
+
+
+class ThreadPoolExecutor(Executor):
+    """
+    Processes the independent items of a composite on a pool of threads. Since the
+    threads share the interpreter with the rest of the simulation this is mostly
+    useful for items that release the GIL, for example while waiting for I/O.
+
+    :param workers: Number of threads, defaults to the number of CPUs.
+    """
+
+    def __init__(self, workers=None):
+        super(ThreadPoolExecutor, self).__init__()
+
+        self._workers = workers
+        self._pool = None
+        self._pending = None
+
+    def dispatch(self, processors, dt):
+        if self._pool is None:
+            from multiprocessing.pool import ThreadPool
+            self._pool = ThreadPool(self._workers)
+
+        self._pending = self._pool.map_async(_process_item, [(processor, dt) for processor in processors])
+
+    def join(self):
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.get()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class RemoteProcessorException(Exception):
+    pass
+
+
+class _RemoteCallable(object):
+    """Returned by workers instead of attributes that are callable."""
+
+
+def _serve_processors(connection, processors):
+    """
+    Main function of the worker processes of ProcessPoolExecutor. The processors
+    are owned by this process, the parent only sends commands through connection.
+    """
+    while True:
+        command, index, args = connection.recv()
+
+        if command == 'stop':
+            break
+
+        try:
+            result = None
+
+            if command == 'process':
+                for processor in processors:
+                    processor.process(args)
+            elif command == 'getattr':
+                result = getattr(processors[index], args)
+                if callable(result):
+                    result = _RemoteCallable()
+            elif command == 'setattr':
+                setattr(processors[index], *args)
+            elif command == 'call':
+                name, call_args, call_kwargs = args
+                result = getattr(processors[index], name)(*call_args, **call_kwargs)
+
+            connection.send((True, result))
+        except Exception as e:
+            connection.send((False, '{}: {}'.format(type(e).__name__, e)))
+
+    connection.close()
+
+
+class ProcessPoolExecutor(Executor):
+    """
+    Processes the independent items of a composite in a pool of worker processes.
+
+    On the first cycle, the items are distributed across the workers, which own them
+    from then on. Each cycle only dt is sent to the workers, the state of the items is
+    kept resident in the worker processes. On platforms that fork, the items are not
+    pickled at all, otherwise they are pickled once when the workers are started.
+
+    Because the items live in the workers, the original objects in the parent process
+    are not updated anymore. Use proxy to obtain an object that forwards attribute
+    access and method calls to the worker that owns an item:
+
+        remote_chopper = executor.proxy(chopper)
+        remote_chopper.targetSpeed = 100.0
+        remote_chopper.start()
+
+    Proxies must only be used between cycles. The set of independent items can not be
+    changed after the first cycle.
+
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+    """
+
+    def __init__(self, workers=None):
+        super(ProcessPoolExecutor, self).__init__()
+
+        from multiprocessing import cpu_count
+        self._workers = workers or cpu_count()
+        self._processors = None
+        self._locations = {}
+        self._connections = []
+        self._processes = []
+
+    def _start(self, processors):
+        from multiprocessing import Pipe, Process
+
+        self._processors = tuple(processors)
+
+        for processor_shard in shard(self._processors, self._workers):
+            connection, worker_connection = Pipe()
+            process = Process(target=_serve_processors, args=(worker_connection, processor_shard))
+            process.daemon = True
+            process.start()
+
+            self._connections.append(connection)
+            self._processes.append(process)
+
+            for index, processor in enumerate(processor_shard):
+                self._locations[id(processor)] = (connection, index)
+
+    def dispatch(self, processors, dt):
+        if self._processors is None:
+            self._start(processors)
+        elif len(processors) != len(self._processors):
+            raise RuntimeError('Items can not be added to a ProcessPoolExecutor after the first cycle.')
+
+        for connection in self._connections:
+            connection.send(('process', None, dt))
+
+    def join(self):
+        errors = [result for success, result in [connection.recv() for connection in self._connections]
+                  if not success]
+
+        if errors:
+            raise RemoteProcessorException('Processing failed in worker: {}'.format('; '.join(errors)))
+
+    def shutdown(self):
+        for connection in self._connections:
+            connection.send(('stop', None, None))
+
+        for process in self._processes:
+            process.join()
+
+        self._connections = []
+        self._processes = []
+
+    def proxy(self, processor):
+        """
+        :param processor: Item that was processed by this executor.
+        :return: RemoteProcessor that forwards to the item owned by a worker.
+        """
+        if id(processor) not in self._locations:
+            raise RuntimeError('Item is not owned by a worker of this executor (yet).')
+
+        return RemoteProcessor(self, processor)
+
+    def _request(self, processor, command, args):
+        connection, index = self._locations[id(processor)]
+        connection.send((command, index, args))
+
+        success, result = connection.recv()
+        if not success:
+            raise RemoteProcessorException(result)
+
+        return result
+
+
+class RemoteProcessor(object):
+    """
+    Proxy for an item owned by a worker of a ProcessPoolExecutor, obtained through
+    ProcessPoolExecutor.proxy. Attribute reads and writes as well as method calls are
+    forwarded to the worker, arguments and results must be picklable.
+    """
+
+    def __init__(self, executor, processor):
+        object.__setattr__(self, '_executor', executor)
+        object.__setattr__(self, '_processor', processor)
+
+    def __getattr__(self, name):
+        value = self._executor._request(self._processor, 'getattr', name)
+
+        if not isinstance(value, _RemoteCallable):
+            return value
+
+        def remote_call(*args, **kwargs):
+            return self._executor._request(self._processor, 'call', (name, args, kwargs))
+
+        return remote_call
+
+    def __setattr__(self, name, value):
+        self._executor._request(self._processor, 'setattr', (name, value))
@@ -0,0 +1,113 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Fixed-size history of a numeric value, for exposing recent samples as a waveform.
+
+This module depends on numpy, so it is not imported by simulation.core itself:
+
+    from simulation.core.history import History
+"""
+
+import numpy as np
+
+
+def _last(block):
+    return block[-1]
+
+
+class History(object):
+    """
+    Ring buffer that keeps the last length entries of a sampled value in a preallocated
+    numpy array, so that recording a sample never allocates:
+
+        history = History(600, decimation=10, reduction='mean')
+        history.record(device.speed)
+
+    With a decimation of N, every N samples are reduced to one entry, using one of the
+    reductions 'mean', 'min', 'max' or 'last' (default). The history then spans N times
+    as many samples as it has entries.
+    """
+
+    reductions = {'mean': np.mean, 'min': np.min, 'max': np.max, 'last': _last}
+
+    def __init__(self, length, decimation=1, reduction='last', dtype=float):
+        if length < 1:
+            raise ValueError('History needs a length of at least 1, got {}.'.format(length))
+
+        if decimation < 1:
+            raise ValueError('History needs a decimation of at least 1, got {}.'.format(decimation))
+
+        if reduction not in self.reductions:
+            raise ValueError('Unknown reduction \'{}\', must be one of: {}.'.format(
+                reduction, ', '.join(sorted(self.reductions))))
+
+        self._entries = np.zeros(length, dtype=dtype)
+        self._block = np.zeros(decimation, dtype=dtype)
+        self._reduce = self.reductions[reduction]
+
+        self._next = 0  # Index of the entry that is written next
+        self._count = 0  # Number of valid entries
+        self._pending = 0  # Number of samples in the current block
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def length(self):
+        """
+        :return: Maximum number of entries in the history.
+        """
+        return len(self._entries)
+
+    def record(self, value):
+        """
+        Records a sample. Once enough samples for an entry are collected, the oldest entry
+        is overwritten if the history is full.
+
+        :param value: Sampled value.
+        """
+        self._block[self._pending] = value
+        self._pending += 1
+
+        if self._pending < len(self._block):
+            return
+
+        self._entries[self._next] = self._reduce(self._block)
+        self._pending = 0
+
+        self._next = (self._next + 1) % len(self._entries)
+        self._count = min(self._count + 1, len(self._entries))
+
+    def values(self):
+        """
+        :return: Copy of the valid entries, oldest first.
+        """
+        if self._count < len(self._entries):
+            return self._entries[:self._count].copy()
+
+        return np.roll(self._entries, -self._next)
+
+    def reset(self):
+        """
+        Discards all entries and the samples of an incomplete entry.
+        """
+        self._next = 0
+        self._count = 0
+        self._pending = 0
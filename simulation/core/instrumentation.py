@@ -0,0 +1,165 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Optional timing instrumentation for everything that implements CanProcess.
+
+While instrumentation is enabled, CanProcess.process is replaced by a version that
+records the number of calls, the total time and a latency histogram for each instance,
+including the children of CanProcessComposites and the StateMachines inside devices:
+
+    from simulation.core import instrumentation
+
+    instrumentation.enable()
+    ...
+    instrumentation.dump()
+
+When it is disabled (the default), the original process-method is in place and the
+instrumentation costs nothing. The recorded times include the time spent in nested
+items. Items that override process themselves and items processed in worker processes
+of a ProcessPoolExecutor are not recorded. The statistics of an item are discarded when the
+item itself is garbage collected.
+"""
+
+import sys
+import weakref
+from bisect import bisect_left
+from timeit import default_timer
+
+from simulation.core.processor import CanProcess, CanProcessComposite
+
+# Upper bounds of the histogram buckets in seconds, the last bucket collects everything above
+HISTOGRAM_BOUNDS = tuple(2.0 ** exponent * 1e-6 for exponent in range(21))
+
+
+class ProcessorStatistics(object):
+    """
+    Timing statistics of one CanProcess instance.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def record(self, duration):
+        self.count += 1
+        self.total += duration
+
+        if duration > self.max:
+            self.max = duration
+
+        self.histogram[bisect_left(HISTOGRAM_BOUNDS, duration)] += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        """
+        Estimates a percentile from the histogram.
+
+        :param fraction: Percentile as a fraction, for example 0.99
+        :return: Upper bound of the histogram bucket that contains the percentile.
+        """
+        threshold = fraction * self.count
+        accumulated = 0
+
+        for bound, count in zip(HISTOGRAM_BOUNDS, self.histogram):
+            accumulated += count
+            if accumulated >= threshold:
+                return bound
+
+        return self.max
+
+
+_uninstrumented_process = CanProcess.__dict__['process']
+_statistics = weakref.WeakKeyDictionary()  # Does not keep processors alive that are otherwise gone
+
+
+def _timed_process(self, dt):
+    start = default_timer()
+    _uninstrumented_process(self, dt)
+    duration = default_timer() - start
+
+    try:
+        _statistics[self].record(duration)
+    except KeyError:
+        _statistics[self] = ProcessorStatistics('{}@0x{:x}'.format(type(self).__name__, id(self)))
+        _statistics[self].record(duration)
+
+
+def enable():
+    """
+    Starts recording timing statistics for all CanProcess instances.
+    """
+    if not CanProcess._instrumented:
+        CanProcess.process = _timed_process
+        CanProcess._instrumented = True
+        CanProcessComposite._plan_generation += 1
+
+
+def disable():
+    """
+    Stops recording and restores the original CanProcess.process. Statistics recorded so far are kept.
+    """
+    if CanProcess._instrumented:
+        CanProcess.process = _uninstrumented_process
+        CanProcess._instrumented = False
+        CanProcessComposite._plan_generation += 1
+
+
+def is_enabled():
+    return CanProcess._instrumented
+
+
+def reset():
+    """
+    Discards all recorded statistics.
+    """
+    _statistics.clear()
+
+
+def statistics(processor=None):
+    """
+    Query the recorded statistics, this can be done at any time, also while running.
+
+    :param processor: [optional] Return only the statistics of this CanProcess instance.
+    :return: ProcessorStatistics of processor (or None) or a list of all statistics, sorted by total time.
+    """
+    if processor is not None:
+        return _statistics.get(processor)
+
+    return sorted(_statistics.values(), key=lambda stats: stats.total, reverse=True)
+
+
+def dump(stream=None):
+    """
+    Writes a table of all recorded statistics, sorted by total time, to stream (default: stdout).
+    """
+    stream = stream if stream is not None else sys.stdout
+
+    stream.write('{:<40} {:>10} {:>12} {:>12} {:>12} {:>12}\n'.format(
+        'Processor', 'Calls', 'Total [s]', 'Mean [ms]', 'p99 [ms]', 'Max [ms]'))
+
+    for stats in statistics():
+        stream.write('{:<40} {:>10} {:>12.3f} {:>12.4f} {:>12.4f} {:>12.4f}\n'.format(
+            stats.name, stats.count, stats.total, stats.mean * 1e3, stats.percentile(0.99) * 1e3, stats.max * 1e3))
@@ -17,6 +17,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # *********************************************************************
 
+from functools import partial
+from math import ceil
+from simulation.core.executor import Executor
+
+
 class CanProcess(object):
     """
     The CanProcess class is meant as a base for all things that
@@ -31,8 +36,13 @@ class CanProcess(object):
         3. doAfterProcess
 
     The doBefore- and doAfterProcess methods are only called if a doProcess-method exists.
+
+    The time spent in process can be recorded per instance, see simulation.core.instrumentation.
     """
 
+    # Set by simulation.core.instrumentation while process is replaced by a timed version
+    _instrumented = False
+
     def __init__(self):
         super(CanProcess, self).__init__()
 
@@ -61,26 +71,301 @@ class CanProcessComposite(CanProcess):
         composite.addProcessor(item_that_implements_CanProcess)
 
     The process-method calls the process-method of each contained
-    item. Specific things that have to be done before or after the
+    item. Items that do not need to run on every cycle can be added
+    with their own period (in units of dt) or decimation factor:
+
+        composite.addProcessor(bearings, period=0.1)
+        composite.addProcessor(diagnostics, decimation=10)
+
+    Such items are wrapped in a PeriodicProcessor, see there for details.
+
+    Items that do not interact with any other item can be marked as independent:
+
+        composite = CanProcessComposite(executor=ThreadPoolExecutor())
+        composite.addProcessor(chopper, independent=True)
+
+    Independent items are handed to the executor at the beginning of each cycle,
+    then the other items are processed, and finally the composite waits for the
+    executor to finish, so that all items have been processed when the cycle ends.
+    Without an executor, independent items are processed one after the other.
+
+    Specific things that have to be done before or after the
     containing items are processed can be implemented in the doBefore-
     and doAfterProcess methods.
+
+    If the composite is constructed with compiled=True, the tree of contained
+    items is flattened once into a plan, a flat tuple of pre-bound doBeforeProcess,
+    doProcess and doAfterProcess methods, which is then executed on each cycle
+    without any further attribute lookups. Nested composites are inlined into the
+    plan of their parent. The plan is rebuilt automatically whenever addProcessor
+    changes the tree, including the trees of nested composites. Items that override
+    the process-method itself are not flattened, their process-method is used instead.
+    The same is true for all items while instrumentation is enabled, so that each
+    item is timed individually.
     """
 
-    def __init__(self, iterable=()):
+    # Incremented to invalidate the plans of all compiled composites at once
+    _plan_generation = 0
+
+    def __init__(self, iterable=(), compiled=False, executor=None):
         super(CanProcessComposite, self).__init__()
 
         self._processors = []
+        self._independent = []
+        self._parents = []
+
+        self._executor = executor if executor is not None else Executor()
+
+        self._compiled = compiled
+        self._plan = None
+        self._plan_compiled_in = None
 
         for item in iterable:
             self.addProcessor(item)
 
-    def addProcessor(self, other):
+    def addProcessor(self, other, period=None, decimation=None, independent=False):
         if isinstance(other, CanProcess):
-            self._appendProcessor(other)
+            if period is not None or decimation is not None:
+                other = PeriodicProcessor(other, period=period, decimation=decimation)
 
-    def _appendProcessor(self, processor):
-        self._processors.append(processor)
+            self._appendProcessor(other, independent)
+
+    def _appendProcessor(self, processor, independent=False):
+        if independent:
+            self._independent.append(processor)
+        else:
+            self._processors.append(processor)
+
+        if isinstance(processor, CanProcessComposite):
+            processor._parents.append(self)
+
+        self._invalidatePlan()
+
+    def _invalidatePlan(self):
+        self._plan = None
+
+        for parent in self._parents:
+            parent._invalidatePlan()
+
+    def _compilePlan(self):
+        plan = []
+
+        if self._independent:
+            plan.append(partial(self._executor.dispatch, self._independent))
 
-    def doProcess(self, dt):
         for processor in self._processors:
-            processor.process(dt)
+            plan.extend(_compile_process_plan(processor))
+
+        if self._independent:
+            join = self._executor.join
+            plan.append(lambda dt: join())
+
+        return tuple(plan)
+
+    def doProcess(self, dt):
+        if self._compiled:
+            if self._plan is None or self._plan_compiled_in != CanProcessComposite._plan_generation:
+                self._plan = self._compilePlan()
+                self._plan_compiled_in = CanProcessComposite._plan_generation
+
+            for step in self._plan:
+                step(dt)
+        else:
+            if self._independent:
+                self._executor.dispatch(self._independent, dt)
+
+            for processor in self._processors:
+                processor.process(dt)
+
+            if self._independent:
+                self._executor.join()
+
+
+class PeriodicProcessor(CanProcess):
+    """
+    This subclass of CanProcess wraps another CanProcess item that should
+    not be processed on every cycle. The wrapper adds up the time that has
+    passed and processes the item only when either its period has elapsed
+    or decimation cycles have passed:
+
+        slow_bearings = PeriodicProcessor(bearings, period=0.1)
+        slow_bearings.process(0.01)  # Does nothing
+        ...
+        slow_bearings.process(0.01)  # Processes bearings with dt=0.1
+
+    The item always receives the real accumulated dt, so that the total
+    time it sees is the same as if it had been processed on every cycle.
+    """
+
+    def __init__(self, processor, period=None, decimation=None):
+        super(PeriodicProcessor, self).__init__()
+
+        if (period is None) == (decimation is None):
+            raise ValueError('Exactly one of period and decimation must be specified.')
+
+        if (period is not None and period <= 0.0) or (decimation is not None and decimation < 1):
+            raise ValueError('Period must be positive and decimation must be at least 1.')
+
+        self._processor = processor
+        self._period = period
+        self._decimation = decimation
+
+        self._elapsed = 0.0
+        self._cycles = 0
+
+    @property
+    def processor(self):
+        return self._processor
+
+    @property
+    def elapsed(self):
+        """
+        :return: Time accumulated since the wrapped item was last processed.
+        """
+        return self._elapsed
+
+    def doProcess(self, dt):
+        self._elapsed += dt
+        self._cycles += 1
+
+        if self._period is not None:
+            # The tolerance absorbs rounding errors of the sum, 10 * 0.01 must reach a period of 0.1
+            if self._elapsed < self._period * (1.0 - 1e-9):
+                return
+        elif self._cycles < self._decimation:
+            return
+
+        elapsed, self._elapsed, self._cycles = self._elapsed, 0.0, 0
+        self._processor.process(elapsed)
+
+
+class SubSteppingProcessor(CanProcess):
+    """
+    This subclass of CanProcess wraps another CanProcess item and splits
+    each incoming dt into equal sub-steps that are no larger than max_step,
+    processing the wrapped item once per sub-step. This keeps the fidelity
+    of the wrapped item when dt becomes large, for example because the loop
+    that drives the simulation stalled or runs at a low rate:
+
+        chopper = SubSteppingProcessor(SimulatedChopper(), max_step=0.01)
+        chopper.process(1.0)  # Processes the wrapped chopper 100 times with dt=0.01
+
+    If max_substeps is specified, a dt that requires more sub-steps is an
+    overrun, which is handled according to the overrun policy:
+
+        - CATCH_UP: All sub-steps are processed anyway.
+        - CLAMP: Only max_substeps sub-steps of max_step are processed, the
+                 remaining time is discarded.
+        - DROP: The dt is discarded entirely, nothing is processed.
+
+    The number of sub-steps taken and the number of overruns are counted.
+    """
+
+    CATCH_UP = 'catch_up'
+    CLAMP = 'clamp'
+    DROP = 'drop'
+
+    def __init__(self, processor, max_step, max_substeps=None, overrun=CATCH_UP):
+        super(SubSteppingProcessor, self).__init__()
+
+        if max_step <= 0.0:
+            raise ValueError('Maximum step size must be positive.')
+
+        if overrun not in (self.CATCH_UP, self.CLAMP, self.DROP):
+            raise ValueError('Unknown overrun policy: \'{}\''.format(overrun))
+
+        self._processor = processor
+        self._max_step = max_step
+        self._max_substeps = max_substeps
+        self._overrun = overrun
+
+        self._substeps = 0
+        self._last_substeps = 0
+        self._overruns = 0
+
+    @property
+    def processor(self):
+        return self._processor
+
+    @property
+    def substeps(self):
+        """
+        :return: Total number of sub-steps taken.
+        """
+        return self._substeps
+
+    @property
+    def lastSubsteps(self):
+        """
+        :return: Number of sub-steps taken in the last cycle.
+        """
+        return self._last_substeps
+
+    @property
+    def overruns(self):
+        """
+        :return: Number of cycles that required more than max_substeps sub-steps.
+        """
+        return self._overruns
+
+    def doProcess(self, dt):
+        # The factor guards against rounding up when dt is a multiple of max_step
+        steps = max(1, int(ceil(dt / self._max_step * (1.0 - 1e-12))))
+        step = dt / steps
+
+        if self._max_substeps is not None and steps > self._max_substeps:
+            self._overruns += 1
+
+            if self._overrun == self.DROP:
+                steps = 0
+            elif self._overrun == self.CLAMP:
+                steps, step = self._max_substeps, self._max_step
+
+        for _ in range(steps):
+            self._processor.process(step)
+
+        self._last_substeps = steps
+        self._substeps += steps
+
+
+def _overrides(processor, name, base):
+    """
+    Returns True if processor provides a method called name that is different from the one
+    implemented in base, either in its class or on the instance itself.
+    """
+    if name in getattr(processor, '__dict__', {}):
+        return True
+
+    own, inherited = getattr(type(processor), name, None), getattr(base, name, None)
+
+    return getattr(own, '__func__', own) is not getattr(inherited, '__func__', inherited)
+
+
+def _compile_process_plan(processor):
+    """
+    Returns a list of bound methods that, called in order with dt, are equivalent
+    to calling processor.process(dt). Nested CanProcessComposites are inlined.
+
+    :param processor: CanProcess object to compile.
+    :return: List of callables that take dt as the only argument.
+    """
+    if CanProcess._instrumented or _overrides(processor, 'process', CanProcess):
+        return [processor.process]
+
+    if not hasattr(processor, 'doProcess'):
+        return []
+
+    plan = []
+
+    if hasattr(processor, 'doBeforeProcess'):
+        plan.append(processor.doBeforeProcess)
+
+    if isinstance(processor, CanProcessComposite) and not _overrides(processor, 'doProcess', CanProcessComposite):
+        plan.extend(processor._compilePlan())
+    else:
+        plan.append(processor.doProcess)
+
+    if hasattr(processor, 'doAfterProcess'):
+        plan.append(processor.doAfterProcess)
+
+    return plan
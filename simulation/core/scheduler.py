@@ -0,0 +1,249 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import os
+import sys
+import threading
+import time
+from math import floor
+from timeit import default_timer
+
+
+def _clock_monotonic():
+    """
+    Returns a function that reads CLOCK_MONOTONIC via clock_gettime, or None if it is not
+    available. Only Linux is supported, where CLOCK_MONOTONIC is 1.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+
+    import ctypes
+
+    class Timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    # Before glibc 2.17, clock_gettime is only found in librt
+    for library in ('librt.so.1', None):
+        try:
+            clock_gettime = ctypes.CDLL(library, use_errno=True).clock_gettime
+            break
+        except (OSError, AttributeError):
+            pass
+    else:
+        return None
+
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+
+    def monotonic():
+        timespec = Timespec()
+        if clock_gettime(1, ctypes.byref(timespec)) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        return timespec.tv_sec + timespec.tv_nsec * 1e-9
+
+    return monotonic
+
+
+# Python 3 provides a monotonic clock. On Python 2, default_timer is the wall clock, which can
+# jump when the system time is set, so clock_gettime is used where possible.
+monotonic = getattr(time, 'monotonic', None) or _clock_monotonic() or default_timer
+
+
+class CycleScheduler(object):
+    """
+    Calls a cycle function at a fixed rate. The deadline of each cycle is an absolute point in
+    time on a regular grid that starts when the scheduler is run, so that delays in one cycle
+    do not accumulate as drift:
+
+        scheduler = CycleScheduler(chopper.process, rate=100.0)
+        scheduler.run()  # Calls chopper.process(dt) 100 times per second until stop() is called
+
+    The cycle function is called with the time that has passed since the start of the previous
+    cycle. When a cycle ends after the deadline of the next cycle, this is an overrun, which is
+    handled according to the overrun policy:
+
+        - CATCH_UP: The missed cycles are run back to back without waiting, until the
+                    scheduler is back on the grid.
+        - SKIP: The missed deadlines are skipped, the next cycle runs at the next deadline
+                on the grid.
+        - RESET: The grid is restarted, the next cycle runs immediately.
+
+    Between cycles, the scheduler waits by calling sleep with the remaining time until the
+    deadline, repeatedly if it returns early. This can be a function that does useful work
+    while waiting, for example servicing a server. If the timer goes backwards, the grid is
+    restarted at the new time instead of waiting for the old deadline.
+
+    If a lock is specified, it is held while the cycle function runs, so that other threads
+    can safely access the simulation while the scheduler runs on its own thread, see start().
+
+    :param cycle: Function that takes dt.
+    :param rate: Number of cycles per second.
+    :param overrun: [optional] Overrun policy, one of CATCH_UP, SKIP and RESET.
+    :param lock: [optional] Lock that is held during each cycle.
+    :param timer: [optional] Function that returns a monotonic time in seconds.
+    :param sleep: [optional] Function that waits for the given number of seconds.
+    :param telemetry: [optional] CycleTelemetry that records cycle times and overruns.
+    """
+
+    CATCH_UP = 'catch_up'
+    SKIP = 'skip'
+    RESET = 'reset'
+
+    def __init__(self, cycle, rate, overrun=SKIP, lock=None, timer=monotonic, sleep=time.sleep, telemetry=None):
+        if rate <= 0.0:
+            raise ValueError('Cycle rate must be positive.')
+
+        if overrun not in (self.CATCH_UP, self.SKIP, self.RESET):
+            raise ValueError('Unknown overrun policy: \'{}\''.format(overrun))
+
+        self._cycle = cycle
+        self._period = 1.0 / rate
+        self._overrun = overrun
+        self._lock = lock
+        self._timer = timer
+        self._sleep = sleep
+        self._telemetry = telemetry
+
+        self._running = False
+        self._thread = None
+        self._error = None
+        self._cycles = 0
+        self._overruns = 0
+
+    @property
+    def period(self):
+        return self._period
+
+    @property
+    def cycles(self):
+        """
+        :return: Number of cycles that were run.
+        """
+        return self._cycles
+
+    @property
+    def overruns(self):
+        """
+        :return: Number of cycles that ended after the deadline of the next cycle.
+        """
+        return self._overruns
+
+    @property
+    def running(self):
+        return self._running
+
+    def run(self, cycles=None):
+        """
+        Runs cycles until stop() is called or the given number of cycles has been run.
+
+        :param cycles: [optional] Number of cycles to run.
+        """
+        self._running = True
+        self._run(cycles)
+
+    def _run(self, cycles=None):
+        try:
+            self._run_cycles(cycles)
+        finally:
+            self._running = False
+
+    def _run_thread(self):
+        try:
+            self._run()
+        except Exception:
+            self._error = sys.exc_info()
+
+    def _run_cycles(self, cycles):
+        timer = self._timer
+        period = self._period
+
+        last = deadline = timer()
+        remaining = cycles
+
+        while self._running and (remaining is None or remaining > 0):
+            now = timer()
+            while now < deadline:
+                if now < last:
+                    # Only a timer that is not monotonic goes backwards, the grid is restarted
+                    last = deadline = now
+                    break
+
+                self._sleep(deadline - now)
+                now = timer()
+
+            if self._lock is not None:
+                with self._lock:
+                    self._cycle(now - last)
+            else:
+                self._cycle(now - last)
+
+            last = now
+            self._cycles += 1
+            if remaining is not None:
+                remaining -= 1
+
+            deadline += period
+            end = timer()
+
+            if self._telemetry is not None:
+                self._telemetry.record_cycle(end - now)
+
+            if end > deadline:
+                self._overruns += 1
+
+                if self._telemetry is not None:
+                    self._telemetry.record_overrun()
+
+                if self._overrun == self.SKIP:
+                    deadline += floor((end - deadline) / period + 1.0) * period
+                elif self._overrun == self.RESET:
+                    deadline = end
+
+    def start(self):
+        """
+        Runs the scheduler on a separate daemon thread. If a cycle raises an exception, the
+        thread ends, running becomes false and stop() re-raises the exception.
+
+        :return: The thread.
+        """
+        self._running = True
+        self._error = None
+        self._thread = threading.Thread(target=self._run_thread, name='CycleScheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self._thread
+
+    def stop(self, timeout=None):
+        """
+        Stops the scheduler after the current cycle. If it runs on its own thread,
+        the thread is joined, and an exception that ended the thread is re-raised.
+
+        :param timeout: [optional] Maximum time to wait for the thread.
+        """
+        self._running = False
+
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            self._thread = None
+
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error[0], error[1], error[2]
@@ -17,8 +17,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # *********************************************************************
 
+import inspect
 from simulation.core.processor import CanProcess
 
+try:
+    _getargspec = inspect.getfullargspec
+except AttributeError:
+    _getargspec = inspect.getargspec
+
 
 class StateMachineException(Exception):
     pass
@@ -26,9 +32,29 @@ class StateMachineException(Exception):
 
 # Derived from http://stackoverflow.com/a/3603824
 class Context(object):
-    __is_frozen = False
+    """
+    Base class for the data that is shared between the states and transitions of a StateMachine.
+
+    Attributes are set in initialize, afterwards the context is frozen, so that no new attributes
+    can be added. Each write to an attribute after freezing increases the revision of the context,
+    which is recorded for that attribute, see revision().
+
+    Observers can subscribe to changes of attributes, see subscribe(). Changes are collected
+    and passed on to the observers when notify() is called, which StateMachine does after each
+    cycle for its context.
+
+    For large numbers of contexts, see CompactContext.
+    """
+    __slots__ = ('__is_frozen', '__revision', '__revisions', '__observers', '__changes')
 
     def __init__(self):
+        object.__setattr__(self, '_Context__is_frozen', False)
+        object.__setattr__(self, '_Context__observers', [])
+        object.__setattr__(self, '_Context__changes', None)
+
+        self.__revision = [0]
+        self.__revisions = {}
+
         self.initialize()
         self._freeze()
 
@@ -39,9 +65,345 @@ class Context(object):
         self.__is_frozen = True
 
     def __setattr__(self, key, value):
-        if self.__is_frozen and not hasattr(self, key):
-            raise StateMachineException("Class {} does not have attribute: '{}'".format(self.__class__.__name__, key))
+        if self.__is_frozen:
+            if not hasattr(self, key):
+                raise StateMachineException(
+                    "Class {} does not have attribute: '{}'".format(self.__class__.__name__, key))
+
+            revision = self.__revision
+            revision[0] += 1
+            self.__revisions[key] = revision[0]
+
+            changes = self.__changes
+            if changes is not None and key not in changes:
+                changes[key] = getattr(self, key)
+
+        object.__setattr__(self, key, value)
+
+    def revision(self, *fields):
+        """
+        :param fields: [optional] Names of attributes.
+        :return: Revision of the last write to any of fields, or to any attribute if no fields are given.
+        """
+        if not fields:
+            return self.__revision[0]
+
+        revisions = self.__revisions
+
+        return max(revisions.get(field, 0) for field in fields)
+
+    def subscribe(self, callback, fields=None):
+        """
+        Subscribes callback to changes of attributes. On notify(), the callback is called with
+        a dict that maps each attribute that changed since the last notification to a tuple
+        of its old and new value:
+
+            context.subscribe(lambda changes: log(changes), ['speed'])  # {'speed': (0.0, 1.5)}
+
+        Attributes that were written to, but have the same value as before, are not reported.
+        Old values are only recorded while there are observers, so a context without observers
+        does not pay for them.
+
+        :param callback: Function that takes a dict of changes.
+        :param fields: [optional] Names of attributes the callback is interested in, all if omitted.
+        :return: callback, so that it can be passed to unsubscribe.
+        """
+        if fields is not None:
+            fields = frozenset(fields)
+            unknown = [field for field in fields if not hasattr(self, field)]
+            if unknown:
+                raise StateMachineException(
+                    "Class {} does not have attributes: {}".format(self.__class__.__name__, ', '.join(unknown)))
+
+        self.__observers.append((callback, fields))
+
+        if self.__changes is None:
+            object.__setattr__(self, '_Context__changes', {})
+
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        Removes all subscriptions of callback.
+
+        :param callback: Function that was passed to subscribe.
+        """
+        observers = [observer for observer in self.__observers if observer[0] is not callback]
+        object.__setattr__(self, '_Context__observers', observers)
+
+        if not observers:
+            object.__setattr__(self, '_Context__changes', None)
+
+    def notify(self):
+        """
+        Passes the changes since the last call on to the subscribed callbacks, see subscribe().
+        """
+        changes = self.__changes
+        if not changes:
+            return
+
+        object.__setattr__(self, '_Context__changes', {})
+
+        changed = {}
+        for field, old in changes.iteritems():
+            new = getattr(self, field)
+            if new != old:
+                changed[field] = (old, new)
+
+        if not changed:
+            return
+
+        for callback, fields in list(self.__observers):
+            if fields is None:
+                callback(dict(changed))
+            else:
+                selected = dict((field, change) for field, change in changed.iteritems() if field in fields)
+                if selected:
+                    callback(selected)
+
+
+# Slots of CompactContext itself that hold its bookkeeping, they are not fields
+_COMPACT_SLOTS = ('_CompactContext__revisions',)
+
+
+def _is_field(name):
+    return not (name.startswith('__') and name.endswith('__')) and name not in _COMPACT_SLOTS
+
+
+class _CompactContextType(type):
+    """
+    Metaclass of CompactContext. When a subclass is created, its initialize-method is run
+    on an instance of a twin class without __slots__ to find the attributes it sets, which
+    become the __slots__ of the class. Because the class does not exist yet at that point,
+    initialize must call the initialize of a base class explicitly instead of through super().
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        inherited = tuple(field for base in bases for field in getattr(base, '_fields', ()))
+
+        if '__slots__' not in namespace:
+            recorder_type = type.__new__(mcs, name, bases, dict(namespace, __setattr__=object.__setattr__))
+            recorder = object.__new__(recorder_type)
+
+            try:
+                recorder.initialize()
+            except Exception as e:
+                raise StateMachineException(
+                    'Could not determine the fields of {} from initialize ({}: {}), '
+                    'please specify __slots__.'.format(name, type(e).__name__, e))
+
+            namespace['__slots__'] = tuple(sorted(field for field in vars(recorder) if field not in inherited))
+
+        namespace['_fields'] = inherited + tuple(field for field in namespace['__slots__'] if _is_field(field))
+        namespace['_field_index'] = dict((field, index) for index, field in enumerate(namespace['_fields']))
+
+        return super(_CompactContextType, mcs).__new__(mcs, name, bases, namespace)
+
+
+def _compact_init(self):
+    revisions = [0] * (len(self._fields) + 1)
+    object.__setattr__(self, '_CompactContext__revisions', revisions)
+    object.__setattr__(self, '_Context__observers', [])
+    object.__setattr__(self, '_Context__changes', None)
+
+    self.initialize()
+
+    # Like Context, writes in initialize do not count as revisions
+    revisions[:] = [0] * len(revisions)
+
+
+def _compact_setattr(self, key, value):
+    changes = self._Context__changes
+    if changes is not None and key not in changes and key in self._field_index:
+        changes[key] = getattr(self, key)
+
+    try:
         object.__setattr__(self, key, value)
+    except AttributeError:
+        raise StateMachineException("Class {} does not have attribute: '{}'".format(self.__class__.__name__, key))
+
+    revisions = self._CompactContext__revisions
+    revisions[-1] += 1
+    revisions[self._field_index[key]] = revisions[-1]
+
+
+def _compact_revision(self, *fields):
+    """
+    :param fields: [optional] Names of attributes.
+    :return: Revision of the last write to any of fields, or to any attribute if no fields are given.
+    """
+    revisions = self._CompactContext__revisions
+
+    if not fields:
+        return revisions[-1]
+
+    index = self._field_index
+
+    return max(revisions[index[field]] for field in fields)
+
+
+# Created through the metaclass directly, so that this works with Python 2 and 3 syntax
+CompactContext = _CompactContextType('CompactContext', (Context,), {
+    '__doc__': """
+    A Context whose attributes are stored in __slots__ instead of an instance __dict__.
+
+    Subclasses are written exactly like other Contexts:
+
+        class ChopperContext(CompactContext):
+            def initialize(self):
+                self.speed = 0.0
+
+    When the class is created, initialize is run once on a twin of the class that has an
+    instance __dict__ to find the attributes it sets, which become the __slots__ of the class.
+    Because the class itself does not exist yet at that point, initialize must call the
+    initialize of a base class explicitly (Base.initialize(self)) instead of through super(),
+    alternatively __slots__ can be specified explicitly. There is no per-instance __dict__,
+    which reduces the memory footprint, and new attributes can never be added, so no check
+    is needed when writing. Revisions are tracked as for Context.
+
+    Note that initialize therefore also runs once when the module that defines the class is
+    imported, so it should not have side effects beyond setting attributes. Classes whose
+    initialize can not run at that point must specify __slots__.
+    """,
+    '__slots__': _COMPACT_SLOTS,
+    '__init__': _compact_init,
+    '__setattr__': _compact_setattr,
+    'revision': _compact_revision,
+})
+
+
+class ContextProperty(object):
+    """
+    Property of a device that reads, and optionally writes, an attribute of the device's context:
+
+        class Device(object):
+            speed = ContextProperty('speed')
+            targetSpeed = ContextProperty('target_speed', writable=True)
+
+    Changes of such properties can be observed without polling, see subscribe_properties.
+
+    :param field: Name of the attribute of the context.
+    :param writable: [optional] If True, the property can also be set.
+    :param context: [optional] Name of the attribute of the device that holds the context.
+    :param doc: [optional] Docstring of the property.
+    """
+
+    def __init__(self, field, writable=False, context='_context', doc=None):
+        self.field = field
+        self.writable = writable
+        self._context_attribute = context
+        self.__doc__ = doc
+
+    def context(self, instance):
+        """
+        :param instance: Device that owns the property.
+        :return: The Context that holds the value of the property.
+        """
+        return getattr(instance, self._context_attribute)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        return getattr(getattr(instance, self._context_attribute), self.field)
+
+    def __set__(self, instance, value):
+        if not self.writable:
+            raise AttributeError("can't set attribute")
+
+        setattr(getattr(instance, self._context_attribute), self.field, value)
+
+
+def subscribe_properties(target, callback, properties):
+    """
+    Subscribes callback to changes of those properties of target that are ContextProperty.
+    The callback is called with a dict that maps property names to tuples of old and new value
+    whenever the underlying context notifies its observers, see Context.subscribe.
+
+    :param target: Object with ContextProperty attributes, usually a device.
+    :param callback: Function that takes a dict of changes.
+    :param properties: Names of the properties that should be observed.
+    :return: Set of the names that could be subscribed to, the others have to be polled.
+    """
+    contexts = {}
+    for name in properties:
+        descriptor = getattr(type(target), name, None)
+
+        if isinstance(descriptor, ContextProperty):
+            context = descriptor.context(target)
+            names_by_field = contexts.setdefault(id(context), (context, {}))[1]
+            names_by_field.setdefault(descriptor.field, []).append(name)
+
+    def translate(names_by_field):
+        def translated_callback(changes):
+            callback(dict((name, change)
+                          for field, change in changes.iteritems() for name in names_by_field[field]))
+
+        return translated_callback
+
+    subscribed = set()
+    for context, names_by_field in contexts.values():
+        context.subscribe(translate(names_by_field), names_by_field.keys())
+
+        for names in names_by_field.values():
+            subscribed.update(names)
+
+    return subscribed
+
+
+def depends_on(*fields):
+    """
+    Declares the Context attributes a transition condition reads:
+
+        depends_on('speed', 'target_speed')(lambda: context.speed == context.target_speed)
+
+    A StateMachine only re-evaluates such a condition if one of the attributes has been written
+    since it was last evaluated, otherwise the previous result is re-used. Conditions must then
+    not depend on anything else than these attributes of the StateMachine's context. Transition
+    subclasses can set the depends_on class attribute instead.
+
+    :param fields: Names of Context attributes the condition depends on.
+    :return: Decorator that marks a condition.
+    """
+
+    def decorator(condition):
+        condition.depends_on = fields
+        return condition
+
+    return decorator
+
+
+class _TrackedCondition(object):
+    """
+    Wraps a transition condition with declared dependencies and caches its result
+    until one of the dependencies is written to. The dependencies are checked here,
+    so that a misspelled field fails when the transition is added, instead of caching
+    the first result forever or failing in the middle of a cycle.
+    """
+
+    def __init__(self, condition, context, fields):
+        if not callable(getattr(context, 'revision', None)):
+            raise StateMachineException(
+                'Conditions with depends_on require a Context, not {}.'.format(type(context).__name__))
+
+        index = getattr(context, '_field_index', None)  # Only a CompactContext has one
+        unknown = [field for field in fields if not (field in index if index is not None else hasattr(context, field))]
+        if unknown:
+            raise StateMachineException(
+                "Class {} does not have attributes: {}".format(type(context).__name__, ', '.join(unknown)))
+
+        self._condition = condition
+        self._context = context
+        self._fields = tuple(fields)
+        self._evaluated_at = -1
+        self._result = False
+
+    def __call__(self):
+        if self._context.revision(*self._fields) > self._evaluated_at:
+            self._evaluated_at = self._context.revision()
+            self._result = self._condition()
+
+        return self._result
 
 
 class HasContext(object):
@@ -66,8 +428,32 @@ class State(HasContext):
     def on_exit(self, dt):
         pass
 
+    def time_to_event(self):
+        """
+        Estimates when in_state will next cause a change that a transition condition leaving
+        this state may react to, for example a ramp reaching its target, assuming that there
+        is no outside input in the meantime. This is used by StateMachine.advance.
+
+        States that do not override this method make no estimate, StateMachine.advance then
+        processes them in steps of max_step.
+
+        :return: Time until that change, 0 if it is due now, or None if there is none ahead.
+        """
+        return None
+
+
+def _estimates_events(state):
+    """
+    :return: True if the State overrides time_to_event, so that it estimates its events.
+    """
+    method = type(state).time_to_event
+    return getattr(method, '__func__', method) is not State.__dict__['time_to_event']
+
 
 class Transition(HasContext):
+    # Names of the Context attributes this transition depends on, None if unknown. See depends_on.
+    depends_on = None
+
     def __init__(self):
         super(Transition, self).__init__()
 
@@ -75,8 +461,95 @@ class Transition(HasContext):
         return True
 
 
+def _accepts_dt(handler):
+    """
+    Determines whether a handler takes delta T as an argument.
+
+    :param handler: Callable to inspect.
+    :return: False if handler can be determined to take no positional arguments, otherwise True.
+    """
+    target = handler if inspect.isfunction(handler) or inspect.ismethod(handler) else \
+        getattr(handler, '__call__', None)
+
+    try:
+        spec = _getargspec(target)
+    except TypeError:
+        return True
+
+    arguments = spec.args[1:] if inspect.ismethod(target) and target.__self__ is not None else spec.args
+
+    return len(arguments) > 0 or spec.varargs is not None
+
+
+def _normalize_handlers(handlers):
+    """
+    Turns a handler specification (None, callable or iterable of callables) into a
+    tuple of (handler, accepts_dt) pairs.
+    """
+    if handlers is None:
+        return ()
+
+    if callable(handlers):
+        handlers = [handlers]
+
+    return tuple((handler, _accepts_dt(handler)) for handler in handlers)
+
+
+def _call_without_dt(handler):
+    return lambda dt: handler()
+
+
+def fast_forward(process, time_to_event, duration, max_step=None, min_step=1e-9):
+    """
+    Processes a total of duration by jumping from event to event instead of using fixed cycles.
+
+    In each iteration, time_to_event is called to find out how long the simulation can be processed
+    in a single step before something happens that requires a new cycle, then process is called with
+    that step. Repeated events that are due immediately without any state change are capped, after
+    which the simulation continues with a step of max_step. Without max_step, hitting the cap raises
+    a StateMachineException, because there is no step that is known to be safe.
+
+    :param process: Function that processes one cycle with a given dt.
+    :param time_to_event: Function that returns the time until the next event, or None if there is none.
+    :param duration: Total time to process.
+    :param max_step: [optional] Upper bound for steps, None means unbounded.
+    :param min_step: [optional] Lower bound for steps that are not zero, avoids rounding issues.
+    :return: Number of cycles processed.
+    """
+    remaining = float(duration)
+    cycles = 0
+    immediate = 0
+
+    while remaining > 0.0:
+        horizon = time_to_event()
+
+        if horizon is not None and horizon <= 0.0:
+            immediate += 1
+            if immediate > 100:
+                if max_step is None:
+                    raise StateMachineException(
+                        'More than 100 events were due immediately in a row, specify max_step to continue.')
+
+                horizon = max_step
+                immediate = 0
+        else:
+            immediate = 0
+
+        if horizon is None:
+            horizon = remaining if max_step is None else max_step
+        elif horizon > 0.0:
+            horizon = max(min(horizon, remaining if max_step is None else max_step), min_step)
+
+        step = min(horizon, remaining)
+        process(step)
+        remaining -= step
+        cycles += 1
+
+    return cycles
+
+
 class StateMachine(CanProcess):
-    def __init__(self, cfg, context=None):
+    def __init__(self, cfg, context=None, compiled=False, run_to_completion=False, max_transitions=16):
         """
         Cycle based state machine.
 
@@ -84,7 +557,8 @@ class StateMachine(CanProcess):
 
         The configuration may contain the following keys:
         - initial: Name of the initial state of this machine
-        - states: [optional] Dict of custom state handlers
+        - states: [optional] Dict of custom state handlers. Dicts may contain a time_to_event
+                  function in addition to the handlers, see State.time_to_event.
         - transitions: [optional] List of transitions in this state machine.
 
         Transitions should be provided as tuples with three elements:
@@ -93,16 +567,39 @@ class StateMachine(CanProcess):
         - Condition Function: Condition under which the transition should be executed
 
         A condition function should take no arguments and return True or False. If True
-        is returned, the transition will be executed.
-
-        Only one transition may occur per cycle. Every cycle will, at the very least,
-        trigger an in_state event against the current state. See process() for details.
+        is returned, the transition will be executed. Conditions that declare the attributes of
+        context they depend on (see depends_on) are only evaluated after one of those attributes
+        has been written to. If all conditions leaving the current state declare their dependencies
+        and nothing has been written to the context since they were evaluated, none is evaluated.
+
+        Only one transition may occur per cycle, unless the machine runs to completion.
+        Every cycle will, at the very least, trigger an in_state event against the current
+        state. See process() for details.
+
+        :param context: [optional] Context that is passed on to State and Transition objects.
+        :param compiled: [optional] If True, a specialized doProcess is generated for this
+                         machine on the first cycle, with transitions and handlers inlined
+                         for each state. It is regenerated whenever handlers or transitions change.
+        :param run_to_completion: [optional] If True, transitions are evaluated repeatedly within
+                                  a cycle until no condition leaving the current state is True.
+        :param max_transitions: [optional] Maximum number of transitions per cycle when running
+                                to completion. Further transitions are left for the next cycle.
         """
         super(StateMachine, self).__init__()
 
         self._state = None  # We start outside of any state, first cycle enters initial state
         self._handler = {}  # Nested dict mapping [state][event] = handler
+        self._dispatch = {}  # Nested dict mapping [state][event] = tuple of normalized handlers that take dt
+        self._compiled = compiled
+        self._cycle = None  # Generated cycle functions per state in compiled mode
+        self._max_transitions = max_transitions if run_to_completion else 1
+        self._transition_count = 0  # Transitions performed in the last cycle
         self._transition = {}  # Dict mapping [from_state] = [ (to_state, transition), ... ]
+        self._event_time = {}  # Dict mapping [state] = function that estimates the time to the next event
+        self._tracked = set()  # States whose transition conditions all declare their dependencies
+        self._stable_at = {}  # Dict mapping [state] = context revision at which no condition was True
+        self._context = context
+        self._notify = context.notify if isinstance(context, Context) else None
         self._prefix = {  # Default prefixes used when calling handler functions by name
             'on_entry': '_on_entry_',
             'in_state': '_in_state_',
@@ -123,7 +620,12 @@ class StateMachine(CanProcess):
             try:
                 if isinstance(handlers, State):
                     self._set_handlers(state_name, handlers.on_entry, handlers.in_state, handlers.on_exit)
+                    if _estimates_events(handlers):
+                        self._event_time[state_name] = handlers.time_to_event
                 elif isinstance(handlers, dict):
+                    handlers = dict(handlers)
+                    if 'time_to_event' in handlers:
+                        self._event_time[state_name] = handlers.pop('time_to_event')
                     self._set_handlers(state_name, **handlers)
                 elif hasattr(handlers, '__iter__'):
                     self._set_handlers(state_name, *handlers)
@@ -155,6 +657,13 @@ class StateMachine(CanProcess):
         """
         return self._state
 
+    @property
+    def transition_count(self):
+        """
+        :return: Number of transitions that were performed in the last cycle.
+        """
+        return self._transition_count
+
     def bind_handlers_by_name(self, instance, prefix=None, override=False):
         """
         Auto-bind state handlers based on naming convention.
@@ -194,7 +703,7 @@ class StateMachine(CanProcess):
                 if handler is None or override:
                     named_handler = getattr(instance, prefix[event] + state, None)
                     if callable(named_handler):
-                        self._handler[state][event] = named_handler
+                        self._set_handler(state, event, named_handler)
 
     def doProcess(self, dt):
         """
@@ -210,6 +719,11 @@ class StateMachine(CanProcess):
          - on_entry_new_state()
          - in_state_new_state()
 
+        If the machine runs to completion, the transition checks of the new state are evaluated
+        right after on_entry_new_state, and so on, until no transition occurs or max_transitions
+        is reached. Only the state the machine ends up in receives an in_state event. The number
+        of transitions is available as transition_count.
+
         The first cycle after init or reset will never call transition checks and, instead,
         always performs on_entry and in_state on the initial state.
 
@@ -217,23 +731,101 @@ class StateMachine(CanProcess):
         cycle always ends by raising an in_state event on the current (potentially new)
         state.
         """
+        if self._compiled:
+            if self._cycle is None:
+                self._cycle = self._generate_cycle()
+
+            self._transition_count = self._cycle[self._state](dt, self._max_transitions)
+            return
+
         # Initial transition on first cycle / after a reset()
         if self._state is None:
             self._state = self._initial
+            self._transition_count = 0
             self._raise_event('on_entry', 0)
             self._raise_event('in_state', 0)
             return
 
-        # General transition
+        count = 0
+        while count < self._max_transitions and self._transition_once(dt):
+            count += 1
+        self._transition_count = count
+
+        # Always end with an in_state
+        self._raise_event('in_state', dt)
+
+    def doAfterProcess(self, dt):
+        """
+        Notifies the observers of the context about the changes made during this cycle.
+        """
+        if self._notify is not None:
+            self._notify()
+
+    def _transition_once(self, dt):
+        """
+        Perform the first transition leaving the current state whose condition is True.
+
+        The checks are skipped if they all declare their dependencies and nothing has been
+        written to the context since they were last evaluated.
+
+        :return: True if a transition occurred.
+        """
+        tracked = self._state in self._tracked
+        if tracked:
+            revision = self._context.revision()
+            if self._stable_at.get(self._state) == revision:
+                return False
+
         for target_state, check_func in self._transition.get(self._state, []):
             if check_func():
                 self._raise_event('on_exit', dt)
                 self._state = target_state
                 self._raise_event('on_entry', dt)
-                break
+                return True
 
-        # Always end with an in_state
-        self._raise_event('in_state', dt)
+        if tracked:
+            self._stable_at[self._state] = revision
+
+        return False
+
+    def time_to_event(self, max_step=None):
+        """
+        Estimates the time until this machine needs to process a cycle to react to an event.
+
+        This is 0 if the first cycle has not been processed yet or if a transition condition
+        leaving the current state is True. Otherwise the time_to_event estimate of the current
+        state is used, see State.time_to_event. For states without an estimate, max_step is returned.
+
+        :param max_step: [optional] Returned for states whose dynamics are unknown.
+        :return: Time until the next event, or None if there is no event ahead.
+        """
+        if self._state is None:
+            return 0.0
+
+        for _, check_func in self._transition.get(self._state, []):
+            if check_func():
+                return 0.0
+
+        estimator = self._event_time.get(self._state)
+        if estimator is None:
+            return max_step
+
+        return estimator()
+
+    def advance(self, duration, max_step=None):
+        """
+        Processes this machine for the given duration, jumping from event to event.
+
+        Instead of processing a fixed number of cycles, the machine is processed with steps
+        that end exactly when the next event is expected, see time_to_event and fast_forward.
+        For states whose in_state handlers change values linearly and clamp them at their
+        targets, this gives the same result as processing many small cycles.
+
+        :param duration: Total time to process.
+        :param max_step: [optional] Step size used for states that do not estimate their events.
+        :return: Number of cycles that were processed.
+        """
+        return fast_forward(self.process, lambda: self.time_to_event(max_step), duration, max_step)
 
     def reset(self):
         """
@@ -250,7 +842,8 @@ class StateMachine(CanProcess):
         :param in_state: Handler for in_state events. May be None, function ref, or list of function refs.
         :param on_exit: Handler for on_exit events. May be None, function ref, or list of function refs.
 
-        Handlers should take exactly one parameter (not counting self), delta T since last cycle, and return nothing.
+        Handlers should take one parameter (not counting self), delta T since last cycle, and return nothing.
+        Handlers that take no parameters at all are detected here and called without delta T.
 
         When handlers are omitted or set to None, no event will be raised at all.
         """
@@ -260,9 +853,25 @@ class StateMachine(CanProcess):
         in_state = args[1] if len(args) > 1 else kwargs.get('in_state', None)
         on_exit = args[2] if len(args) > 2 else kwargs.get('on_exit', None)
 
-        self._handler[state] = {'on_entry': on_entry,
-                                'in_state': in_state,
-                                'on_exit': on_exit}
+        self._handler[state] = {}
+        self._dispatch[state] = {}
+
+        self._set_handler(state, 'on_entry', on_entry)
+        self._set_handler(state, 'in_state', in_state)
+        self._set_handler(state, 'on_exit', on_exit)
+
+    def _set_handler(self, state, event, handler):
+        """
+        Set the handler of a single event and normalize it for dispatch.
+
+        The handler is inspected once here to find out whether it accepts delta T,
+        so that no checks are required when events are raised.
+        """
+        self._handler[state][event] = handler
+        self._dispatch[state][event] = tuple(
+            handler if accepts_dt else _call_without_dt(handler)
+            for handler, accepts_dt in _normalize_handlers(handler))
+        self._cycle = None
 
     def _set_transition(self, from_state, to_state, transition_check):
         """
@@ -287,8 +896,20 @@ class StateMachine(CanProcess):
         except:
             pass
 
+        fields = getattr(transition_check, 'depends_on', None)
+        if self._context is not None and isinstance(fields, (tuple, list)):
+            transition_check = _TrackedCondition(transition_check, self._context, fields)
+
         self._transition[from_state].append((to_state, transition_check,))
 
+        if all(isinstance(check, _TrackedCondition) for _, check in self._transition[from_state]):
+            self._tracked.add(from_state)
+        else:
+            self._tracked.discard(from_state)
+
+        self._stable_at = {}
+        self._cycle = None
+
     def _raise_event(self, event, dt):
         """
         Invoke the given event name for the current state, passing dt as a parameter.
@@ -296,17 +917,70 @@ class StateMachine(CanProcess):
         :param event: Name of event to raise on current state.
         :param dt: Delta T since last cycle.
         """
-        # May be None, function reference, or list of function refs
-        handlers = self._handler[self._state][event]
+        for handler in self._dispatch[self._state][event]:
+            handler(dt)
+
+    def _generate_cycle(self):
+        """
+        Generate specialized cycle functions for all states of this machine.
 
-        if handlers is None:
-            handlers = []
+        For each state, the source of a function is generated that evaluates the transition
+        conditions leaving the state in order and raises all events, with the handlers and
+        conditions inlined as direct calls. The function for the None state enters the initial state.
+        Conditions of states whose conditions all declare their dependencies are skipped as in doProcess.
 
-        if callable(handlers):
-            handlers = [handlers]
+        The functions take dt and the number of transitions that may still be performed in this cycle.
+        After a transition, the function of the new state is called, so that transitions are chained
+        while running to completion. They return the number of transitions performed.
 
-        for handler in handlers:
-            try:
-                handler(dt)
-            except TypeError:
-                handler()
+        :return: Dict mapping [state] = function that performs one cycle in that state.
+        """
+        cycle = {}
+        namespace = {'machine': self, 'context': self._context, 'stable_at': self._stable_at, 'cycle': cycle}
+        names = {}
+
+        def name_of(obj, prefix):
+            if id(obj) not in names:
+                names[id(obj)] = '{}{}'.format(prefix, len(names))
+                namespace[names[id(obj)]] = obj
+            return names[id(obj)]
+
+        def raise_event(state, event, dt):
+            return ['{}({})'.format(name_of(handler, 'handler_'), dt if accepts_dt else '')
+                    for handler, accepts_dt in _normalize_handlers(self._handler[state][event])]
+
+        def indent(lines, depth=1):
+            return ['    ' * depth + line for line in lines]
+
+        sources = {None: ['def state_cycle(dt, budget):',
+                          '    machine._state = {}'.format(name_of(self._initial, 'state_'))] +
+                         indent(raise_event(self._initial, 'on_entry', 0) + raise_event(self._initial, 'in_state', 0)) +
+                         ['    return 0']}
+
+        for state in self._handler:
+            transitions = []
+
+            for target_state, check_func in self._transition.get(state, []):
+                transitions.append('if {}():'.format(name_of(check_func, 'condition_')))
+                transitions += indent(raise_event(state, 'on_exit', 'dt') +
+                                      ['machine._state = {}'.format(name_of(target_state, 'state_'))] +
+                                      raise_event(target_state, 'on_entry', 'dt'))
+                transitions.append('    return cycle[{}](dt, budget - 1) + 1'.format(name_of(target_state, 'state_')))
+
+            if state in self._tracked:
+                transitions = ['revision = context.revision()',
+                               'if stable_at.get({}) != revision:'.format(name_of(state, 'state_'))] + \
+                              indent(transitions + ['stable_at[{}] = revision'.format(name_of(state, 'state_'))])
+
+            lines = ['def state_cycle(dt, budget):']
+            if transitions:
+                lines += ['    if budget:'] + indent(transitions, 2)
+            lines += indent(raise_event(state, 'in_state', 'dt')) + ['    return 0']
+
+            sources[state] = lines
+
+        for state, lines in sources.items():
+            exec('\n'.join(lines), namespace)
+            cycle[state] = namespace['state_cycle']
+
+        return cycle
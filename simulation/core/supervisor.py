@@ -0,0 +1,206 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import time
+
+from simulation.core.scheduler import monotonic
+
+
+def shard(items, workers=None):
+    """
+    Distributes items across workers, ProcessPoolExecutor distributes its items in the same way.
+
+    :param items: Sequence of items.
+    :param workers: [optional] Number of workers, defaults to the number of CPUs.
+    :return: List of shards, at most one per worker and none of them empty.
+    """
+    if not workers:
+        from multiprocessing import cpu_count
+        workers = cpu_count()
+
+    return [list(items[worker::workers]) for worker in range(min(workers, len(items)))]
+
+
+class _Worker(object):
+    def __init__(self, index, shard):
+        self.index = index
+        self.shard = shard
+        self.process = None
+        self.connection = None
+        self.started = None
+        self.last_message = None
+        self.restart_at = None
+        self.restarts = 0
+        self.statistics = None
+
+
+class Supervisor(object):
+    """
+    Runs a worker function for each shard of items in its own process and supervises the
+    processes: workers that exit or crash are restarted, and so are workers that do not send
+    a message for heartbeat_timeout seconds. The worker function is called with its shard and
+    a connection, over which it should regularly send a dict of statistics:
+
+        def worker(shard, connection):
+            ...
+            connection.send({'cycleRate': 100.0})
+
+        supervisor = Supervisor(worker, shard(devices))
+        supervisor.run()
+
+    The last statistics of each worker are available through statistics().
+
+    :param worker: Function that takes a shard and a connection, it should not return.
+    :param shards: List of shards, one worker process is started per shard.
+    :param heartbeat_timeout: [optional] Time after which a silent worker is considered hung.
+    :param restart_delay: [optional] Time to wait before a worker is restarted.
+    :param timer: [optional] Function that returns a monotonic time in seconds.
+    """
+
+    def __init__(self, worker, shards, heartbeat_timeout=30.0, restart_delay=1.0, timer=monotonic):
+        self._worker = worker
+        self._workers = [_Worker(index, shard) for index, shard in enumerate(shards)]
+        self._heartbeat_timeout = heartbeat_timeout
+        self._restart_delay = restart_delay
+        self._timer = timer
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def statistics(self):
+        """
+        :return: List with a dict per worker, containing its index, process id, number of
+                 restarts, whether it is alive, and the last statistics it sent.
+        """
+        return [{'index': worker.index,
+                 'pid': worker.process.pid if worker.process is not None else None,
+                 'alive': worker.process is not None and worker.process.is_alive(),
+                 'restarts': worker.restarts,
+                 'statistics': worker.statistics} for worker in self._workers]
+
+    def start(self):
+        """
+        Starts a process for each shard.
+        """
+        self._running = True
+
+        for worker in self._workers:
+            self._start_worker(worker)
+
+    def poll(self, timeout=0.1):
+        """
+        Performs one round of supervision: receives messages from the workers and
+        restarts workers as needed.
+
+        :param timeout: [optional] Time to wait for messages.
+        """
+        deadline = self._timer() + timeout
+
+        while True:
+            received = False
+            for worker in self._workers:
+                if worker.connection is not None and worker.connection.poll():
+                    try:
+                        worker.statistics = worker.connection.recv()
+                        worker.last_message = self._timer()
+                        received = True
+                    except (EOFError, IOError):
+                        worker.connection.close()
+                        worker.connection = None
+
+            if received or self._timer() >= deadline:
+                break
+
+            time.sleep(min(0.01, max(0.0, deadline - self._timer())))
+
+        now = self._timer()
+        for worker in self._workers:
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    self._start_worker(worker)
+            elif not worker.process.is_alive():
+                self._schedule_restart(worker, now)
+            elif now - (worker.last_message or worker.started) > self._heartbeat_timeout:
+                worker.process.terminate()
+                worker.process.join()
+                self._schedule_restart(worker, now)
+
+    def run(self, report=None, report_interval=10.0):
+        """
+        Starts the workers and supervises them until stop() is called.
+
+        :param report: [optional] Function that is called with statistics() regularly.
+        :param report_interval: [optional] Time between calls to report.
+        """
+        if not self._running:
+            self.start()
+
+        next_report = self._timer() + report_interval
+        try:
+            while self._running:
+                self.poll()
+
+                if report is not None and self._timer() >= next_report:
+                    next_report += report_interval
+                    report(self.statistics())
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Terminates all worker processes.
+        """
+        self._running = False
+
+        for worker in self._workers:
+            if worker.process is not None:
+                if worker.process.is_alive():
+                    worker.process.terminate()
+                worker.process.join()
+
+            if worker.connection is not None:
+                worker.connection.close()
+                worker.connection = None
+
+    def _start_worker(self, worker):
+        from multiprocessing import Pipe, Process
+
+        # Messages of the previous process that were not received yet are discarded with its pipe
+        if worker.connection is not None:
+            worker.connection.close()
+
+        connection, worker_connection = Pipe(duplex=False)
+
+        worker.process = Process(target=self._worker, args=(worker.shard, worker_connection),
+                                 name='Worker-{}'.format(worker.index))
+        worker.process.daemon = True
+        worker.process.start()
+        worker_connection.close()
+
+        worker.connection = connection
+        worker.started = self._timer()
+        worker.last_message = None
+        worker.restart_at = None
+
+    def _schedule_restart(self, worker, now):
+        worker.restarts += 1
+        worker.restart_at = now + self._restart_delay
+        worker.statistics = None
@@ -0,0 +1,253 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+Rolling statistics about the cycles of a running simulation, meant to be published
+continuously, for example as PVs:
+
+    telemetry = CycleTelemetry()
+    scheduler = CycleScheduler(telemetry.timed('simulation', simulation.process), rate=100.0,
+                               telemetry=telemetry)
+
+The snapshot that is exposed through the properties of CycleTelemetry is refreshed once
+per interval when the telemetry object itself is processed.
+"""
+
+from collections import deque
+
+from simulation.core.processor import CanProcess
+from simulation.core.scheduler import monotonic
+
+
+class RollingStatistics(object):
+    """
+    Statistics of the last window samples that were recorded.
+    """
+
+    def __init__(self, window=1000):
+        self._samples = deque(maxlen=window)
+
+    def record(self, value):
+        self._samples.append(value)
+
+    @property
+    def count(self):
+        return len(self._samples)
+
+    @property
+    def mean(self):
+        return sum(self._samples) / len(self._samples) if self._samples else 0.0
+
+    @property
+    def max(self):
+        return max(self._samples) if self._samples else 0.0
+
+    def percentiles(self, *fractions):
+        """
+        :param fractions: Percentiles as fractions, for example 0.5 and 0.99
+        :return: List of the samples at the given percentiles (nearest rank).
+        """
+        if not self._samples:
+            return [0.0] * len(fractions)
+
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+
+        return [ordered[min(last, int(fraction * len(ordered)))] for fraction in fractions]
+
+
+class TimeShare(object):
+    """
+    Accumulates the time spent in one part of a cycle, see CycleTelemetry.timed.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+
+        self._last_total = 0.0
+        self._fraction = 0.0
+        self._per_cycle = 0.0
+
+    @property
+    def fraction(self):
+        """
+        :return: Share of the wall time spent in this part during the last interval.
+        """
+        return self._fraction
+
+    @property
+    def perCycle(self):
+        """
+        :return: Mean time per cycle spent in this part during the last interval, in ms.
+        """
+        return self._per_cycle
+
+    def _update(self, elapsed, cycles):
+        spent = self.total - self._last_total
+        self._last_total = self.total
+
+        self._fraction = spent / elapsed if elapsed > 0.0 else 0.0
+        self._per_cycle = 1000.0 * spent / cycles if cycles else 0.0
+
+
+class CycleTelemetry(CanProcess):
+    """
+    Keeps rolling statistics of cycle times and of the time spent in the parts of a cycle.
+    Cycle times are recorded by a CycleScheduler that was created with this object as its
+    telemetry argument, parts of the cycle are timed by wrapping them with timed().
+
+    Processing this object refreshes the snapshot of the statistics once per interval:
+    cycle rate, mean, p50, p99 and max cycle time in ms over the last window cycles, the
+    total number of overruns, and for each timed part its share of the wall time and
+    its mean time per cycle.
+
+    :param window: [optional] Number of cycles the cycle time statistics are calculated from.
+    :param interval: [optional] Time between refreshes of the snapshot.
+    :param timer: [optional] Function that returns a monotonic time in seconds.
+    :param on_update: [optional] Function that is called with this object after each refresh.
+    """
+
+    def __init__(self, window=1000, interval=1.0, timer=monotonic, on_update=None):
+        super(CycleTelemetry, self).__init__()
+
+        self._on_update = on_update
+
+        self._cycle_times = RollingStatistics(window)
+        self._interval = interval
+        self._timer = timer
+        self._shares = {}
+
+        self._cycles = 0
+        self._overruns = 0
+        self._last_update = timer()
+        self._cycles_at_last_update = 0
+        self._elapsed = 0.0
+
+        self._snapshot = dict.fromkeys(('rate', 'mean', 'p50', 'p99', 'max'), 0.0)
+
+    @property
+    def overruns(self):
+        return self._overruns
+
+    @property
+    def cycleRate(self):
+        return self._snapshot['rate']
+
+    @property
+    def meanCycleTime(self):
+        return self._snapshot['mean']
+
+    @property
+    def p50CycleTime(self):
+        return self._snapshot['p50']
+
+    @property
+    def p99CycleTime(self):
+        return self._snapshot['p99']
+
+    @property
+    def maxCycleTime(self):
+        return self._snapshot['max']
+
+    def record_cycle(self, duration):
+        self._cycles += 1
+        self._cycle_times.record(duration)
+
+    def record_overrun(self):
+        self._overruns += 1
+
+    def share(self, name):
+        """
+        :param name: Name of a timed part of the cycle.
+        :return: TimeShare of that part.
+        """
+        return self._shares.setdefault(name, TimeShare())
+
+    def timed(self, name, function):
+        """
+        Wraps function so that the time spent in it is accounted to the part called name.
+
+        :param name: Name of the part of the cycle.
+        :param function: Function to time.
+        :return: Wrapped function.
+        """
+        share = self.share(name)
+        timer = self._timer
+
+        def timed_function(*args, **kwargs):
+            start = timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                share.total += timer() - start
+
+        return timed_function
+
+    def doProcess(self, dt):
+        self._elapsed += dt
+        if self._elapsed >= self._interval:
+            self._elapsed = 0.0
+            self.update()
+
+    def update(self):
+        """
+        Refreshes the snapshot of the statistics.
+        """
+        now = self._timer()
+        elapsed = now - self._last_update
+        cycles = self._cycles - self._cycles_at_last_update
+
+        self._last_update = now
+        self._cycles_at_last_update = self._cycles
+
+        statistics = self._cycle_times
+        p50, p99 = statistics.percentiles(0.5, 0.99)
+
+        self._snapshot = {
+            'rate': cycles / elapsed if elapsed > 0.0 else 0.0,
+            'mean': 1000.0 * statistics.mean,
+            'p50': 1000.0 * p50,
+            'p99': 1000.0 * p99,
+            'max': 1000.0 * statistics.max,
+        }
+
+        for share in self._shares.values():
+            share._update(elapsed, cycles)
+
+        if self._on_update is not None:
+            self._on_update(self)
+
+    def snapshot(self):
+        """
+        :return: Dict with the current snapshot of the statistics, including the timed parts.
+        """
+        snapshot = {
+            'cycleRate': self.cycleRate,
+            'meanCycleTime': self.meanCycleTime,
+            'p50CycleTime': self.p50CycleTime,
+            'p99CycleTime': self.p99CycleTime,
+            'maxCycleTime': self.maxCycleTime,
+            'overruns': self.overruns,
+        }
+
+        for name, share in self._shares.iteritems():
+            snapshot[name + 'Load'] = share.fraction
+            snapshot[name + 'Time'] = share.perCycle
+
+        return snapshot
@@ -0,0 +1,85 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import argparse
+import signal
+import sys
+import adapters
+from adapters import import_adapter
+from scenarios import load_fleet, create_fleet
+from simulation.core import CycleTelemetry, Supervisor, shard
+
+
+def name_value_pairs(values):
+    return dict(option.split('=') for option in values.split(','))
+
+
+parser = argparse.ArgumentParser(
+    description='Run a fleet of simulated devices, sharded across several worker processes, and supervise them.')
+parser.add_argument('-f', '--fleet', help='JSON file that lists the devices to simulate, see simulation.py.',
+                    required=True)
+parser.add_argument('-w', '--workers', help='Number of worker processes, defaults to the number of CPUs.', type=int)
+parser.add_argument('-p', '--protocol', help='Communication protocol to expose simulation.', default='epics',
+                    choices=sorted(adapters.registry))
+parser.add_argument('-a', '--adapter',
+                    help='Name of adapter class. If not specified, the adapter declared '
+                         'for the protocol is used.')
+parser.add_argument('--parameters', help='Additional parameters for the protocol. The pv_prefix of each worker '
+                                         'is extended by WORKER<n>: for the PVs of its clock and statistics.',
+                    type=name_value_pairs, default={})
+parser.add_argument('--heartbeat-timeout', help='Seconds without statistics after which a worker is restarted.',
+                    type=float, default=30.0)
+parser.add_argument('--report-interval', help='Seconds between reports of the statistics of all workers.',
+                    type=float, default=10.0)
+
+arguments = parser.parse_args()
+
+
+def run_worker(worker_shard, connection):
+    index, specifications = worker_shard
+
+    telemetry = CycleTelemetry(on_update=lambda updated: connection.send(updated.snapshot()))
+
+    parameters = dict(arguments.parameters)
+    parameters['pv_prefix'] = '{}WORKER{}:'.format(parameters.get('pv_prefix', ''), index)
+
+    adapter = import_adapter(arguments.protocol, arguments.adapter)()
+    adapter.run_fleet(create_fleet(specifications), telemetry=telemetry, **parameters)
+
+
+def report(statistics):
+    for worker in statistics:
+        cycle = worker['statistics'] or {}
+        print 'Worker %d (pid %s, %s, %d restarts): %.1f cycles/s, mean %.3f ms, p99 %.3f ms, %d overruns' % (
+            worker['index'], worker['pid'], 'alive' if worker['alive'] else 'down', worker['restarts'],
+            cycle.get('cycleRate', 0.0), cycle.get('meanCycleTime', 0.0), cycle.get('p99CycleTime', 0.0),
+            cycle.get('overruns', 0))
+
+
+devices = load_fleet(arguments.fleet, arguments.protocol)
+shards = list(enumerate(shard(devices, arguments.workers)))
+
+print 'Simulating %d devices in %d worker processes.' % (len(devices), len(shards))
+
+supervisor = Supervisor(run_worker, shards, heartbeat_timeout=arguments.heartbeat_timeout)
+
+# Makes sure the workers are terminated as well
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+supervisor.run(report, arguments.report_interval)
@@ -0,0 +1,63 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+from mock import patch
+from types import ModuleType
+
+import adapters
+from adapters import Adapter, import_adapter
+
+
+class FirstAdapter(Adapter):
+    pass
+
+
+class SecondAdapter(Adapter):
+    pass
+
+
+def adapter_module():
+    module = ModuleType('adapters.fake')
+    module.Adapter = Adapter
+    module.FirstAdapter = FirstAdapter
+    module.SecondAdapter = SecondAdapter
+
+    return module
+
+
+@patch.dict(adapters.registry, {'fake': 'SecondAdapter'})
+@patch.dict(adapters._imported, clear=True)
+class TestImportAdapter(unittest.TestCase):
+    def test_declared_adapter(self):
+        with patch('importlib.import_module', return_value=adapter_module()) as import_module:
+            self.assertIs(import_adapter('fake'), SecondAdapter)
+            self.assertIs(import_adapter('fake'), SecondAdapter)
+
+        import_module.assert_called_once_with('.fake', 'adapters')
+
+    def test_explicit_class(self):
+        with patch('importlib.import_module', return_value=adapter_module()):
+            self.assertIs(import_adapter('fake', 'FirstAdapter'), FirstAdapter)
+            self.assertRaises(RuntimeError, import_adapter, 'fake', 'Adapter')
+            self.assertRaises(RuntimeError, import_adapter, 'fake', 'ThirdAdapter')
+
+    def test_undeclared_module_is_scanned(self):
+        with patch('importlib.import_module', return_value=adapter_module()):
+            self.assertIs(import_adapter('other'), FirstAdapter)
@@ -0,0 +1,149 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+from collections import OrderedDict
+from mock import Mock
+
+import numpy as np
+
+from simulation.core import StateMachine, State, Context
+from simulation.core.batch import BatchStateMachine, BatchState, BatchContext
+from simulation.core.statemachine import StateMachineException
+
+
+class RampContext(Context):
+    def initialize(self):
+        self.speed = 0.0
+        self.target_speed = 0.0
+        self.start_commanded = False
+
+
+class Accelerating(State):
+    def in_state(self, dt):
+        self._context.speed = min(self._context.speed + 2.0 * dt, self._context.target_speed)
+
+
+class BatchAccelerating(BatchState):
+    def in_state(self, context, mask, dt):
+        context.speed[mask] = np.minimum(context.speed[mask] + 2.0 * dt, context.target_speed[mask])
+
+    def on_entry(self, context, mask, dt):
+        context.start_commanded[mask] = False
+
+
+def scalar_machine(context):
+    return StateMachine({
+        'initial': 'stopped',
+        'states': {
+            'accelerating': Accelerating(),
+        },
+        'transitions': OrderedDict([
+            (('stopped', 'accelerating'), lambda: context.start_commanded),
+            (('accelerating', 'at_speed'), lambda: context.speed == context.target_speed),
+        ])
+    }, context=context)
+
+
+def batch_machine(context):
+    return BatchStateMachine({
+        'initial': 'stopped',
+        'states': {
+            'accelerating': BatchAccelerating(),
+        },
+        'transitions': OrderedDict([
+            (('stopped', 'accelerating'), lambda c: c.start_commanded),
+            (('accelerating', 'at_speed'), lambda c: c.speed == c.target_speed),
+        ])
+    }, context.size, context=context)
+
+
+class TestBatchContext(unittest.TestCase):
+    def test_columns_from_Context(self):
+        context = BatchContext.from_context(RampContext, 5)
+
+        self.assertEqual(context.fields, ('speed', 'start_commanded', 'target_speed'))
+        self.assertEqual(context.speed.shape, (5,))
+        self.assertEqual(context.start_commanded.dtype, np.bool_)
+
+    def test_can_not_add_fields_or_change_size(self):
+        context = BatchContext(3, speed=0.0)
+
+        with self.assertRaises(StateMachineException):
+            context.phase = np.zeros(3)
+
+        with self.assertRaises(StateMachineException):
+            context.speed = np.zeros(4)
+
+
+class TestBatchStateMachine(unittest.TestCase):
+    def test_initial_state_is_required(self):
+        self.assertRaises(StateMachineException, BatchStateMachine, {}, 3)
+
+    def test_first_cycle_enters_initial_state(self):
+        on_entry = Mock()
+        sm = BatchStateMachine({'initial': 'foo', 'states': {'foo': {'on_entry': on_entry}}}, 3)
+
+        self.assertEqual(sm.state_names(), [None] * 3)
+        sm.process(1.0)
+
+        self.assertEqual(sm.state_names(), ['foo'] * 3)
+        self.assertEqual(on_entry.call_args[0][2], 0)
+        self.assertTrue(on_entry.call_args[0][1].all())
+
+    def test_matches_individual_state_machines(self):
+        size = 4
+        targets = [1.0, 2.0, 0.5, 3.0]
+
+        contexts = [RampContext() for _ in range(size)]
+        machines = [scalar_machine(context) for context in contexts]
+
+        batch_context = BatchContext.from_context(RampContext, size)
+        batch = batch_machine(batch_context)
+
+        for index, target in enumerate(targets):
+            contexts[index].target_speed = target
+        batch_context.target_speed[:] = targets
+
+        for cycle in range(12):
+            if cycle == 2:
+                for index in (0, 1, 3):
+                    contexts[index].start_commanded = True
+                batch_context.start_commanded[[0, 1, 3]] = True
+
+            for machine in machines:
+                machine.process(0.25)
+            batch.process(0.25)
+
+            self.assertEqual(batch.state_names(), [machine.state for machine in machines])
+            np.testing.assert_allclose(batch_context.speed, [context.speed for context in contexts])
+
+        self.assertEqual(batch.count('at_speed'), 3)
+        self.assertEqual(batch.state(2), 'stopped')
+
+    def test_reset_selected_machines(self):
+        sm = BatchStateMachine({'initial': 'foo', 'transitions': {('foo', 'bar'): lambda c: True}}, 3)
+        sm.process(0.1)
+        sm.process(0.1)
+
+        sm.reset(np.array([True, False, False]))
+        self.assertEqual(sm.state_names(), [None, 'bar', 'bar'])
+
+        sm.process(0.1)
+        self.assertEqual(sm.state_names(), ['foo', 'bar', 'bar'])
@@ -0,0 +1,154 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+
+from adapters.bindings import Binding, compile_bindings
+from scenarios.chopper.bindings import epics
+from simulation import SimulatedChopper
+
+
+class Device(object):
+    def __init__(self):
+        self.speed = 1.0
+        self._state = 'idle'
+        self.started = 0
+
+    @property
+    def state(self):
+        return self._state
+
+    def start(self):
+        self.started += 1
+
+
+class TestCompileBindings(unittest.TestCase):
+    def test_getters_and_setters(self):
+        device = Device()
+        bindings = compile_bindings({'SPEED': {'property': 'speed'},
+                                     'STATE': {'type': 'string', 'property': 'state'}}, device)
+
+        self.assertEqual(bindings['SPEED'].getter(), 1.0)
+        bindings['SPEED'].setter(2.0)
+        self.assertEqual(device.speed, 2.0)
+
+        self.assertEqual(bindings['STATE'].getter(), 'idle')
+        self.assertIsNone(bindings['STATE'].setter)
+
+    def test_coercion_by_type(self):
+        bindings = compile_bindings({'A': {'property': 'speed'},
+                                     'B': {'type': 'int', 'property': 'speed'},
+                                     'C': {'type': 'string', 'property': 'speed'},
+                                     'D': {'property': 'speed', 'count': 3}}, Device())
+
+        self.assertEqual(bindings['A'].coerce(3), 3.0)
+        self.assertIsInstance(bindings['A'].coerce(3), float)
+        self.assertEqual(bindings['B'].coerce(3.0), 3)
+        self.assertEqual(bindings['C'].coerce(3), '3')
+        self.assertEqual(bindings['D'].coerce([1, 2]), [1, 2])
+
+        self.assertRaises(ValueError, bindings['A'].coerce, 'fast')
+
+    def test_commands_are_bound(self):
+        device = Device()
+        bindings = compile_bindings({'COMMAND': {'type': 'string', 'commands': {'START': 'start'},
+                                                 'buffer': 'LAST_COMMAND'},
+                                     'LAST_COMMAND': {'type': 'string'}}, device)
+
+        name, method = bindings['COMMAND'].commands['START']
+        method()
+
+        self.assertEqual(name, 'start')
+        self.assertEqual(device.started, 1)
+        self.assertIs(bindings['COMMAND'].buffer, bindings['LAST_COMMAND'])
+        self.assertIsNone(bindings['LAST_COMMAND'].getter)
+
+    def test_target_per_binding(self):
+        other = Device()
+        other.speed = 5.0
+
+        bindings = compile_bindings({'SPEED': {'property': 'speed', 'target': other}}, Device())
+
+        self.assertIs(bindings['SPEED'].target, other)
+        self.assertEqual(bindings['SPEED'].getter(), 5.0)
+
+    def test_history(self):
+        device = Device()
+        bindings = compile_bindings({'HISTORY': {'count': 3, 'history': 'speed'},
+                                     'RESET': {'type': 'string', 'commands': {'RESET': 'reset'},
+                                               'history_of': 'HISTORY'}}, device)
+
+        history = bindings['HISTORY']
+        history.history.record(history.sample())
+        self.assertEqual(list(history.getter()), [1.0])
+
+        bindings['RESET'].commands['RESET'][1]()
+        self.assertEqual(len(history.history), 0)
+
+    def test_initial_state(self):
+        binding = Binding('SPEED', {'property': 'speed'}, Device())
+
+        self.assertIs(binding.published, Binding.nothing)
+        self.assertIsNone(binding.cached)
+        self.assertEqual(binding.poll_interval, 1.0)
+
+    def test_fail_fast(self):
+        device = Device()
+
+        for pv_dict in [{'A': {'property': 'sped'}},
+                        {'A': {'snapshot': ['speed', 'phase'], 'count': 2}},
+                        {'A': {'history': 'phase', 'count': 10}},
+                        {'A': {'history': 'speed'}},
+                        {'A': {'type': 'str', 'property': 'speed'}},
+                        {'A': {'type': 'string', 'commands': {'STOP': 'stop'}}},
+                        {'A': {'type': 'string', 'commands': {'START': 'start'}, 'buffer': 'B'}},
+                        {'A': {'type': 'string', 'commands': {'RESET': 'reset'}, 'history_of': 'B'}},
+                        {'A': {'property': 'speed', 'deadband': 1.0, 'relative_deadband': 0.1}},
+                        {'A': {'type': 'string', 'property': 'state', 'deadband': 1.0}},
+                        {'A': {'type': 'enum', 'property': 'state', 'relative_deadband': 0.1}}]:
+            self.assertRaises(ValueError, compile_bindings, pv_dict, device)
+
+    def test_accessors_are_resolved(self):
+        device = Device()
+        chopper = SimulatedChopper()
+        chopper.process(0.0)
+
+        state = compile_bindings({'STATE': {'type': 'string', 'property': 'state'}}, device)['STATE']
+        self.assertIs(state.getter.func, Device.state.fget)
+
+        bindings = compile_bindings(epics, chopper)
+        self.assertIsNot(bindings['SPEED:SP'].getter.func, getattr)
+        self.assertIsNot(bindings['SPEED:SP'].setter.func, setattr)
+
+        # Writes go through the context, so that they are tracked
+        revision = chopper._context.revision()
+        bindings['SPEED:SP'].setter(5.0)
+
+        self.assertEqual(bindings['SPEED:SP'].getter(), 5.0)
+        self.assertEqual(chopper.targetSpeed, 5.0)
+        self.assertEqual(chopper._context.revision('target_speed'), revision + 1)
+
+        self.assertEqual(bindings['SNAPSHOT'].getter()[1], 5.0)
+
+    def test_chopper_bindings_compile(self):
+        bindings = compile_bindings(epics, SimulatedChopper())
+
+        self.assertEqual(set(bindings), set(epics))
+        self.assertIsNotNone(bindings['SPEED:SP'].setter)
+        self.assertIsNone(bindings['SPEED'].setter)
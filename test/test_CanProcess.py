@@ -20,7 +20,8 @@
 from mock import call, patch
 import unittest
 
-from simulation.core import CanProcess, CanProcessComposite
+from simulation import SimulatedChopper
+from simulation.core import CanProcess, CanProcessComposite, PeriodicProcessor, SubSteppingProcessor
 
 
 class TestCanProcess(unittest.TestCase):
@@ -100,3 +101,206 @@ class TestCanProcessComposite(unittest.TestCase):
             composite(4.0)
 
             mockProcessMethod.assert_has_calls([call(4.0), call(4.0)])
+
+
+class RecordingProcessor(CanProcess):
+    def __init__(self, name, log):
+        super(RecordingProcessor, self).__init__()
+        self._name = name
+        self._log = log
+
+    def doBeforeProcess(self, dt):
+        self._log.append(('before', self._name, dt))
+
+    def doProcess(self, dt):
+        self._log.append(('process', self._name, dt))
+
+    def doAfterProcess(self, dt):
+        self._log.append(('after', self._name, dt))
+
+
+class TestCompiledCanProcessComposite(unittest.TestCase):
+    def _build_tree(self, log, compiled):
+        inner = CanProcessComposite([RecordingProcessor('b', log), RecordingProcessor('c', log)])
+        return CanProcessComposite([RecordingProcessor('a', log), inner, RecordingProcessor('d', log)],
+                                   compiled=compiled), inner
+
+    def test_compiled_plan_is_equivalent_to_interpreted(self):
+        interpreted_log, compiled_log = [], []
+
+        self._build_tree(interpreted_log, compiled=False)[0].process(1.0)
+        self._build_tree(compiled_log, compiled=True)[0].process(1.0)
+
+        self.assertEqual(compiled_log, interpreted_log)
+
+    def test_plan_is_compiled_once(self):
+        composite, _ = self._build_tree([], compiled=True)
+
+        with patch.object(composite, '_compilePlan', wraps=composite._compilePlan) as compilePlanMock:
+            composite.process(1.0)
+            composite.process(2.0)
+
+        compilePlanMock.assert_called_once()
+
+    def test_plan_is_rebuilt_when_nested_composite_changes(self):
+        log = []
+        composite, inner = self._build_tree(log, compiled=True)
+        composite.process(1.0)
+
+        inner.addProcessor(RecordingProcessor('e', log))
+        del log[:]
+        composite.process(2.0)
+
+        self.assertIn(('process', 'e', 2.0), log)
+
+    def test_overridden_process_is_not_flattened(self):
+        processor = CanProcess()
+        composite = CanProcessComposite([processor], compiled=True)
+
+        with patch.object(CanProcess, 'doProcess', create=True), \
+                patch.object(processor, 'process') as processMock:
+            composite.process(3.0)
+
+        processMock.assert_called_once_with(3.0)
+
+
+class TestPeriodicProcessor(unittest.TestCase):
+    def test_requires_exactly_one_of_period_and_decimation(self):
+        self.assertRaises(ValueError, PeriodicProcessor, CanProcess())
+        self.assertRaises(ValueError, PeriodicProcessor, CanProcess(), period=1.0, decimation=2)
+
+    def test_period_passes_accumulated_dt(self):
+        processor = CanProcess()
+        periodic = PeriodicProcessor(processor, period=0.5)
+
+        with patch.object(processor, 'process') as processMock:
+            for _ in range(7):
+                periodic.process(0.2)
+
+        self.assertEqual(len(processMock.mock_calls), 2)
+        for (dt,), _ in processMock.call_args_list:
+            self.assertAlmostEqual(dt, 0.6)
+        self.assertAlmostEqual(periodic.elapsed, 0.2)
+
+    def test_period_tolerates_rounding_of_accumulated_dt(self):
+        processor = CanProcess()
+        periodic = PeriodicProcessor(processor, period=0.1)
+
+        with patch.object(processor, 'process') as processMock:
+            for _ in range(10):
+                periodic.process(0.01)
+
+            # The sum of ten times 0.01 is 0.09999999999999999
+            self.assertEqual(len(processMock.mock_calls), 1)
+
+            for _ in range(9):
+                periodic.process(0.01)
+
+            self.assertEqual(len(processMock.mock_calls), 1)
+
+            periodic.process(0.01)
+
+        self.assertEqual(len(processMock.mock_calls), 2)
+
+    def test_decimation(self):
+        processor = CanProcess()
+        periodic = PeriodicProcessor(processor, decimation=3)
+
+        with patch.object(processor, 'process') as processMock:
+            for _ in range(7):
+                periodic.process(1.0)
+
+        processMock.assert_has_calls([call(3.0), call(3.0)])
+        self.assertEqual(len(processMock.mock_calls), 2)
+
+    def test_composite_wraps_processors_with_period(self):
+        processor = CanProcess()
+        composite = CanProcessComposite()
+        composite.addProcessor(processor, period=2.0)
+
+        with patch.object(processor, 'process') as processMock:
+            composite.process(1.5)
+            processMock.assert_not_called()
+            composite.process(1.5)
+
+        processMock.assert_called_once_with(3.0)
+
+
+class TestSubSteppingProcessor(unittest.TestCase):
+    def _process(self, dt, **kwargs):
+        processor = CanProcess()
+        substepping = SubSteppingProcessor(processor, **kwargs)
+
+        with patch.object(processor, 'process') as processMock:
+            substepping.process(dt)
+
+        return substepping, [args[0] for args, _ in processMock.call_args_list]
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, SubSteppingProcessor, CanProcess(), max_step=0.0)
+        self.assertRaises(ValueError, SubSteppingProcessor, CanProcess(), max_step=1.0, overrun='foo')
+
+    def test_small_dt_is_passed_on(self):
+        substepping, steps = self._process(0.05, max_step=0.1)
+
+        self.assertEqual(steps, [0.05])
+        self.assertEqual(substepping.substeps, 1)
+
+    def test_large_dt_is_split_into_equal_substeps(self):
+        substepping, steps = self._process(0.3, max_step=0.1)
+
+        self.assertEqual(len(steps), 3)
+        self.assertAlmostEqual(sum(steps), 0.3)
+        self.assertEqual((substepping.substeps, substepping.lastSubsteps, substepping.overruns), (3, 3, 0))
+
+    def test_overrun_catch_up(self):
+        substepping, steps = self._process(1.0, max_step=0.1, max_substeps=5)
+
+        self.assertEqual(len(steps), 10)
+        self.assertEqual(substepping.overruns, 1)
+
+    def test_overrun_clamp(self):
+        substepping, steps = self._process(1.0, max_step=0.1, max_substeps=5,
+                                           overrun=SubSteppingProcessor.CLAMP)
+
+        self.assertEqual(steps, [0.1] * 5)
+        self.assertEqual(substepping.overruns, 1)
+
+    def test_overrun_drop(self):
+        substepping, steps = self._process(1.0, max_step=0.1, max_substeps=5,
+                                           overrun=SubSteppingProcessor.DROP)
+
+        self.assertEqual(steps, [])
+        self.assertEqual((substepping.substeps, substepping.overruns), (0, 1))
+
+    def test_chopper_reaches_phase_locked_like_fixed_steps(self):
+        choppers = []
+        for _ in range(2):
+            chopper = SimulatedChopper()
+            chopper.process(0.0)
+            chopper.interlock()
+            chopper.targetSpeed = 10.0
+            chopper.targetPhase = 23.0
+            chopper.start()
+            choppers.append(chopper)
+
+        chopper, reference = choppers
+        substepping = SubSteppingProcessor(chopper, max_step=0.01)
+
+        states = []
+        for _ in range(40):
+            substepping.process(0.5)
+
+            for _ in range(50):
+                reference.process(0.01)
+
+            states.append(chopper.state)
+            self.assertEqual(chopper.state, reference.state)
+
+        self.assertEqual(states[0], 'accelerating')
+        self.assertIn('phase_locking', states)
+        self.assertEqual(states[-1], 'phase_locked')
+
+        self.assertEqual(substepping.substeps, 2000)
+        self.assertAlmostEqual(chopper.speed, reference.speed)
+        self.assertAlmostEqual(chopper.phase, reference.phase)
@@ -0,0 +1,89 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+from mock import Mock
+
+from simulation.core import RealTimeClock, ScaledClock, SteppedClock, ManualClock, ClockedProcessor
+
+
+class TestClocks(unittest.TestCase):
+    def test_real_time(self):
+        clock = RealTimeClock()
+
+        self.assertEqual(clock.tick(0.1), 0.1)
+        self.assertEqual(clock.tick(0.2), 0.2)
+        self.assertAlmostEqual(clock.time, 0.3)
+
+    def test_scaled(self):
+        clock = ScaledClock(50.0)
+
+        self.assertEqual(clock.tick(0.01), 0.5)
+        self.assertRaises(ValueError, ScaledClock, 0.0)
+
+    def test_stepped(self):
+        clock = SteppedClock(0.01)
+
+        self.assertEqual(clock.tick(0.5), 0.01)
+        self.assertEqual(clock.tick(0.0), 0.01)
+        self.assertRaises(ValueError, SteppedClock, -1.0)
+
+    def test_manual(self):
+        clock = ManualClock()
+        self.assertEqual(clock.tick(0.1), 0.0)
+
+        clock.advance(2.0)
+        clock.advance(1.0)
+        self.assertEqual(clock.pending, 3.0)
+
+        self.assertEqual(clock.tick(0.1), 3.0)
+        self.assertEqual(clock.tick(0.1), 0.0)
+        self.assertEqual(clock.time, 3.0)
+
+    def test_paused(self):
+        clock = ScaledClock(10.0, paused=True)
+        self.assertEqual(clock.tick(0.1), 0.0)
+
+        clock.advance(1.0)
+        self.assertEqual(clock.tick(0.1), 1.0)
+
+        clock.resume()
+        self.assertEqual(clock.tick(0.1), 1.0)
+
+        clock.pause()
+        self.assertTrue(clock.paused)
+        self.assertEqual(clock.tick(0.1), 0.0)
+
+    def test_time_can_not_run_backwards(self):
+        clock = ManualClock()
+
+        self.assertRaises(ValueError, clock.advance, -1.0)
+        with self.assertRaises(ValueError):
+            clock.pending = -1.0
+
+
+class TestClockedProcessor(unittest.TestCase):
+    def test_processes_with_clock_time(self):
+        processor = Mock()
+        clocked = ClockedProcessor(processor, ScaledClock(50.0))
+
+        clocked.process(0.01)
+
+        processor.process.assert_called_once_with(0.5)
+        self.assertEqual(clocked.clock.time, 0.5)
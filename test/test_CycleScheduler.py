@@ -0,0 +1,172 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import threading
+import time
+import unittest
+from mock import Mock
+
+from simulation.core import CycleScheduler
+from simulation.core.scheduler import monotonic
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.time = 100.0
+        self.sleeps = []
+
+    def timer(self):
+        return self.time
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+        self.time += duration
+
+
+class TestCycleScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.durations = []
+        self.cycle = Mock(side_effect=self._work)
+
+    def _work(self, dt):
+        self.clock.time += self.durations.pop(0) if self.durations else 0.01
+
+    def _scheduler(self, **kwargs):
+        return CycleScheduler(self.cycle, rate=10.0, timer=self.clock.timer, sleep=self.clock.sleep, **kwargs)
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, CycleScheduler, self.cycle, rate=0.0)
+        self.assertRaises(ValueError, CycleScheduler, self.cycle, rate=10.0, overrun='foo')
+
+    def test_cycles_run_on_deadlines(self):
+        scheduler = self._scheduler()
+        scheduler.run(cycles=4)
+
+        self.assertEqual(scheduler.cycles, 4)
+        self.assertEqual(scheduler.overruns, 0)
+        self.assertEqual(len(self.clock.sleeps), 3)
+        for sleep in self.clock.sleeps:
+            self.assertAlmostEqual(sleep, 0.09)
+
+        dts = [call[0][0] for call in self.cycle.call_args_list]
+        self.assertEqual(dts[0], 0.0)
+        for dt in dts[1:]:
+            self.assertAlmostEqual(dt, 0.1)
+
+    def test_sleep_that_returns_early_is_repeated(self):
+        sleep = Mock(side_effect=lambda duration: setattr(self.clock, 'time', self.clock.time + duration / 2.0))
+        scheduler = CycleScheduler(self.cycle, rate=10.0, timer=self.clock.timer, sleep=sleep)
+        scheduler.run(cycles=2)
+
+        self.assertGreater(sleep.call_count, 2)
+        self.assertAlmostEqual(self.cycle.call_args[0][0], 0.1)
+
+    def test_overrun_skip(self):
+        self.durations = [0.35]
+        scheduler = self._scheduler(overrun=CycleScheduler.SKIP)
+        scheduler.run(cycles=2)
+
+        self.assertEqual(scheduler.overruns, 1)
+        self.assertAlmostEqual(self.cycle.call_args[0][0], 0.4)
+
+    def test_overrun_catch_up(self):
+        self.durations = [0.35]
+        scheduler = self._scheduler(overrun=CycleScheduler.CATCH_UP)
+        scheduler.run(cycles=5)
+
+        self.assertEqual(scheduler.overruns, 3)
+        dts = [call[0][0] for call in self.cycle.call_args_list]
+        self.assertAlmostEqual(sum(dts), 0.4)
+        self.assertAlmostEqual(dts[1], 0.35)
+
+    def test_overrun_reset(self):
+        self.durations = [0.35]
+        scheduler = self._scheduler(overrun=CycleScheduler.RESET)
+        scheduler.run(cycles=3)
+
+        self.assertEqual(scheduler.overruns, 1)
+        dts = [call[0][0] for call in self.cycle.call_args_list]
+        self.assertAlmostEqual(dts[1], 0.35)
+        self.assertAlmostEqual(dts[2], 0.1)
+
+    def test_timer_going_backwards_restarts_grid(self):
+        scheduler = self._scheduler()
+        self.cycle.side_effect = lambda dt: setattr(self.clock, 'time', self.clock.time - 3600.0)
+        scheduler.run(cycles=3)
+
+        # Otherwise the scheduler would wait for an hour before each cycle
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(self.cycle.call_args[0][0], 0.0)
+
+    def test_monotonic(self):
+        readings = [monotonic() for _ in range(1000)]
+        self.assertEqual(readings, sorted(readings))
+
+        start = monotonic()
+        time.sleep(0.01)
+        elapsed = monotonic() - start
+        self.assertGreater(elapsed, 0.005)
+        self.assertLess(elapsed, 1.0)
+
+    def test_lock_is_held_during_cycle(self):
+        lock = threading.Lock()
+        self.cycle.side_effect = lambda dt: self.assertTrue(lock.locked())
+
+        self._scheduler(lock=lock).run(cycles=2)
+        self.assertFalse(lock.locked())
+
+    def test_stop_from_cycle(self):
+        scheduler = self._scheduler()
+        self.cycle.side_effect = lambda dt: scheduler.stop()
+        scheduler.run()
+
+        self.assertEqual(scheduler.cycles, 1)
+        self.assertFalse(scheduler.running)
+
+    def test_start_runs_on_thread(self):
+        stopped = threading.Event()
+        scheduler = CycleScheduler(self.cycle, rate=1000.0)
+        self.cycle.side_effect = lambda dt: stopped.set()
+
+        scheduler.start()
+        self.assertTrue(stopped.wait(5.0))
+        scheduler.stop(timeout=5.0)
+
+        self.assertFalse(scheduler.running)
+        self.assertGreater(scheduler.cycles, 0)
+
+    def test_error_in_cycle_stops_scheduler(self):
+        self.cycle.side_effect = RuntimeError('Cycle failed.')
+        scheduler = self._scheduler()
+
+        self.assertRaises(RuntimeError, scheduler.run)
+        self.assertFalse(scheduler.running)
+
+    def test_error_on_thread_is_raised_by_stop(self):
+        self.cycle.side_effect = RuntimeError('Cycle failed.')
+        scheduler = CycleScheduler(self.cycle, rate=1000.0)
+
+        scheduler.start().join(5.0)
+
+        self.assertFalse(scheduler.running)
+        self.assertRaises(RuntimeError, scheduler.stop)
+
+        # The error is only raised once
+        scheduler.stop()
@@ -0,0 +1,402 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import importlib
+import sys
+import time
+import unittest
+from mock import patch
+from types import ModuleType
+
+from simulation import SimulatedChopper
+from simulation.core import CanProcess
+from simulation.core.statemachine import StateMachineException
+
+
+class Driver(object):
+    """
+    Stand-in for pcaspy.Driver that keeps the parameters in a dict.
+    """
+
+    def __init__(self):
+        super(Driver, self).__init__()
+        self.params = {}
+        self.updates = 0
+
+    def setParam(self, reason, value):
+        self.params[reason] = value
+
+    def getParam(self, reason):
+        return self.params.get(reason)
+
+    def updatePVs(self):
+        self.updates += 1
+
+    def read(self, reason):
+        return self.getParam(reason)
+
+
+class SimpleServer(object):
+    def createPV(self, prefix, pvdb):
+        pass
+
+    def process(self, timeout):
+        pass
+
+
+def _import_epics():
+    # The adapter is imported with a stand-in for pcaspy, so that it can be tested without EPICS
+    pcaspy = ModuleType('pcaspy')
+    pcaspy.Driver = Driver
+    pcaspy.SimpleServer = SimpleServer
+
+    original = sys.modules.get('pcaspy')
+    sys.modules['pcaspy'] = pcaspy
+    sys.modules.pop('adapters.epics', None)
+
+    try:
+        return importlib.import_module('adapters.epics')
+    finally:
+        # Only the module under test keeps the stand-in
+        del sys.modules['adapters.epics']
+
+        if original is None:
+            del sys.modules['pcaspy']
+        else:
+            sys.modules['pcaspy'] = original
+
+
+epics = _import_epics()
+
+
+class Device(object):
+    def __init__(self):
+        self.targetSpeed = 0.0
+        self.started_at = []
+        self._limit = 0.0
+
+    def start(self):
+        self.started_at.append(self.targetSpeed)
+
+    def fail(self):
+        raise StateMachineException('Command failed.')
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @limit.setter
+    def limit(self, value):
+        if value < 0.0:
+            raise StateMachineException('Limit must not be negative.')
+
+        self._limit = value
+
+
+class Values(object):
+    def __init__(self, **values):
+        self.__dict__.update(values)
+        self.reads = 0
+
+    @property
+    def counted(self):
+        self.reads += 1
+        return self.reads
+
+
+class TestPolling(unittest.TestCase):
+    def test_groups_are_published_when_due(self):
+        values = Values(a=1.0, b=2.0)
+        driver = epics.PropertyExposingDriver(values, {
+            'A': {'property': 'a', 'poll_interval': 0.5},
+            'B': {'property': 'b'},
+        })
+
+        driver.process(0.25)
+        self.assertEqual(driver.params, {})
+        self.assertEqual(driver.updates, 0)
+
+        driver.process(0.25)
+        self.assertEqual(driver.params, {'A': 1.0})
+        self.assertEqual(driver.updates, 1)
+
+        driver.process(0.5)
+        self.assertEqual(driver.params, {'A': 1.0, 'B': 2.0})
+        self.assertEqual(driver.updates, 2)
+
+    def test_missed_deadlines_are_skipped(self):
+        values = Values()
+        driver = epics.PropertyExposingDriver(values, {'COUNTED': {'property': 'counted', 'poll_interval': 0.5}})
+
+        driver.process(10.0)
+        self.assertEqual(values.reads, 1)
+
+        driver.process(0.25)
+        self.assertEqual(values.reads, 1)
+
+        driver.process(0.25)
+        self.assertEqual(values.reads, 2)
+
+    def test_on_change(self):
+        values = Values(a=1.0)
+        driver = epics.PropertyExposingDriver(values, {'A': {'property': 'a', 'poll_interval': 0.5,
+                                                             'on_change': True}})
+
+        driver.process(0.5)
+        driver.process(0.5)
+        self.assertEqual(driver.updates, 1)
+
+        values.a = 2.0
+        driver.process(0.5)
+        self.assertEqual(driver.params['A'], 2.0)
+        self.assertEqual(driver.updates, 2)
+
+    def test_deadbands(self):
+        values = Values(a=10.0, b=10.0)
+        driver = epics.PropertyExposingDriver(values, {
+            'A': {'property': 'a', 'poll_interval': 0.5, 'deadband': 1.0},
+            'B': {'property': 'b', 'poll_interval': 0.5, 'relative_deadband': 0.5},
+        })
+
+        driver.process(0.5)
+
+        for a, b, published in [(10.5, 14.0, (10.0, 10.0)), (11.5, 16.0, (11.5, 16.0)), (11.0, 10.0, (11.5, 16.0))]:
+            values.a, values.b = a, b
+            driver.process(0.5)
+            self.assertEqual((driver.params['A'], driver.params['B']), published)
+
+    def test_observed_properties_are_published_on_change(self):
+        chopper = SimulatedChopper()
+        chopper.process(0.0)
+
+        driver = epics.PropertyExposingDriver(chopper, {'SPEED:SP': {'property': 'targetSpeed'}})
+        self.assertEqual(driver.params['SPEED:SP'], 0.0)
+
+        chopper.targetSpeed = 5.0
+        chopper.process(0.0)
+
+        self.assertEqual(driver.params['SPEED:SP'], 5.0)
+        self.assertEqual(driver._poll_heap, [])
+
+    def test_snapshot(self):
+        values = Values(a=1, b=2.5)
+        driver = epics.PropertyExposingDriver(values, {
+            'SNAPSHOT': {'type': 'float', 'count': 2, 'snapshot': ['a', 'b'], 'poll_interval': 0.5}})
+
+        driver.process(0.5)
+        self.assertEqual(driver.params['SNAPSHOT'], [1.0, 2.5])
+
+        values.b = 3.0
+        driver.process(0.5)
+        self.assertEqual(driver.params['SNAPSHOT'], [1.0, 3.0])
+
+
+class TestLazy(unittest.TestCase):
+    def test_read_on_demand_with_ttl(self):
+        values = Values()
+        driver = epics.PropertyExposingDriver(values, {'COUNTED': {'property': 'counted', 'lazy': True,
+                                                                   'ttl': 1.0}})
+
+        driver.process(10.0)
+        self.assertEqual(values.reads, 0)
+
+        with patch.object(epics, 'monotonic', return_value=100.0):
+            self.assertEqual(driver.read('COUNTED'), 1)
+            self.assertEqual(driver.read('COUNTED'), 1)
+
+        with patch.object(epics, 'monotonic', return_value=101.5):
+            self.assertEqual(driver.read('COUNTED'), 2)
+
+        self.assertEqual(values.reads, 2)
+        self.assertNotIn('COUNTED', driver.params)
+
+    def test_read_with_simulation_thread(self):
+        class Stop(Exception):
+            pass
+
+        class Busy(CanProcess):
+            busy = False
+            cycles = 0
+
+            def doProcess(self, dt):
+                self.busy = True
+                time.sleep(0.001)
+                self.busy = False
+
+                self.cycles += 1
+                if self.cycles == 50:
+                    raise Stop()
+
+        drivers, reads = [], {False: 0, True: 0}
+
+        class Server(SimpleServer):
+            # Reads the lazy PV like a client, on the main thread while the simulation runs
+            def process(self, timeout):
+                reads[drivers[0].read('SIM:BUSY')] += 1
+
+        init = epics.PropertyExposingDriver.__init__
+
+        def capture(driver, *args, **kwargs):
+            init(driver, *args, **kwargs)
+            drivers.append(driver)
+
+        with patch.object(epics, 'SimpleServer', Server), \
+                patch.object(epics.PropertyExposingDriver, '__init__', capture):
+            self.assertRaises(Stop, epics.EpicsAdapter().run, Busy(),
+                              {'BUSY': {'property': 'busy', 'lazy': True, 'ttl': 0.0}},
+                              pv_prefix='SIM:', sim_thread=True, cycle_rate=500.0)
+
+        self.assertGreater(reads[False], 0)
+        self.assertEqual(reads[True], 0)
+
+
+class TestHistory(unittest.TestCase):
+    def _driver(self, count):
+        # Samples every 0.25 s, publishes every second
+        self.values = Values(a=0.0)
+        self.driver = epics.PropertyExposingDriver(self.values, {
+            'HISTORY': {'type': 'float', 'count': count, 'history': 'a', 'sample_interval': 0.25},
+            'RESET': {'type': 'string', 'commands': {'RESET': 'reset'}, 'history_of': 'HISTORY'},
+        })
+
+    def _run(self, samples):
+        for _ in range(samples):
+            self.values.a += 1.0
+            self.driver.process(0.25)
+
+    def test_wraps_around_oldest_first(self):
+        self._driver(3)
+
+        self._run(3)
+        self.assertNotIn('HISTORY', self.driver.params)
+
+        self._run(1)
+        self.assertEqual(list(self.driver.params['HISTORY']), [2.0, 3.0, 4.0])
+
+        self._run(4)
+        self.assertEqual(list(self.driver.params['HISTORY']), [6.0, 7.0, 8.0])
+
+    def test_reset(self):
+        self._driver(6)
+
+        self._run(4)
+        self.assertEqual(list(self.driver.params['HISTORY']), [1.0, 2.0, 3.0, 4.0])
+
+        self.assertTrue(self.driver.write('RESET', 'RESET'))
+        self.driver.apply_writes()
+        self.assertEqual(self.driver.params['RESET'], '')
+
+        self._run(4)
+        self.assertEqual(list(self.driver.params['HISTORY']), [5.0, 6.0, 7.0, 8.0])
+
+
+class TestAdapter(unittest.TestCase):
+    def test_qualify_bindings(self):
+        device, other = object(), object()
+        qualified = epics.qualify_bindings('SIM:', device, {
+            'COMMAND': {'commands': {}, 'buffer': 'LAST'},
+            'RESET': {'commands': {}, 'history_of': 'HISTORY'},
+            'OTHER': {'property': 'a', 'target': other},
+        })
+
+        self.assertEqual(sorted(qualified), ['SIM:COMMAND', 'SIM:OTHER', 'SIM:RESET'])
+        self.assertEqual(qualified['SIM:COMMAND']['buffer'], 'SIM:LAST')
+        self.assertEqual(qualified['SIM:RESET']['history_of'], 'SIM:HISTORY')
+        self.assertIs(qualified['SIM:COMMAND']['target'], device)
+        self.assertIs(qualified['SIM:OTHER']['target'], other)
+
+    def test_duplicate_pvs_in_fleet(self):
+        bindings = {'SPEED': {'property': 'speed'}}
+
+        with patch.object(epics, 'SimpleServer') as server:
+            self.assertRaises(RuntimeError, epics.EpicsAdapter().run_fleet,
+                              [('SIM:', SimulatedChopper(), bindings), ('SIM:', SimulatedChopper(), bindings)],
+                              pv_prefix='SIM:')
+
+        server.assert_not_called()
+
+    def test_failing_simulation_thread_ends_run(self):
+        class Failing(CanProcess):
+            def doProcess(self, dt):
+                raise RuntimeError('Simulation failed.')
+
+        self.assertRaises(RuntimeError, epics.EpicsAdapter().run, Failing(), {},
+                          pv_prefix='SIM:', sim_thread=True)
+
+
+class TestWrites(unittest.TestCase):
+    def setUp(self):
+        self.device = Device()
+        self.driver = epics.PropertyExposingDriver(self.device, {
+            'SPEED:SP': {'property': 'targetSpeed'},
+            'LIMIT': {'property': 'limit'},
+            'COMMAND': {'type': 'string', 'commands': {'START': 'start', 'FAIL': 'fail'}, 'buffer': 'LAST'},
+            'LAST': {'type': 'string'},
+        }, max_commands=2)
+
+    def test_writes_are_applied_in_order(self):
+        for pv, value in [('SPEED:SP', 10.0), ('COMMAND', 'START'), ('SPEED:SP', 20.0), ('SPEED:SP', 30.0)]:
+            self.assertTrue(self.driver.write(pv, value))
+
+        self.assertEqual(self.device.targetSpeed, 0.0)
+
+        self.driver.apply_writes()
+
+        self.assertEqual(self.device.started_at, [10.0])
+        self.assertEqual(self.device.targetSpeed, 30.0)
+        self.assertEqual(self.driver.params['SPEED:SP'], 30.0)
+        self.assertEqual(self.driver.params['LAST'], 'start')
+
+    def test_setpoints_are_coalesced_between_commands(self):
+        self.driver.write('SPEED:SP', 10.0)
+        self.driver.write('SPEED:SP', 20.0)
+
+        self.assertEqual(len(self.driver._writes), 1)
+
+    def test_invalid_and_excess_writes_are_rejected(self):
+        self.assertFalse(self.driver.write('SPEED:SP', 'fast'))
+        self.assertFalse(self.driver.write('COMMAND', 'UNKNOWN'))
+        self.assertFalse(self.driver.write('LAST', 'start'))
+
+        self.assertTrue(self.driver.write('COMMAND', 'START'))
+        self.assertTrue(self.driver.write('COMMAND', 'START'))
+        self.assertFalse(self.driver.write('COMMAND', 'START'))
+
+        self.assertEqual(self.driver.rejectedWrites, 4)
+
+        self.driver.apply_writes()
+        self.assertTrue(self.driver.write('COMMAND', 'START'))
+
+    def test_failing_writes_do_not_stop_the_others(self):
+        self.driver.write('LIMIT', -1.0)
+        self.driver.write('COMMAND', 'FAIL')
+        self.driver.write('COMMAND', 'START')
+        self.driver.write('SPEED:SP', 5.0)
+
+        with patch.object(epics.log, 'exception') as log:
+            self.driver.apply_writes()
+
+        self.assertEqual(log.call_count, 2)
+        self.assertEqual(self.driver.rejectedWrites, 2)
+
+        self.assertEqual(self.device.limit, 0.0)
+        self.assertEqual(self.driver.params['LIMIT'], 0.0)
+        self.assertEqual(self.device.started_at, [0.0])
+        self.assertEqual(self.device.targetSpeed, 5.0)
+        self.assertEqual(self.driver.params['LAST'], 'start')
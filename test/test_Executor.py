@@ -0,0 +1,150 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+from mock import patch
+
+from simulation.core import CanProcess, CanProcessComposite
+from simulation.core import Executor, ThreadPoolExecutor, ProcessPoolExecutor, RemoteProcessorException, shard
+
+
+class Counter(CanProcess):
+    def __init__(self):
+        super(Counter, self).__init__()
+        self.count = 0
+        self.elapsed = 0.0
+
+    def doProcess(self, dt):
+        self.count += 1
+        self.elapsed += dt
+
+    def reset(self, count=0):
+        self.count = count
+        return self.count
+
+
+class Failing(CanProcess):
+    def doProcess(self, dt):
+        raise ValueError('Broken device')
+
+
+class TestCanProcessCompositeWithExecutor(unittest.TestCase):
+    def test_independent_processors_are_dispatched_and_joined(self):
+        executor = Executor()
+        independent, dependent = Counter(), Counter()
+
+        composite = CanProcessComposite(executor=executor)
+        composite.addProcessor(independent, independent=True)
+        composite.addProcessor(dependent)
+
+        with patch.object(executor, 'dispatch', wraps=executor.dispatch) as dispatchMock, \
+                patch.object(executor, 'join') as joinMock:
+            composite.process(1.0)
+
+        dispatchMock.assert_called_once_with([independent], 1.0)
+        joinMock.assert_called_once_with()
+        self.assertEqual((independent.count, dependent.count), (1, 1))
+
+    def test_compiled_plan_dispatches_independent_processors(self):
+        counters = [Counter() for _ in range(3)]
+        composite = CanProcessComposite(compiled=True)
+        composite.addProcessor(counters[0], independent=True)
+        composite.addProcessor(CanProcessComposite([counters[1]]))
+        composite.addProcessor(counters[2], independent=True)
+
+        composite.process(1.0)
+        composite.process(1.0)
+
+        self.assertEqual([counter.count for counter in counters], [2, 2, 2])
+
+
+class TestThreadPoolExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(workers=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_all_processors_are_processed_after_join(self):
+        counters = [Counter() for _ in range(5)]
+
+        self.executor.dispatch(counters, 0.5)
+        self.executor.join()
+
+        self.assertEqual([counter.elapsed for counter in counters], [0.5] * 5)
+
+    def test_exceptions_are_raised_in_join(self):
+        self.executor.dispatch([Failing()], 0.5)
+
+        self.assertRaises(ValueError, self.executor.join)
+
+
+class TestProcessPoolExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = ProcessPoolExecutor(workers=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_state_is_resident_in_workers(self):
+        counters = [Counter() for _ in range(3)]
+
+        for _ in range(4):
+            self.executor.dispatch(counters, 0.25)
+            self.executor.join()
+
+        # The local objects are not touched, the workers own the state
+        self.assertEqual([counter.count for counter in counters], [0, 0, 0])
+        self.assertEqual([self.executor.proxy(counter).count for counter in counters], [4, 4, 4])
+        self.assertEqual(self.executor.proxy(counters[1]).elapsed, 1.0)
+
+    def test_processors_are_sharded_like_supervisor(self):
+        counters = [Counter() for _ in range(5)]
+        self.executor.dispatch(counters, 1.0)
+        self.executor.join()
+
+        workers = [[] for _ in self.executor._connections]
+        for counter in counters:
+            connection, index = self.executor._locations[id(counter)]
+            workers[self.executor._connections.index(connection)].insert(index, counter)
+
+        self.assertEqual(workers, shard(counters, 2))
+
+    def test_proxy_forwards_writes_and_calls(self):
+        counter = Counter()
+        self.executor.dispatch([counter], 1.0)
+        self.executor.join()
+
+        remote = self.executor.proxy(counter)
+        remote.elapsed = 10.0
+        self.assertEqual(remote.reset(count=7), 7)
+        self.assertEqual((remote.count, remote.elapsed), (7, 10.0))
+
+    def test_processors_can_not_be_added_after_start(self):
+        counters = [Counter()]
+        self.executor.dispatch(counters, 1.0)
+        self.executor.join()
+
+        counters.append(Counter())
+        self.assertRaises(RuntimeError, self.executor.dispatch, counters, 1.0)
+
+    def test_worker_errors_are_raised_in_join(self):
+        self.executor.dispatch([Failing()], 1.0)
+
+        self.assertRaises(RemoteProcessorException, self.executor.join)
@@ -0,0 +1,94 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+
+from simulation.core.history import History
+
+
+class TestHistory(unittest.TestCase):
+    def test_init_validation(self):
+        self.assertRaises(ValueError, History, 0)
+        self.assertRaises(ValueError, History, 10, decimation=0)
+        self.assertRaises(ValueError, History, 10, reduction='median')
+
+    def test_values_before_full(self):
+        history = History(5)
+
+        self.assertEqual(len(history), 0)
+        self.assertEqual(list(history.values()), [])
+
+        history.record(1.0)
+        history.record(2.0)
+
+        self.assertEqual(len(history), 2)
+        self.assertEqual(list(history.values()), [1.0, 2.0])
+
+    def test_values_wrap_around_oldest_first(self):
+        history = History(3)
+
+        for value in range(1, 6):
+            history.record(value)
+
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history.length, 3)
+        self.assertEqual(list(history.values()), [3.0, 4.0, 5.0])
+
+    def test_values_are_copies(self):
+        history = History(2)
+        history.record(1.0)
+
+        values = history.values()
+        values[0] = 10.0
+
+        self.assertEqual(list(history.values()), [1.0])
+
+    def test_decimation_reductions(self):
+        samples = [1.0, 4.0, 2.0, 7.0, 5.0, 6.0]
+
+        for reduction, expected in [('last', [2.0, 6.0]), ('mean', [7.0 / 3.0, 6.0]),
+                                    ('min', [1.0, 5.0]), ('max', [4.0, 7.0])]:
+            history = History(4, decimation=3, reduction=reduction)
+
+            for value in samples:
+                history.record(value)
+
+            self.assertEqual(list(history.values()), expected, reduction)
+
+    def test_incomplete_block_is_not_an_entry(self):
+        history = History(4, decimation=3)
+
+        history.record(1.0)
+        history.record(2.0)
+
+        self.assertEqual(len(history), 0)
+
+    def test_reset(self):
+        history = History(3, decimation=2)
+
+        for value in range(5):
+            history.record(value)
+
+        history.reset()
+        self.assertEqual(len(history), 0)
+
+        # The incomplete block is discarded as well
+        history.record(10.0)
+        history.record(20.0)
+        self.assertEqual(list(history.values()), [20.0])
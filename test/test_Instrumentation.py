@@ -0,0 +1,105 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import gc
+import unittest
+
+from simulation.core import CanProcess, CanProcessComposite, instrumentation
+
+
+class Sleeper(CanProcess):
+    def doProcess(self, dt):
+        pass
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled_by_default_and_restores_process(self):
+        original = CanProcess.__dict__['process']
+        self.assertFalse(instrumentation.is_enabled())
+
+        instrumentation.enable()
+        self.assertTrue(instrumentation.is_enabled())
+        self.assertIsNot(CanProcess.__dict__['process'], original)
+
+        instrumentation.disable()
+        self.assertIs(CanProcess.__dict__['process'], original)
+
+    def test_nothing_is_recorded_when_disabled(self):
+        Sleeper().process(1.0)
+
+        self.assertEqual(instrumentation.statistics(), [])
+
+    def test_records_children_of_composites(self):
+        children = [Sleeper(), Sleeper()]
+        composite = CanProcessComposite(children)
+
+        instrumentation.enable()
+        for _ in range(3):
+            composite.process(0.1)
+
+        for processor in children + [composite]:
+            stats = instrumentation.statistics(processor)
+            self.assertEqual(stats.count, 3)
+            self.assertEqual(sum(stats.histogram), 3)
+            self.assertGreaterEqual(stats.total, 0.0)
+
+        self.assertEqual(len(instrumentation.statistics()), 3)
+
+    def test_statistics_do_not_keep_processors_alive(self):
+        kept, dropped = Sleeper(), Sleeper()
+
+        instrumentation.enable()
+        kept.process(0.1)
+        dropped.process(0.1)
+        self.assertEqual(len(instrumentation.statistics()), 2)
+
+        del dropped
+        gc.collect()
+
+        self.assertEqual(len(instrumentation.statistics()), 1)
+        self.assertEqual(instrumentation.statistics(kept).count, 1)
+
+    def test_compiled_composites_are_recompiled(self):
+        child = Sleeper()
+        composite = CanProcessComposite([child], compiled=True)
+        composite.process(0.1)
+
+        instrumentation.enable()
+        composite.process(0.1)
+        self.assertEqual(instrumentation.statistics(child).count, 1)
+
+        instrumentation.disable()
+        composite.process(0.1)
+        self.assertEqual(instrumentation.statistics(child).count, 1)
+
+    def test_percentile_is_histogram_bound(self):
+        stats = instrumentation.ProcessorStatistics('test')
+        for duration in [1e-6] * 99 + [1e-3]:
+            stats.record(duration)
+
+        self.assertEqual(stats.percentile(0.5), 1e-6)
+        self.assertGreaterEqual(stats.percentile(1.0), 1e-3)
+        self.assertEqual(stats.max, 1e-3)
@@ -0,0 +1,76 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+
+from scenarios import import_device, create_device, load_fleet, create_fleet, check_scenario, scenario_names
+from scenarios.chopper.bindings import epics
+from simulation import SimulatedChopper
+
+
+class TestCreateDevice(unittest.TestCase):
+    def test_returns_new_devices(self):
+        imported = import_device('chopper', 'default')
+
+        first = create_device('chopper', 'default')
+        second = create_device('chopper', 'default')
+
+        self.assertIsInstance(first, SimulatedChopper)
+        self.assertIsNot(first, second)
+
+        # The scenario module is not executed again, so the imported device stays the same
+        self.assertIs(import_device('chopper', 'default'), imported)
+        self.assertNotIn(imported, (first, second))
+
+
+class TestRegistry(unittest.TestCase):
+    def test_check_scenario(self):
+        check_scenario('chopper', 'default')
+
+        self.assertRaises(RuntimeError, check_scenario, 'shutter', 'default')
+        self.assertRaises(RuntimeError, check_scenario, 'chopper', 'broken')
+
+    def test_unknown_devices_are_not_imported(self):
+        self.assertRaises(RuntimeError, import_device, 'chopper', 'bindings')
+        self.assertRaises(RuntimeError, load_fleet, [{'device': 'shutter', 'prefix': 'SIM:'}], 'epics')
+
+    def test_scenario_names(self):
+        self.assertEqual(scenario_names(), ['default'])
+
+
+class TestFleet(unittest.TestCase):
+    def test_load_fleet(self):
+        specifications = load_fleet([
+            {'device': 'chopper', 'prefix': 'SIM:CH{index}:', 'count': 2},
+            {'device': 'chopper', 'scenario': 'default', 'prefix': 'SIM:REF:', 'bindings': 'epics'},
+        ], 'epics')
+
+        self.assertEqual(specifications, [
+            ('SIM:CH1:', 'chopper', 'default', 'epics'),
+            ('SIM:CH2:', 'chopper', 'default', 'epics'),
+            ('SIM:REF:', 'chopper', 'default', 'epics'),
+        ])
+
+    def test_create_fleet(self):
+        fleet = create_fleet([('SIM:CH1:', 'chopper', 'default', 'epics'),
+                              ('SIM:CH2:', 'chopper', 'default', 'epics')])
+
+        self.assertEqual([prefix for prefix, _, _ in fleet], ['SIM:CH1:', 'SIM:CH2:'])
+        self.assertIsNot(fleet[0][1], fleet[1][1])
+        self.assertIs(fleet[0][2], epics)
@@ -0,0 +1,102 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+from mock import Mock
+
+from simulation import SimulatedChopper
+from simulation.core import subscribe_properties
+
+
+class TestSimulatedChopperAdvance(unittest.TestCase):
+    def setUp(self):
+        self.chopper = SimulatedChopper()
+        self.chopper.process(0.0)  # Entering the init state initializes the context
+        self.chopper.interlock()
+
+    def test_advance_reaches_phase_locked(self):
+        self.chopper.targetSpeed = 100.0
+        self.chopper.targetPhase = 23.0
+        self.chopper.start()
+
+        cycles = self.chopper.advance(3600.0)
+
+        self.assertEqual(self.chopper.state, 'phase_locked')
+        self.assertEqual(self.chopper.speed, 100.0)
+        self.assertEqual(self.chopper.phase, 23.0)
+        self.assertLess(cycles, 30)
+
+    def test_advance_matches_fixed_cycles(self):
+        reference = SimulatedChopper()
+        reference.process(0.0)
+        reference.interlock()
+
+        for chopper in (self.chopper, reference):
+            chopper.targetSpeed = 10.0
+            chopper.start()
+
+            # Fixed cycles spend time on transitions, advance does not
+            while chopper.state != 'accelerating':
+                chopper.process(0.0)
+
+        self.chopper.advance(1.0)
+        for _ in range(100):
+            reference.process(0.01)
+
+        self.assertEqual(self.chopper.state, 'accelerating')
+        self.assertEqual(self.chopper.state, reference.state)
+        self.assertAlmostEqual(self.chopper.speed, reference.speed)
+
+    def test_advance_through_stopping_to_parked(self):
+        self.chopper.targetSpeed = 10.0
+        self.chopper.start()
+        self.chopper.advance(100.0)
+        self.assertEqual(self.chopper.state, 'phase_locked')
+
+        self.chopper.stop()
+        self.chopper.advance(100.0)
+        self.assertEqual(self.chopper.state, 'stopped')
+        self.assertEqual(self.chopper.speed, 0.0)
+
+        self.chopper.targetParkingPosition = 45.0
+        self.chopper.park()
+        self.chopper.advance(100.0)
+        self.assertEqual(self.chopper.state, 'parked')
+        self.assertEqual(self.chopper.parkingPosition, 45.0)
+
+
+class TestSimulatedChopperObservers(unittest.TestCase):
+    def test_property_changes_are_reported_once_per_cycle(self):
+        chopper = SimulatedChopper()
+        chopper.process(0.0)
+        chopper.interlock()
+
+        observer = Mock()
+        subscribed = subscribe_properties(chopper, observer, ['speed', 'targetSpeed', 'state'])
+        self.assertEqual(subscribed, {'speed', 'targetSpeed'})
+
+        chopper.targetSpeed = 10.0
+        chopper.start()
+        while chopper.state != 'accelerating':
+            chopper.process(0.0)
+        observer.assert_called_once_with({'targetSpeed': (0.0, 10.0)})
+
+        chopper.process(1.0)
+        self.assertEqual(observer.call_count, 2)
+        self.assertEqual(observer.call_args[0][0].keys(), ['speed'])
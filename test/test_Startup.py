@@ -0,0 +1,65 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Runs a script with --help and reports which of the heavy modules it imported and how long it took
+_probe = '''
+import json, runpy, sys, time
+start = time.time()
+sys.argv = [{script!r}, '--help']
+try:
+    runpy.run_path({script!r}, run_name='__main__')
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps({{'seconds': time.time() - start,
+                              'imported': sorted(set(m.split('.')[0] for m in sys.modules) & {heavy!r})}}))
+'''
+
+
+class TestStartup(unittest.TestCase):
+    # Modules that must not be imported before an adapter is chosen and the simulation started
+    heavy = {'pcaspy', 'numpy', 'multiprocessing'}
+
+    # Allows for slow machines, --help usually takes a few tens of milliseconds
+    budget = 0.5
+
+    def probe(self, script):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.Popen([sys.executable, '-c', _probe.format(script=script, heavy=self.heavy)],
+                                   cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, report = process.communicate()
+
+        return json.loads(report.splitlines()[-1])
+
+    def test_simulation_help(self):
+        report = self.probe('simulation.py')
+
+        self.assertEqual(report['imported'], [])
+        self.assertLess(report['seconds'], self.budget)
+
+    def test_supervisor_help(self):
+        report = self.probe('supervisor.py')
+
+        self.assertEqual(report['imported'], [])
+        self.assertLess(report['seconds'], self.budget)
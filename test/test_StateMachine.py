@@ -20,7 +20,8 @@
 import unittest
 from mock import Mock, patch
 
-from simulation.core.statemachine import StateMachine, State, Transition, Context
+from simulation.core.statemachine import StateMachine, State, Transition, Context, CompactContext, depends_on
+from simulation.core.statemachine import ContextProperty, subscribe_properties, fast_forward
 from simulation.core.statemachine import StateMachineException
 
 
@@ -363,3 +364,534 @@ class TestStateMachine(unittest.TestCase):
         self.assertEqual(sm.state, 'bar')
         sm.reset()
         self.assertIsNone(sm.state)
+
+    def test_handlers_without_dt_are_called_without_arguments(self):
+        calls = []
+        sm = StateMachine({
+            'initial': 'foo',
+            'states': {
+                'foo': {'on_entry': lambda: calls.append('entry'), 'in_state': lambda dt: calls.append(dt)},
+            }
+        })
+
+        sm.process(1.0)
+        sm.process(2.0)
+
+        self.assertEqual(calls, ['entry', 0, 2.0])
+
+    def test_TypeError_in_handler_is_not_swallowed(self):
+        def broken_handler(dt):
+            raise TypeError('Bug in handler')
+
+        sm = StateMachine({
+            'initial': 'foo',
+            'states': {
+                'foo': {'in_state': broken_handler},
+            }
+        })
+
+        self.assertRaises(TypeError, sm.process, 1.0)
+
+
+class TestCompiledStateMachine(unittest.TestCase):
+    def _run(self, compiled, cycles=6):
+        log = []
+
+        class Handlers(object):
+            def _on_entry_foo(self, dt):
+                log.append(('entry foo', dt))
+
+            def _in_state_foo(self, dt):
+                log.append(('in foo', dt))
+
+            def _on_exit_foo(self):
+                log.append('exit foo')
+
+            def _in_state_bar(self, dt):
+                log.append(('in bar', dt))
+
+        counter = {'cycles': 0}
+
+        def count_cycles():
+            counter['cycles'] += 1
+            return counter['cycles'] % 2 == 0
+
+        sm = StateMachine({
+            'initial': 'foo',
+            'states': {
+                'bar': [lambda: log.append('entry bar'), None, [lambda dt: log.append(('exit bar', dt))]],
+            },
+            'transitions': {
+                ('foo', 'bar'): count_cycles,
+                ('bar', 'foo'): lambda: True,
+            }
+        }, compiled=compiled)
+        sm.bind_handlers_by_name(Handlers())
+
+        for cycle in range(cycles):
+            sm.process(float(cycle))
+            log.append(sm.state)
+
+        return log
+
+    def test_compiled_is_equivalent_to_interpreted(self):
+        self.assertEqual(self._run(compiled=True), self._run(compiled=False))
+
+    def test_cycle_is_regenerated_when_handlers_change(self):
+        in_state = Mock()
+        sm = StateMachine({'initial': 'foo'}, compiled=True)
+        sm.process(1.0)
+
+        sm.bind_handlers_by_name(Mock(spec=[]))
+        sm._set_handlers('foo', in_state=in_state)
+        sm.process(2.0)
+
+        in_state.assert_called_once_with(2.0)
+
+    def test_reset_enters_initial_state(self):
+        on_entry = Mock()
+        sm = StateMachine({
+            'initial': 'foo',
+            'states': {'foo': {'on_entry': on_entry}},
+            'transitions': {('foo', 'bar'): lambda: True}
+        }, compiled=True)
+
+        sm.process(1.0)
+        sm.process(1.0)
+        self.assertEqual(sm.state, 'bar')
+
+        sm.reset()
+        sm.process(1.0)
+        self.assertEqual(sm.state, 'foo')
+        self.assertEqual(on_entry.call_count, 2)
+
+
+class SampleContext(Context):
+    def initialize(self):
+        self.speed = 0.0
+        self.target_speed = 0.0
+        self.commanded = False
+
+
+class TestContext(unittest.TestCase):
+    def test_can_not_add_attributes_after_freeze(self):
+        context = SampleContext()
+        context.speed = 1.0
+
+        with self.assertRaises(StateMachineException):
+            context.foo = 1.0
+
+    def test_revision_tracks_writes(self):
+        context = SampleContext()
+        self.assertEqual(context.revision(), 0)
+        self.assertEqual(context.revision('speed'), 0)
+
+        context.speed = 1.0
+        context.commanded = True
+
+        self.assertEqual(context.revision(), 2)
+        self.assertEqual(context.revision('speed'), 1)
+        self.assertEqual(context.revision('speed', 'commanded'), 2)
+        self.assertEqual(context.revision('target_speed'), 0)
+
+
+class SampleCompactContext(CompactContext):
+    def initialize(self):
+        self.speed = 0.0
+        self.target_speed = 0.0
+        self.commanded = False
+
+
+class TestCompactContext(unittest.TestCase):
+    def test_fields_are_slots(self):
+        context = SampleCompactContext()
+
+        self.assertEqual(SampleCompactContext.__slots__, ('commanded', 'speed', 'target_speed'))
+        self.assertFalse(hasattr(context, '__dict__'))
+
+    def test_can_not_add_attributes(self):
+        context = SampleCompactContext()
+        context.speed = 1.0
+
+        with self.assertRaises(StateMachineException):
+            context.foo = 1.0
+
+    def test_revision_tracks_writes(self):
+        context = SampleCompactContext()
+        self.assertEqual(context.revision(), 0)
+        self.assertEqual(context.revision('speed'), 0)
+
+        context.speed = 1.0
+        context.commanded = True
+
+        self.assertEqual(context.revision(), 2)
+        self.assertEqual(context.revision('speed'), 1)
+        self.assertEqual(context.revision('speed', 'commanded'), 2)
+        self.assertEqual(context.revision('target_speed'), 0)
+
+    def test_private_fields_are_tracked(self):
+        class PrivateContext(CompactContext):
+            def initialize(self):
+                self.__secret = 0
+
+            def reveal(self, value):
+                self.__secret = value
+
+        context = PrivateContext()
+        context.reveal(5)
+
+        self.assertEqual(PrivateContext._fields, ('_PrivateContext__secret',))
+        self.assertEqual(context.revision('_PrivateContext__secret'), 1)
+
+        with self.assertRaises(StateMachineException):
+            context.__other = 1
+
+    def test_subclass_inherits_fields(self):
+        class ExtendedContext(SampleCompactContext):
+            def initialize(self):
+                SampleCompactContext.initialize(self)
+                self.phase = 0.0
+
+        context = ExtendedContext()
+        context.phase = 1.0
+
+        self.assertEqual(ExtendedContext.__slots__, ('phase',))
+        self.assertEqual(context.revision('phase'), 1)
+        self.assertEqual(context.target_speed, 0.0)
+
+    def test_initialize_may_call_methods(self):
+        class ComputedContext(CompactContext):
+            def initialize(self):
+                self.speed = self.initial_speed()
+
+            def initial_speed(self):
+                return 10.0
+
+        self.assertEqual(ComputedContext().speed, 10.0)
+
+    def test_initialize_that_can_not_be_recorded_raises(self):
+        with self.assertRaises(StateMachineException):
+            class BrokenContext(CompactContext):
+                def initialize(self):
+                    self.speed = self.target_speed
+
+
+class TestContextObservers(unittest.TestCase):
+    context_type = SampleContext
+
+    def setUp(self):
+        self.context = self.context_type()
+        self.observer = Mock()
+
+    def test_changes_are_batched_until_notify(self):
+        self.context.subscribe(self.observer)
+
+        self.context.speed = 1.0
+        self.context.speed = 2.0
+        self.context.commanded = True
+        self.observer.assert_not_called()
+
+        self.context.notify()
+        self.observer.assert_called_once_with({'speed': (0.0, 2.0), 'commanded': (False, True)})
+
+        self.context.notify()
+        self.assertEqual(self.observer.call_count, 1)
+
+    def test_unchanged_values_are_not_reported(self):
+        self.context.subscribe(self.observer)
+
+        self.context.speed = 1.0
+        self.context.speed = 0.0
+        self.context.notify()
+
+        self.observer.assert_not_called()
+
+    def test_subscribe_to_fields(self):
+        self.context.subscribe(self.observer, ['speed'])
+
+        self.context.commanded = True
+        self.context.notify()
+        self.observer.assert_not_called()
+
+        self.context.speed = 1.0
+        self.context.commanded = False
+        self.context.notify()
+        self.observer.assert_called_once_with({'speed': (0.0, 1.0)})
+
+    def test_subscribe_to_unknown_field_raises(self):
+        self.assertRaises(StateMachineException, self.context.subscribe, self.observer, ['foo'])
+
+    def test_unsubscribe(self):
+        self.context.unsubscribe(self.context.subscribe(self.observer))
+
+        self.context.speed = 1.0
+        self.context.notify()
+
+        self.observer.assert_not_called()
+
+    def test_state_machine_notifies_after_cycle(self):
+        def in_state():
+            self.context.speed += 1.0
+
+        sm = StateMachine({'initial': 'foo', 'states': {'foo': {'in_state': in_state}}}, context=self.context)
+        self.context.subscribe(self.observer)
+
+        sm.process(0.1)
+        sm.process(0.1)
+
+        self.assertEqual(self.observer.call_args_list, [(({'speed': (0.0, 1.0)},),), (({'speed': (1.0, 2.0)},),)])
+
+
+class TestCompactContextObservers(TestContextObservers):
+    context_type = SampleCompactContext
+
+
+class SampleDevice(object):
+    speed = ContextProperty('speed')
+    targetSpeed = ContextProperty('target_speed', writable=True)
+
+    def __init__(self):
+        self._context = SampleContext()
+
+    @property
+    def state(self):
+        return 'foo'
+
+
+class TestContextProperty(unittest.TestCase):
+    def setUp(self):
+        self.device = SampleDevice()
+
+    def test_reads_and_writes_context(self):
+        self.device.targetSpeed = 3.0
+
+        self.assertEqual(self.device._context.target_speed, 3.0)
+        self.assertEqual(self.device.speed, 0.0)
+
+    def test_read_only(self):
+        with self.assertRaises(AttributeError):
+            self.device.speed = 3.0
+
+    def test_subscribe_properties(self):
+        observer = Mock()
+
+        subscribed = subscribe_properties(self.device, observer, ['speed', 'targetSpeed', 'state'])
+        self.assertEqual(subscribed, {'speed', 'targetSpeed'})
+
+        self.device.targetSpeed = 3.0
+        self.device._context.commanded = True
+        self.device._context.notify()
+
+        observer.assert_called_once_with({'targetSpeed': (0.0, 3.0)})
+
+
+class TestDependencyTracking(unittest.TestCase):
+    def setUp(self):
+        self.context = SampleContext()
+        self.condition = Mock(side_effect=lambda: self.context.speed == self.context.target_speed)
+        self.command = Mock(side_effect=lambda: self.context.commanded)
+
+        self.sm = StateMachine({
+            'initial': 'foo',
+            'transitions': {
+                ('foo', 'bar'): depends_on('commanded')(self.command),
+                ('bar', 'baz'): depends_on('speed', 'target_speed')(self.condition),
+            }
+        }, context=self.context)
+
+    def test_conditions_are_only_evaluated_after_writes(self):
+        self.sm.process(0.1)
+        self.sm.process(0.1)
+        self.sm.process(0.1)
+        self.assertEqual(self.command.call_count, 1)
+
+        self.context.commanded = True
+        self.sm.process(0.1)
+        self.assertEqual(self.command.call_count, 2)
+        self.assertEqual(self.sm.state, 'bar')
+
+    def test_only_dependent_conditions_are_evaluated(self):
+        self.context.target_speed = 1.0
+        self.context.commanded = True
+        self.sm.process(0.1)
+        self.sm.process(0.1)
+        self.assertEqual(self.sm.state, 'bar')
+
+        self.sm.process(0.1)
+        self.assertEqual(self.condition.call_count, 1)
+
+        self.context.speed = 1.0
+        self.sm.process(0.1)
+        self.assertEqual(self.condition.call_count, 2)
+        self.assertEqual(self.sm.state, 'baz')
+
+    def test_undeclared_conditions_are_always_evaluated(self):
+        condition = Mock(return_value=False)
+        sm = StateMachine({
+            'initial': 'foo',
+            'transitions': {
+                ('foo', 'bar'): condition,
+                ('foo', 'baz'): depends_on('commanded')(lambda: self.context.commanded),
+            }
+        }, context=self.context)
+
+        for _ in range(4):
+            sm.process(0.1)
+
+        self.assertEqual(condition.call_count, 3)
+
+    def test_compiled_machine_skips_conditions(self):
+        sm = StateMachine({
+            'initial': 'foo',
+            'transitions': {
+                ('foo', 'bar'): depends_on('commanded')(self.command),
+            }
+        }, context=self.context, compiled=True)
+
+        for _ in range(3):
+            sm.process(0.1)
+        self.assertEqual(self.command.call_count, 1)
+
+        self.context.commanded = True
+        sm.process(0.1)
+        self.assertEqual(sm.state, 'bar')
+
+    def test_unknown_dependencies_are_rejected(self):
+        for context in (self.context, SampleCompactContext(), object()):
+            self.assertRaises(StateMachineException, StateMachine, {
+                'initial': 'foo',
+                'transitions': {
+                    ('foo', 'bar'): depends_on('comanded')(self.command),
+                }
+            }, context=context)
+
+        # Revisions are only tracked by a Context
+        self.assertRaises(StateMachineException, StateMachine, {
+            'initial': 'foo',
+            'transitions': {
+                ('foo', 'bar'): depends_on('commanded')(self.command),
+            }
+        }, context=Mock(spec=['commanded']))
+
+
+class Ramp(State):
+    def in_state(self, dt):
+        self._context.speed = min(self._context.speed + 2.0 * dt, self._context.target_speed)
+
+    def time_to_event(self):
+        return (self._context.target_speed - self._context.speed) / 2.0
+
+
+class Drift(State):
+    def __init__(self):
+        super(Drift, self).__init__()
+        self.steps = []
+
+    def in_state(self, dt):
+        self.steps.append(dt)
+
+
+class TestAdvance(unittest.TestCase):
+    def setUp(self):
+        self.context = SampleContext()
+        self.context.target_speed = 10.0
+        self.sm = StateMachine({
+            'initial': 'ramp',
+            'states': {'ramp': Ramp(), 'unknown': {'in_state': Mock()}},
+            'transitions': {
+                ('ramp', 'done'): lambda: self.context.speed == self.context.target_speed,
+                ('done', 'unknown'): lambda: self.context.commanded,
+            }
+        }, context=self.context)
+
+    def test_time_to_event(self):
+        self.assertEqual(self.sm.time_to_event(), 0.0)
+        self.sm.process(0.0)
+        self.assertEqual(self.sm.time_to_event(), 5.0)
+
+    def test_advance_jumps_to_events(self):
+        cycles = self.sm.advance(100.0)
+
+        self.assertEqual(self.sm.state, 'done')
+        self.assertEqual(self.context.speed, 10.0)
+        self.assertEqual(cycles, 4)
+
+    def test_states_without_estimate_use_max_step(self):
+        self.context.commanded = True
+        self.sm.advance(10.0)
+        self.assertEqual(self.sm.state, 'unknown')
+        self.assertEqual(self.sm.time_to_event(max_step=0.5), 0.5)
+
+        cycles = self.sm.advance(2.0, max_step=0.5)
+        self.assertEqual(cycles, 4)
+
+    def test_state_without_estimate_uses_max_step(self):
+        drift = Drift()
+        sm = StateMachine({'initial': 'drift', 'states': {'drift': drift}}, context=self.context)
+
+        sm.process(0.0)
+        self.assertEqual(sm.time_to_event(max_step=0.25), 0.25)
+
+        cycles = sm.advance(1.0, max_step=0.25)
+        self.assertEqual(cycles, 4)
+        self.assertEqual(drift.steps[1:], [0.25] * 4)
+
+    def test_immediate_events_without_max_step_raise(self):
+        self.assertRaises(StateMachineException, fast_forward, Mock(), lambda: 0.0, 1.0)
+
+        process = Mock()
+        # Each step of max_step follows 100 immediate events that were processed with dt=0
+        self.assertEqual(fast_forward(process, lambda: 0.0, 1.0, max_step=0.5), 202)
+
+
+class TestRunToCompletion(unittest.TestCase):
+    def _machine(self, **kwargs):
+        self.in_state = {'a': Mock(), 'b': Mock(), 'c': Mock(), 'd': Mock()}
+        return StateMachine({
+            'initial': 'a',
+            'states': dict((name, {'in_state': handler}) for name, handler in self.in_state.items()),
+            'transitions': {
+                ('a', 'b'): lambda: True,
+                ('b', 'c'): lambda: True,
+                ('c', 'd'): lambda: True,
+            }
+        }, **kwargs)
+
+    def test_single_transition_by_default(self):
+        sm = self._machine()
+        sm.process(0.1)
+        sm.process(0.1)
+
+        self.assertEqual(sm.state, 'b')
+        self.assertEqual(sm.transition_count, 1)
+
+    def test_transitions_are_chained(self):
+        for compiled in (False, True):
+            sm = self._machine(run_to_completion=True, compiled=compiled)
+            sm.process(0.1)
+            self.assertEqual(sm.transition_count, 0)
+
+            sm.process(0.2)
+            self.assertEqual(sm.state, 'd')
+            self.assertEqual(sm.transition_count, 3)
+
+            # Only the final state receives an in_state event
+            self.in_state['b'].assert_not_called()
+            self.in_state['c'].assert_not_called()
+            self.in_state['d'].assert_called_once_with(0.2)
+
+            sm.process(0.3)
+            self.assertEqual(sm.transition_count, 0)
+
+    def test_transitions_are_capped(self):
+        for compiled in (False, True):
+            sm = self._machine(run_to_completion=True, max_transitions=2, compiled=compiled)
+            sm.process(0.1)
+            sm.process(0.1)
+
+            self.assertEqual(sm.state, 'c')
+            self.assertEqual(sm.transition_count, 2)
+            self.in_state['c'].assert_called_once_with(0.1)
+
+            sm.process(0.1)
+            self.assertEqual(sm.state, 'd')
@@ -0,0 +1,101 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import time
+import unittest
+
+from simulation.core import Supervisor, shard
+
+
+def report_and_exit(worker_shard, connection):
+    connection.send({'shard': worker_shard})
+
+
+def report_and_hang(worker_shard, connection):
+    connection.send({'shard': worker_shard})
+    time.sleep(60.0)
+
+
+def report_regularly(worker_shard, connection):
+    while True:
+        connection.send({'shard': worker_shard})
+        time.sleep(0.05)
+
+
+class TestShard(unittest.TestCase):
+    def test_shard(self):
+        self.assertEqual(shard(range(5), 2), [[0, 2, 4], [1, 3]])
+        self.assertEqual(shard(range(2), 4), [[0], [1]])
+
+
+class TestSupervisor(unittest.TestCase):
+    def _supervise(self, worker, duration, **kwargs):
+        supervisor = Supervisor(worker, [[1, 2], [3]], restart_delay=0.0, **kwargs)
+        supervisor.start()
+
+        try:
+            end = time.time() + duration
+            while time.time() < end:
+                supervisor.poll(0.05)
+
+            return supervisor.statistics()
+        finally:
+            supervisor.stop()
+
+    def test_statistics_are_collected(self):
+        statistics = self._supervise(report_regularly, 0.5)
+
+        self.assertEqual([worker['statistics'] for worker in statistics], [{'shard': [1, 2]}, {'shard': [3]}])
+        self.assertEqual([worker['restarts'] for worker in statistics], [0, 0])
+        self.assertTrue(all(worker['alive'] for worker in statistics))
+
+    def test_exited_workers_are_restarted(self):
+        statistics = self._supervise(report_and_exit, 1.0)
+
+        self.assertTrue(all(worker['restarts'] > 0 for worker in statistics))
+
+    def test_connections_of_restarted_workers_are_closed(self):
+        supervisor = Supervisor(report_and_hang, [[1]], heartbeat_timeout=0.2, restart_delay=0.0)
+        supervisor.start()
+
+        try:
+            connection = supervisor._workers[0].connection
+
+            end = time.time() + 5.0
+            while supervisor._workers[0].restarts == 0 or supervisor._workers[0].restart_at is not None:
+                self.assertLess(time.time(), end)
+                supervisor.poll(0.05)
+
+            self.assertTrue(connection.closed)
+            self.assertIsNot(supervisor._workers[0].connection, connection)
+        finally:
+            supervisor.stop()
+
+    def test_hung_workers_are_restarted(self):
+        statistics = self._supervise(report_and_hang, 1.0, heartbeat_timeout=0.3)
+
+        self.assertTrue(all(worker['restarts'] > 0 for worker in statistics))
+
+    def test_stop_terminates_workers(self):
+        supervisor = Supervisor(report_and_hang, [[1]])
+        supervisor.start()
+        supervisor.stop()
+
+        self.assertFalse(supervisor.running)
+        self.assertFalse(supervisor.statistics()[0]['alive'])
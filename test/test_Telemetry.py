@@ -0,0 +1,94 @@
+#  -*- coding: utf-8 -*-
+# *********************************************************************
+# plankton - a library for creating hardware device simulators
+# Copyright (C) 2016 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+from mock import Mock
+
+from simulation.core import CycleScheduler, CycleTelemetry, RollingStatistics
+
+
+class TestRollingStatistics(unittest.TestCase):
+    def test_empty(self):
+        statistics = RollingStatistics()
+
+        self.assertEqual(statistics.mean, 0.0)
+        self.assertEqual(statistics.max, 0.0)
+        self.assertEqual(statistics.percentiles(0.5, 0.99), [0.0, 0.0])
+
+    def test_only_window_is_kept(self):
+        statistics = RollingStatistics(window=100)
+        for value in range(200):
+            statistics.record(float(value))
+
+        self.assertEqual(statistics.count, 100)
+        self.assertEqual(statistics.mean, 149.5)
+        self.assertEqual(statistics.max, 199.0)
+        self.assertEqual(statistics.percentiles(0.5, 0.99), [150.0, 199.0])
+
+
+class TestCycleTelemetry(unittest.TestCase):
+    def setUp(self):
+        self.time = 0.0
+        self.telemetry = CycleTelemetry(interval=1.0, timer=lambda: self.time)
+
+    def _work(self, duration):
+        self.time += duration
+
+    def test_snapshot_is_refreshed_once_per_interval(self):
+        for _ in range(11):
+            self.telemetry.record_cycle(0.002)
+            self._work(0.1)
+            self.telemetry.process(0.1)
+            if self.telemetry.cycleRate == 0.0:
+                self.assertEqual(self.telemetry.meanCycleTime, 0.0)
+
+        self.assertAlmostEqual(self.telemetry.cycleRate, 10.0)
+        self.assertAlmostEqual(self.telemetry.meanCycleTime, 2.0)
+        self.assertAlmostEqual(self.telemetry.p99CycleTime, 2.0)
+        self.assertAlmostEqual(self.telemetry.maxCycleTime, 2.0)
+
+    def test_timed_parts(self):
+        work = Mock(side_effect=self._work, return_value=None)
+        timed = self.telemetry.timed('simulation', work)
+
+        for _ in range(4):
+            timed(0.05)
+            self._work(0.2)
+            self.telemetry.record_cycle(0.05)
+
+        self.telemetry.update()
+
+        work.assert_called_with(0.05)
+        share = self.telemetry.share('simulation')
+        self.assertAlmostEqual(share.fraction, 0.2)
+        self.assertAlmostEqual(share.perCycle, 50.0)
+
+    def test_snapshot_is_read_only(self):
+        with self.assertRaises(AttributeError):
+            self.telemetry.cycleRate = 1.0
+
+    def test_scheduler_records_cycles_and_overruns(self):
+        durations = [0.01, 0.35, 0.01]
+        scheduler = CycleScheduler(lambda dt: self._work(durations.pop(0)), rate=10.0,
+                                   timer=lambda: self.time, sleep=self._work, telemetry=self.telemetry)
+        scheduler.run(cycles=3)
+        self.telemetry.update()
+
+        self.assertEqual(self.telemetry.overruns, 1)
+        self.assertAlmostEqual(self.telemetry.maxCycleTime, 350.0)